@@ -0,0 +1,131 @@
+"""Matching throughput of the marketplace order book under synthetic load.
+
+Run from the repository root:
+
+    python -m benchmarks.market_matching --orders 5000 --cards 50 --traders 200
+
+A throwaway database gets the cards, market and history tables and funded traders. Then a random stream of /sell listings and
+/buy_order bids goes through core.market, the same path the commands use. Each order is matched in its own
+BEGIN IMMEDIATE transaction. The script reports orders per second, match counts and latency percentiles.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+import aiosqlite
+
+from core.market import MarketError, place_bid, place_listing, fill_quantity
+
+GUILD_ID = 1
+
+# Mirrors the DDL in the cards, economy and shopping cogs' setup(); every fill also writes the history tables
+SCHEMA = [
+    '''CREATE TABLE cards (guild_id INTEGER, card_id INTEGER NOT NULL, name TEXT NOT NULL, description TEXT,
+                          rarity TEXT, img_url TEXT, local_img_url TEXT, PRIMARY KEY (card_id, guild_id))''',
+    '''CREATE TABLE user_inventory (guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL, card_id INTEGER NOT NULL,
+                                   quantity INTEGER, PRIMARY KEY (guild_id, user_id, card_id))''',
+    '''CREATE TABLE economy (guild_id INTEGER, user_id INTEGER, balance INTEGER DEFAULT 0,
+                            message_count INTEGER DEFAULT 0, PRIMARY KEY (guild_id, user_id))''',
+    '''CREATE TABLE market_listings (listing_id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER NOT NULL,
+                                    seller_id INTEGER NOT NULL, card_id INTEGER NOT NULL, price INTEGER NOT NULL,
+                                    quantity INTEGER NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''',
+    'CREATE INDEX idx_market_listings_ask ON market_listings (guild_id, card_id, price, listing_id)',
+    'CREATE INDEX idx_market_listings_seller ON market_listings (guild_id, seller_id, card_id, price)',
+    '''CREATE TABLE market_bids (bid_id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER NOT NULL,
+                                buyer_id INTEGER NOT NULL, card_id INTEGER NOT NULL, price INTEGER NOT NULL,
+                                quantity INTEGER NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''',
+    'CREATE INDEX idx_market_bids_match ON market_bids (guild_id, card_id, price DESC, bid_id)',
+    'CREATE INDEX idx_market_bids_buyer ON market_bids (guild_id, buyer_id, card_id)',
+    '''CREATE TABLE market_transactions (tx_id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER NOT NULL,
+                                        kind TEXT NOT NULL, user1_id INTEGER NOT NULL, user2_id INTEGER NOT NULL,
+                                        user1_item TEXT NOT NULL, user2_item TEXT NOT NULL, card_id INTEGER,
+                                        quantity INTEGER, price INTEGER, created_at INTEGER NOT NULL)''',
+    '''CREATE TABLE transaction_participants (guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+                                             tx_id INTEGER NOT NULL, PRIMARY KEY (guild_id, user_id, tx_id))
+       WITHOUT ROWID''',
+    '''CREATE TABLE card_price_stats (guild_id INTEGER NOT NULL, card_id INTEGER NOT NULL,
+                                     last_price INTEGER NOT NULL, last_traded_at INTEGER NOT NULL,
+                                     copies INTEGER NOT NULL DEFAULT 0, turnover INTEGER NOT NULL DEFAULT 0,
+                                     PRIMARY KEY (guild_id, card_id))''',
+    '''CREATE TABLE card_price_buckets (guild_id INTEGER NOT NULL, card_id INTEGER NOT NULL, day INTEGER NOT NULL,
+                                       price INTEGER NOT NULL, copies INTEGER NOT NULL,
+                                       PRIMARY KEY (guild_id, card_id, day, price)) WITHOUT ROWID''',
+]
+
+
+async def seed(conn, cards, traders, copies, balance):
+    for statement in SCHEMA:
+        await conn.execute(statement)
+    await conn.executemany(
+        "INSERT INTO cards (guild_id, card_id, name, rarity) VALUES (?, ?, ?, 'Common')",
+        [(GUILD_ID, card, f"Card {card}") for card in range(cards)]
+    )
+    await conn.executemany(
+        "INSERT INTO economy (guild_id, user_id, balance) VALUES (?, ?, ?)",
+        [(GUILD_ID, trader, balance) for trader in range(traders)]
+    )
+    await conn.executemany(
+        "INSERT INTO user_inventory (guild_id, user_id, card_id, quantity) VALUES (?, ?, ?, ?)",
+        [(GUILD_ID, trader, card, copies) for trader in range(traders) for card in range(cards)]
+    )
+    await conn.commit()
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        async with aiosqlite.connect(os.path.join(directory, 'market.db')) as conn:
+            await seed(conn, args.cards, args.traders, args.copies, args.balance)
+
+            latencies, matched, rejected = [], 0, 0
+            started = time.perf_counter()
+            for _ in range(args.orders):
+                trader = rng.randrange(args.traders)
+                card_id = rng.randrange(args.cards)
+                # Prices cluster around a fair value so the two sides of the book cross regularly
+                price = max(1, int(rng.gauss(args.price, args.price * 0.2)))
+                quantity = rng.randint(1, args.max_quantity)
+                place = place_listing if rng.random() < 0.5 else place_bid
+
+                order_started = time.perf_counter()
+                try:
+                    fills, _ = await place(conn, GUILD_ID, trader, card_id, price, quantity)
+                    matched += fill_quantity(fills)
+                except MarketError:
+                    rejected += 1
+                latencies.append(time.perf_counter() - order_started)
+            elapsed = time.perf_counter() - started
+
+            cursor = await conn.execute("SELECT COUNT(*), COALESCE(SUM(quantity), 0) FROM market_listings")
+            listings = await cursor.fetchone()
+            cursor = await conn.execute("SELECT COUNT(*), COALESCE(SUM(quantity), 0) FROM market_bids")
+            bids = await cursor.fetchone()
+
+    latencies.sort()
+    print(f"{args.orders} orders in {elapsed:.2f}s ({args.orders / elapsed:.0f} orders/s)")
+    print(f"copies matched: {matched}, orders rejected: {rejected}")
+    print(f"resting: {listings[0]} listings ({listings[1]} copies), {bids[0]} buy orders ({bids[1]} copies)")
+    print(f"latency ms: mean {statistics.mean(latencies) * 1000:.2f}, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.2f}, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}, "
+          f"max {latencies[-1] * 1000:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--cards', type=int, default=50)
+    parser.add_argument('--traders', type=int, default=200)
+    parser.add_argument('--copies', type=int, default=20, help="starting copies of every card per trader")
+    parser.add_argument('--balance', type=int, default=100000, help="starting points per trader")
+    parser.add_argument('--price', type=int, default=100, help="mean order price")
+    parser.add_argument('--max-quantity', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
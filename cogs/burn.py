@@ -7,8 +7,12 @@ from discord.ext import commands
 from discord import app_commands
 from discord.ui import View, Select, Button
 
-from core.utils import log_command_usage, check_permissions
-from core.autocomplete import rarity_autocomplete
+from core.utils import log_command_usage, check_permissions, get_embed_colour
+from core.autocomplete import rarity_autocomplete, set_name_autocomplete
+from core.versioning import INVENTORY, bump_version
+from core.inventory import InventoryPager
+from core.rarities import get_rarity, invalidate_rarities, rarity_key
+from core.joins import INVENTORY_CARDS, card_match
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Database Configuration
@@ -27,26 +31,30 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------------------------------------------------
 # Select Views with Pagination
 # ---------------------------------------------------------------------------------------------------------------------
+# Options are read 25 at a time (the most a select can hold) through the keyset inventory pager, so only the page
+# on screen is ever loaded; the pager keeps pages it has already read for Previous/Next.
+OPTIONS_PER_PAGE = 25
+
+
 class PaginatedSelect(Select):
-    def __init__(self, placeholder, options, bot, callback, page=0):
+    def __init__(self, placeholder, pager, rows, bot, callback, page=0):
         self.bot = bot
-        self.options_data = options
+        self.pager = pager
         self.page = page
         self.callback_func = callback
-        paginated_options = self.options_data[page * 25:(page + 1) * 25]
 
         # Create options with unique values using index
         select_options = []
         seen_values = set()
-        for i, opt in enumerate(paginated_options):
-            unique_value = f"{opt['card_id']}_{i}"  # Add index to ensure uniqueness
+        for i, row in enumerate(rows):
+            unique_value = f"{row.card_id}_{i}"  # Add index to ensure uniqueness
             if unique_value in seen_values:
                 continue  # Safety check, should never happen now
             seen_values.add(unique_value)
 
             select_options.append(discord.SelectOption(
-                label=opt['name'],
-                description=f"Quantity: {opt['quantity']}",
+                label=row.name,
+                description=f"Quantity: {row.quantity}",
                 value=unique_value
             ))
 
@@ -62,11 +70,12 @@ class PaginatedSelect(Select):
 
 
 class BurnCardSelect(PaginatedSelect):
-    def __init__(self, cards, bot, page=0):
+    def __init__(self, pager, rows, bot, page=0):
         self.bot = bot
         super().__init__(
             placeholder="Select a card to burn...",
-            options=cards,
+            pager=pager,
+            rows=rows,
             bot=bot,
             callback=self.burn_select_callback,
             page=page
@@ -96,6 +105,17 @@ class BurnCardSelect(PaginatedSelect):
 # ---------------------------------------------------------------------------------------------------------------------
 # Buttons and Views
 # ---------------------------------------------------------------------------------------------------------------------
+async def build_select_view(select_type, pager, bot, page):
+    rows = await pager.fetch(page)
+    select_menu = select_type(pager, rows, bot, page)
+    view = View()
+    view.add_item(select_menu)
+    view.add_item(PreviousButton(select_menu))
+    view.add_item(FinishButton())
+    view.add_item(NextButton(select_menu))
+    return view
+
+
 class NextButton(Button):
     def __init__(self, select_menu):
         super().__init__(style=discord.ButtonStyle.primary, label="Next", row=1)
@@ -103,16 +123,11 @@ class NextButton(Button):
 
     async def callback(self, interaction: discord.Interaction):
         new_page = self.select_menu.page + 1
-        if new_page * 25 >= len(self.select_menu.options_data):
+        if new_page >= self.select_menu.pager.page_count:
             new_page = 0  # Loop back to the first page
 
-        new_select = type(self.select_menu)(self.select_menu.options_data, self.select_menu.bot, new_page)
-        new_view = View()
-        new_view.add_item(new_select)
-        new_view.add_item(PreviousButton(new_select))
-        new_view.add_item(FinishButton())
-        new_view.add_item(NextButton(new_select))
-
+        new_view = await build_select_view(type(self.select_menu), self.select_menu.pager, self.select_menu.bot,
+                                           new_page)
         await interaction.response.edit_message(view=new_view)
 
 class PreviousButton(Button):
@@ -123,15 +138,10 @@ class PreviousButton(Button):
     async def callback(self, interaction: discord.Interaction):
         new_page = self.select_menu.page - 1
         if new_page < 0:
-            new_page = (len(self.select_menu.options_data) - 1) // 25  # Go to the last page
-
-        new_select = type(self.select_menu)(self.select_menu.options_data, self.select_menu.bot, new_page)
-        new_view = View()
-        new_view.add_item(new_select)
-        new_view.add_item(PreviousButton(new_select))
-        new_view.add_item(FinishButton())
-        new_view.add_item(NextButton(new_select))
+            new_page = self.select_menu.pager.page_count - 1  # Go to the last page
 
+        new_view = await build_select_view(type(self.select_menu), self.select_menu.pager, self.select_menu.bot,
+                                           new_page)
         await interaction.response.edit_message(view=new_view)
 
 class FinishButton(Button):
@@ -141,6 +151,122 @@ class FinishButton(Button):
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.edit_message(content="Burning Complete", view=None)
 
+# ---------------------------------------------------------------------------------------------------------------------
+# Bulk Burn
+# ---------------------------------------------------------------------------------------------------------------------
+# A bulk burn keeps `keep` copies of every matching card and burns the rest. The plan is one query over the member's
+# inventory joined to the burn value of each card's rarity, and it drives both the preview and the burn: one UPDATE
+# and one targeted DELETE for the inventory, then a single credit for the points. Cards whose rarity has no burn value
+# are left alone.
+
+BURN_VALUE_EXPR = '''(SELECT rw.burn_value FROM rarity_weights rw
+                      WHERE rw.guild_id = c.guild_id AND rw.rarity_key = c.rarity_key
+                      AND rw.burn_value IS NOT NULL LIMIT 1)'''
+PREVIEW_LINES = 10
+
+
+def bulk_burn_plan(guild_id, user_id, keep, rarity=None, set_name=None):
+    """Return (query, params) selecting (card_id, name, burned, burn_value) for every card a bulk burn touches."""
+    query = f'''
+        SELECT ui.card_id, c.name, ui.quantity - ? AS burned, {BURN_VALUE_EXPR} AS burn_value
+        FROM {INVENTORY_CARDS}
+        WHERE ui.guild_id = ? AND ui.user_id = ? AND ui.quantity > ?
+    '''
+    params = [keep, guild_id, user_id, keep]
+    if rarity:
+        query += " AND c.rarity_key = ?"
+        params.append(rarity_key(rarity))
+    if set_name:
+        query += f''' AND EXISTS (SELECT 1 FROM set_cards sc
+                                  JOIN card_sets cs ON cs.set_id = sc.set_id AND cs.guild_id = sc.guild_id
+                                  WHERE {card_match('sc', 'c')} AND cs.name = ?)'''
+        params.append(set_name)
+    return f"SELECT * FROM ({query}) WHERE burn_value IS NOT NULL", params
+
+
+async def bulk_burn_totals(conn, plan, params):
+    """Return (cards, copies, points) for a plan."""
+    cursor = await conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(burned), 0), COALESCE(SUM(burned * burn_value), 0) FROM ({plan})", params
+    )
+    return await cursor.fetchone()
+
+
+async def preview_bulk_burn(conn, guild_id, user_id, keep, rarity=None, set_name=None):
+    """Return the plan's totals and its most valuable lines as (name, burned, points), without changing anything."""
+    plan, params = bulk_burn_plan(guild_id, user_id, keep, rarity, set_name)
+    totals = await bulk_burn_totals(conn, plan, params)
+    cursor = await conn.execute(
+        f"SELECT name, burned, burned * burn_value FROM ({plan}) ORDER BY burned * burn_value DESC, name LIMIT ?",
+        (*params, PREVIEW_LINES)
+    )
+    return totals, await cursor.fetchall()
+
+
+async def execute_bulk_burn(conn, guild_id, user_id, keep, rarity=None, set_name=None):
+    """Burn everything the plan selects in one transaction. Returns the (cards, copies, points) actually burned."""
+    plan, params = bulk_burn_plan(guild_id, user_id, keep, rarity, set_name)
+    await conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Recomputed under the write lock, so the credit matches exactly what is removed even if the inventory
+        # changed since the preview
+        totals = await bulk_burn_totals(conn, plan, params)
+        if totals[0]:
+            await conn.execute(
+                f"UPDATE user_inventory SET quantity = ? WHERE guild_id = ? AND user_id = ? "
+                f"AND card_id IN (SELECT card_id FROM ({plan}))",
+                (keep, guild_id, user_id, *params)
+            )
+            await conn.execute(
+                "DELETE FROM user_inventory WHERE guild_id = ? AND user_id = ? AND quantity <= 0",
+                (guild_id, user_id)
+            )
+            await conn.execute(
+                "INSERT INTO economy (guild_id, user_id, balance) VALUES (?, ?, ?) "
+                "ON CONFLICT(guild_id, user_id) DO UPDATE SET balance = balance + excluded.balance",
+                (guild_id, user_id, totals[2])
+            )
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+    return totals
+
+
+class BulkBurnView(View):
+    def __init__(self, user_id, guild_id, keep, rarity, set_name):
+        super().__init__(timeout=120)
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.keep = keep
+        self.rarity = rarity
+        self.set_name = set_name
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.user_id
+
+    @discord.ui.button(label="Burn", style=discord.ButtonStyle.danger)
+    async def confirm(self, interaction: discord.Interaction, button: Button):
+        self.stop()
+        try:
+            async with aiosqlite.connect(db_path) as conn:
+                cards, copies, points = await execute_bulk_burn(conn, self.guild_id, self.user_id, self.keep,
+                                                                self.rarity, self.set_name)
+            if cards:
+                bump_version(self.guild_id, INVENTORY)
+                content = f"Burned {copies} card(s) across {cards} different cards. You've earned `{points}` points!"
+            else:
+                content = "There is nothing left to burn."
+        except Exception as e:
+            logger.error(f"Error Bulk Burning Cards - {e}")
+            content = "An error occurred while burning your cards."
+        await interaction.response.edit_message(content=content, embed=None, view=None)
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary)
+    async def cancel(self, interaction: discord.Interaction, button: Button):
+        self.stop()
+        await interaction.response.edit_message(content="Bulk burn cancelled.", embed=None, view=None)
+
 # ---------------------------------------------------------------------------------------------------------------------
 # Burn Cog Class
 # ---------------------------------------------------------------------------------------------------------------------
@@ -152,55 +278,47 @@ class BurnCog(commands.Cog):
     async def card_name_autocomplete(self, interaction: discord.Interaction, current: str):
         async with aiosqlite.connect(db_path) as conn:
             cursor = await conn.execute(
-                "SELECT c.name FROM cards c "
-                "JOIN user_inventory ui ON c.card_id = ui.card_id "
-                "WHERE ui.user_id = ? AND ui.guild_id = ? AND c.guild_id = ? AND c.name LIKE ?",
-                (interaction.user.id, interaction.guild.id, interaction.guild.id, f'%{current}%')
+                f"SELECT c.name FROM {INVENTORY_CARDS} "
+                f"WHERE ui.guild_id = ? AND ui.user_id = ? AND ui.quantity > 0 AND c.name LIKE ? "
+                f"ORDER BY c.name LIMIT 25",
+                (interaction.guild.id, interaction.user.id, f'%{current}%')
             )
             card_names = await cursor.fetchall()
             await cursor.close()
 
-            # Slice to 25 results max
             return [
                 app_commands.Choice(name=card[0], value=card[0])
-                for card in card_names[:25]
+                for card in card_names
             ]
 
     async def burn_card(self, interaction, card_id):
         async with aiosqlite.connect(db_path) as conn:
             # Get quantity and rarity of the card
             cursor = await conn.execute(
-                "SELECT quantity, rarity FROM user_inventory "
-                "JOIN cards ON user_inventory.card_id = cards.card_id "
-                "WHERE user_inventory.user_id = ? AND user_inventory.card_id = ? AND user_inventory.guild_id = ?",
-                (interaction.user.id, card_id, interaction.guild.id)
+                f"SELECT ui.quantity, c.rarity FROM {INVENTORY_CARDS} "
+                f"WHERE ui.guild_id = ? AND ui.user_id = ? AND ui.card_id = ?",
+                (interaction.guild.id, interaction.user.id, card_id)
             )
             card = await cursor.fetchone()
             await cursor.close()
 
             if card and card[0] > 0:
                 raw_rarity = card[1]
-                normalized_rarity = raw_rarity.strip().lower()
 
                 logger.debug(
-                    f"User {interaction.user.id} burning card {card_id} with rarity '{raw_rarity}' (normalized: '{normalized_rarity}') in guild {interaction.guild.id}")
+                    f"User {interaction.user.id} burning card {card_id} with rarity '{raw_rarity}' in guild {interaction.guild.id}")
 
-                # Fetch the burn value using normalized rarity
-                cursor = await conn.execute(
-                    "SELECT burn_value FROM rarity_weights WHERE guild_id = ? AND LOWER(rarity) = ?",
-                    (interaction.guild.id, normalized_rarity)
-                )
-                burn_value = await cursor.fetchone()
-                await cursor.close()
+                # Burn values come from the guild's cached rarity table
+                rarity = await get_rarity(interaction.guild.id, raw_rarity)
 
-                if not burn_value:
+                if not rarity or rarity.burn_value is None:
                     await interaction.response.send_message(
                         f"Error: Burn value not configured for rarity `{raw_rarity}`.",
                         ephemeral=True
                     )
                     return
 
-                points_to_add = burn_value[0]
+                points_to_add = rarity.burn_value
                 new_quantity = card[0] - 1
 
                 if new_quantity > 0:
@@ -234,6 +352,7 @@ class BurnCog(commands.Cog):
                     )
 
                 await conn.commit()
+                bump_version(interaction.guild.id, INVENTORY)
 
                 message = f"Card burned successfully. You've earned `{points_to_add}` points!"
                 if not interaction.response.is_done():
@@ -267,22 +386,11 @@ class BurnCog(commands.Cog):
                     else:
                         await interaction.response.send_message("Card not found.", ephemeral=True)
             else:
-                async with aiosqlite.connect(db_path) as conn:
-                    cursor = await conn.execute(
-                        "SELECT cards.card_id, cards.name, user_inventory.quantity, cards.rarity "
-                        "FROM user_inventory JOIN cards ON user_inventory.card_id = cards.card_id "
-                        "WHERE user_inventory.user_id = ? AND user_inventory.guild_id = ?",
-                        (interaction.user.id, interaction.guild.id))
-                    cards = [{'card_id': row[0], 'name': row[1], 'quantity': row[2], 'rarity': row[3]} for row in await cursor.fetchall()]
-                    await cursor.close()
+                pager = InventoryPager(interaction.guild.id, interaction.user.id, OPTIONS_PER_PAGE)
+                await pager.reset()
 
-                if cards:
-                    view = View()
-                    select_menu = BurnCardSelect(cards, self.bot)
-                    view.add_item(select_menu)
-                    view.add_item(PreviousButton(select_menu))
-                    view.add_item(FinishButton())
-                    view.add_item(NextButton(select_menu))
+                if pager.total:
+                    view = await build_select_view(BurnCardSelect, pager, self.bot, 0)
                     await interaction.response.send_message("Select a card to burn:", view=view, ephemeral=True)
                 else:
                     await interaction.response.send_message("You have no cards to burn.", ephemeral=True)
@@ -294,6 +402,45 @@ class BurnCog(commands.Cog):
 
     # ---------------------------------------------------------------------------------------------------------------------
 
+    @app_commands.command(name="burn_bulk", description="Burn duplicates, or every card of a rarity or set, for points")
+    @app_commands.describe(
+        keep="Copies of each card to keep (default 1 burns only duplicates, 0 burns every copy)",
+        rarity="Only burn cards of this rarity",
+        set_name="Only burn cards from this set"
+    )
+    @app_commands.autocomplete(rarity=rarity_autocomplete, set_name=set_name_autocomplete)
+    async def burn_bulk(self, interaction: discord.Interaction, keep: app_commands.Range[int, 0] = 1,
+                        rarity: str = None, set_name: str = None):
+        await interaction.response.defer(ephemeral=True)
+        try:
+            async with aiosqlite.connect(db_path) as conn:
+                (cards, copies, points), lines = await preview_bulk_burn(
+                    conn, interaction.guild.id, interaction.user.id, keep, rarity, set_name
+                )
+
+            if not cards:
+                await interaction.followup.send("You have no cards matching that to burn.", ephemeral=True)
+                return
+
+            description = "\n".join(f"**{name}** x{burned} - `{value}` points" for name, burned, value in lines)
+            if cards > len(lines):
+                description += f"\n...and {cards - len(lines)} more"
+            embed = discord.Embed(title="Bulk Burn Preview", description=description,
+                                  color=await get_embed_colour(interaction.guild.id))
+            embed.add_field(name="Cards", value=f"{copies} ({cards} different)", inline=True)
+            embed.add_field(name="Points", value=f"`{points}`", inline=True)
+            embed.set_footer(text=f"Keeping {keep} of each card")
+
+            view = BulkBurnView(interaction.user.id, interaction.guild.id, keep, rarity, set_name)
+            await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+        except Exception as e:
+            logger.error(f"Error Previewing Bulk Burn - {e}")
+            await interaction.followup.send(f"Error with Bulk Burn Command: {e}", ephemeral=True)
+        finally:
+            await log_command_usage(self.bot, interaction)
+
+    # ---------------------------------------------------------------------------------------------------------------------
+
     @app_commands.command(name="burn_set_values",
                           description="Admin: Set the point values for burning cards of different rarities")
     @app_commands.describe(
@@ -311,10 +458,11 @@ class BurnCog(commands.Cog):
         try:
             async with aiosqlite.connect(db_path) as conn:
                 await conn.execute(
-                    "UPDATE rarity_weights SET burn_value = ? WHERE guild_id = ? AND rarity = ?",
-                    (burn_value, interaction.guild.id, rarity)
+                    "UPDATE rarity_weights SET burn_value = ? WHERE guild_id = ? AND rarity_key = ?",
+                    (burn_value, interaction.guild.id, rarity_key(rarity))
                 )
                 await conn.commit()
+                invalidate_rarities(interaction.guild.id)
                 await interaction.response.send_message(
                     f"Burn value for `{rarity}` set to `{burn_value}`.", ephemeral=True
                 )
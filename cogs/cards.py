@@ -1,19 +1,33 @@
 import discord
 import logging
 import aiosqlite
+import io
 import os
-import base64
+import time
+import asyncio
 
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
 from discord.ui import View, Button
-from openai import AsyncOpenAI
+from concurrent.futures import ThreadPoolExecutor
 
 
-from core.utils import log_command_usage, check_permissions, get_embed_colour
-from core.pagination import InventoryPaginationView
+from core.utils import log_command_usage, check_permissions, get_embed_colour, StageTimer
+from core.pagination import InventoryPaginationView, InspectInventoryViewModel
 from core.autocomplete import rarity_autocomplete, set_name_autocomplete, card_name_autocomplete, non_preset_card_name_autocomplete
-from config import OPENAI_MODERATION_KEY
+from core.versioning import CARDS, INVENTORY, SETS, bump_version
+from core.rarities import add_rarity_key, get_rarities, get_rarity
+from core.card_ids import SYNC_CARD_ID_SEQUENCE_SQL, allocate_card_ids, format_card_id, migrate_card_id_column, \
+    number_missing_card_ids
+from core.image_store import ACQUIRE_IMAGE_SQL, RELEASE_IMAGE_SQL, RELEASE_CARD_IMAGE_SQL, image_hash, \
+    image_extension, blob_path, thumb_path, write_blob, remove_blob, get_blob, register_blob, collect_garbage
+from core.cdn_refresh import url_expiry, is_expiring, refresh_expiring
+from core.upload_batcher import UploadBatcher
+from core.bulk_cards import BulkArchiveError, read_bulk_archive, results_csv
+from core.image_pipeline import InvalidImageError, ImagePool
+from core.moderation import OpenAIModerationBackend, LocalModerationBackend, moderate_image, is_blocked
+from config import OPENAI_MODERATION_KEY, MODERATION_BACKEND, IMAGE_PIPELINE_WORKERS, IMAGE_IO_WORKERS, \
+    IMAGE_UPLOAD_CONCURRENCY
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Database Configuration
@@ -37,13 +51,80 @@ class CardCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-        if not OPENAI_MODERATION_KEY:
-            raise RuntimeError("OPENAI_MODERATION_KEY must be set for image moderation")
-        self.mod_client = AsyncOpenAI(api_key=OPENAI_MODERATION_KEY)
+        # Card image disk I/O, hashing and encoding stay off the event loop
+        self.io_executor = ThreadPoolExecutor(max_workers=IMAGE_IO_WORKERS, thread_name_prefix='card-image-io')
+        self.upload_slots = asyncio.Semaphore(IMAGE_UPLOAD_CONCURRENCY)
+        # Image channel uploads are coalesced into multi-attachment messages, one batcher per channel
+        self.upload_batchers = {}
+
+        if MODERATION_BACKEND == 'local':
+            self.moderation = LocalModerationBackend()
+        else:
+            if not OPENAI_MODERATION_KEY:
+                raise RuntimeError("OPENAI_MODERATION_KEY must be set for image moderation")
+            self.moderation = OpenAIModerationBackend(OPENAI_MODERATION_KEY, executor=self.io_executor)
+        self.image_pool = ImagePool(IMAGE_PIPELINE_WORKERS)
+
+    async def cog_load(self):
+        await self.image_pool.start()
+        self.image_gc.start()
+        self.cdn_refresh.start()
+
+    async def cog_unload(self):
+        self.image_gc.cancel()
+        self.cdn_refresh.cancel()
+        for batcher in self.upload_batchers.values():
+            await batcher.close()
+        self.image_pool.shutdown()
+        self.io_executor.shutdown(wait=False)
+
+    @tasks.loop(hours=6)
+    async def image_gc(self):
+        try:
+            async with aiosqlite.connect(db_path) as conn:
+                removed = await collect_garbage(conn)
+            if removed:
+                logger.info(f"Image store sweep removed {removed} unreferenced blobs")
+        except Exception as e:
+            logger.error(f"Image store sweep failed: {e}")
+
+    @tasks.loop(minutes=30)
+    async def cdn_refresh(self):
+        try:
+            async with aiosqlite.connect(db_path) as conn:
+                guild_ids = await refresh_expiring(conn, self.bot.http, self.reupload_image)
+            for guild_id in guild_ids:
+                bump_version(guild_id, CARDS)
+        except Exception as e:
+            logger.error(f"CDN link refresh failed: {e}")
+
+    @cdn_refresh.before_loop
+    async def before_cdn_refresh(self):
+        await self.bot.wait_until_ready()
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Utility Functions
 # ---------------------------------------------------------------------------------------------------------------------
+    async def run_io(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, func, *args)
+
+    def get_upload_batcher(self, channel):
+        batcher = self.upload_batchers.get(channel.id)
+        if batcher is None or batcher.channel is not channel:
+            batcher = self.upload_batchers[channel.id] = UploadBatcher(channel)
+        return batcher
+
+    async def read_image(self, file_path):
+        """Read a stored image off the event loop, or return None if it is missing."""
+        def read():
+            try:
+                with open(file_path, 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+        return await self.run_io(read)
+
     async def get_support_server_channel_id(self) -> int:
         async with aiosqlite.connect(db_path) as conn:
             cursor = await conn.execute('SELECT card_channel_id FROM config')
@@ -80,9 +161,177 @@ class CardCog(commands.Cog):
                                (set_id, card_id, guild_id))
 
             await conn.commit()
+            bump_version(guild_id, SETS)
             return True
 
-    async def is_card_part_of_preset(self, card_id: str, guild_id: int) -> bool:
+    async def check_image(self, conn, digest, data, ext, timer=None):
+        """Return a user-facing error if the image must be rejected, otherwise None."""
+        try:
+            categories = await moderate_image(conn, self.moderation, digest, data, ext, timer)
+        except Exception as e:
+            logger.error(f"Image moderation failed: {e}")
+            return "⚠️ Could not verify the image for policy compliance. Please try again later."
+
+        if is_blocked(categories):
+            return "❌ Upload rejected: image flagged as sexual content."
+        return None
+
+    async def store_card_image(self, channel, filename, data, timer=None):
+        """Store an uploaded card image, processing, moderating and uploading it only if this content is new.
+
+        Returns (image_hash, local_path, cdn_url, thumb_url, error) where error is a user-facing message. Stage
+        durations are recorded on `timer` when one is given.
+        """
+        timer = timer or StageTimer("store_card_image")
+        async with self.upload_slots:
+            with timer.stage("hash"):
+                digest = await self.run_io(image_hash, data)
+                async with aiosqlite.connect(db_path) as conn:
+                    blob = await get_blob(conn, digest)
+            if blob and blob[1] and not is_expiring(blob[1], ahead=0):
+                # Known content already passed moderation and was uploaded; reuse its files and links
+                file_path, image_url, thumb_url = blob
+                return digest, file_path, image_url, thumb_url, None
+
+            try:
+                with timer.stage("preprocess"):
+                    processed = await self.image_pool.process(data, image_extension(filename))
+            except InvalidImageError as e:
+                logger.error(f"Rejected unreadable card image {digest}: {e}")
+                return None, None, None, None, "❌ Upload rejected: the file is not a readable image."
+
+            if not blob:
+                # Moderate the normalized image; the verdict cache answers repeat uploads, including rejected ones
+                async with aiosqlite.connect(db_path) as conn:
+                    error = await self.check_image(conn, digest, processed.data, processed.ext, timer)
+                if error:
+                    return None, None, None, None, error
+
+            file_path = blob_path(digest, processed.ext)
+            thumb_file = thumb_path(digest, processed.thumb_ext) if processed.thumb_data else None
+            with timer.stage("save"):
+                await self.run_io(write_blob, file_path, processed.data)
+                if thumb_file:
+                    await self.run_io(write_blob, thumb_file, processed.thumb_data)
+
+            # Upload from memory; both variants join the channel's current batch and usually share one message
+            batcher = self.get_upload_batcher(channel)
+            uploads = [batcher.upload(f"{digest[:16]}.{processed.ext}", processed.data)]
+            if thumb_file:
+                uploads.append(batcher.upload(f"{digest[:16]}_thumb.{processed.thumb_ext}", processed.thumb_data))
+            with timer.stage("upload"):
+                urls = await asyncio.gather(*uploads)
+            image_url = urls[0]
+            thumb_url = urls[1] if thumb_file else None
+
+            async with aiosqlite.connect(db_path) as conn:
+                await register_blob(conn, digest, file_path, len(processed.data), image_url, thumb_file, thumb_url)
+                await conn.commit()
+            if blob and blob[0] != file_path:
+                # Stored before the pipeline existed; the processed file replaces it
+                await self.run_io(remove_blob, blob[0])
+            return digest, file_path, image_url, thumb_url, None
+
+    async def reupload_image(self, file_path):
+        """Upload a stored image again for a link Discord would not refresh. Returns the new link or None."""
+        data = await self.read_image(file_path)
+        if data is None:
+            logger.warning(f"Cannot re-upload missing image file {file_path}")
+            return None
+        card_channel_id = await self.get_support_server_channel_id()
+        channel = self.bot.get_channel(int(card_channel_id)) if card_channel_id else None
+        if not channel:
+            logger.error("Cannot re-upload card images: card image channel is not configured.")
+            return None
+        return await self.get_upload_batcher(channel).upload(os.path.basename(file_path), data)
+
+    async def bulk_create_cards(self, guild_id, data):
+        """Create every card described by a bulk archive (see core.bulk_cards) and return per-item results.
+
+        Images go through store_card_image concurrently, bounded by its upload slots; the cards and their set
+        memberships are then inserted in a single transaction. Raises BulkArchiveError if the archive is unusable.
+        """
+        items, images = await self.run_io(read_bulk_archive, data)
+
+        card_channel_id = await self.get_support_server_channel_id()
+        channel = self.bot.get_channel(int(card_channel_id)) if card_channel_id else None
+        if not channel:
+            raise BulkArchiveError("Card image channel is not configured. Run setup first.")
+
+        # Cards take the rarity's spelling from rarity_weights, whatever case the manifest used
+        valid_rarities = {key: rarity.name for key, rarity in (await get_rarities(guild_id)).items()}
+        async with aiosqlite.connect(db_path) as conn:
+            cursor = await conn.execute("SELECT LOWER(name) FROM cards WHERE guild_id = ?", (guild_id,))
+            existing_names = {row[0] for row in await cursor.fetchall()}
+            cursor = await conn.execute("SELECT LOWER(name), set_id FROM card_sets WHERE guild_id = ?", (guild_id,))
+            set_ids = dict(await cursor.fetchall())
+
+        for item in items:
+            if item.error:
+                continue
+            if item.rarity not in valid_rarities:
+                item.error = f"Invalid rarity `{item.rarity}`."
+            elif item.name.lower() in existing_names:
+                item.error = "A card with this name already exists."
+            elif item.set_name and item.set_name.lower() not in set_ids:
+                item.error = f"Set `{item.set_name}` does not exist."
+
+        # Each distinct image is stored once even if several manifest rows use it
+        pending = [item for item in items if item.error is None]
+        paths = sorted({item.image for item in pending})
+        outcomes = await asyncio.gather(
+            *(self.store_card_image(channel, path, images[path]) for path in paths), return_exceptions=True)
+        stored = dict(zip(paths, outcomes))
+
+        for item in pending:
+            outcome = stored[item.image]
+            if isinstance(outcome, Exception):
+                logger.error(f"Bulk card image {item.image} failed: {outcome}")
+                item.error = "The image could not be uploaded."
+            elif outcome[4]:
+                item.error = outcome[4]
+        ready = [item for item in pending if item.error is None]
+
+        created = {}
+        async with aiosqlite.connect(db_path) as conn:
+            try:
+                # One block of IDs for the whole archive
+                first_card_id = await allocate_card_ids(conn, guild_id, len(ready)) if ready else 0
+
+                for card_id, item in enumerate(ready, start=first_card_id):
+                    digest, file_path, image_url, thumb_url, _ = stored[item.image]
+                    await conn.execute('''
+                        INSERT INTO cards (guild_id, card_id, name, description, rarity, img_url, local_img_url,
+                                           image_hash, thumb_url, img_expires_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (guild_id, card_id, item.name, item.description, valid_rarities[item.rarity], image_url,
+                          file_path, digest, thumb_url, url_expiry(image_url)))
+                    await conn.execute(ACQUIRE_IMAGE_SQL, (digest,))
+                    if item.set_name:
+                        await conn.execute("INSERT INTO set_cards (set_id, card_id, guild_id) VALUES (?, ?, ?)",
+                                           (set_ids[item.set_name.lower()], card_id, guild_id))
+                    created[item.index] = format_card_id(card_id)
+
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+        if created:
+            bump_version(guild_id, CARDS, SETS)
+
+        results = []
+        for item in items:
+            if item.index in created:
+                message = f"Created with ID {created[item.index]}"
+                if item.set_name:
+                    message += f" in set {item.set_name}"
+                results.append(item.result("created", message))
+            else:
+                results.append(item.result("failed", item.error))
+        return results
+
+    async def is_card_part_of_preset(self, card_id: int, guild_id: int) -> bool:
         async with aiosqlite.connect(db_path) as conn:
             cursor = await conn.execute('''
                 SELECT 1 
@@ -124,16 +373,14 @@ class CardCog(commands.Cog):
                 )
                 return
 
-            async with aiosqlite.connect(db_path) as conn:
-                cursor = await conn.execute("SELECT DISTINCT rarity FROM rarity_weights WHERE guild_id = ?",
-                                            (interaction.guild.id,))
-                valid_rarities = {row[0].lower() for row in await cursor.fetchall()}
-
-            if rarity.lower() not in valid_rarities:
+            known_rarity = await get_rarity(interaction.guild.id, rarity)
+            if not known_rarity:
+                valid_rarities = [known.name for known in (await get_rarities(interaction.guild.id)).values()]
                 await interaction.followup.send(
                     f"Error: Invalid rarity. Choose from: {', '.join(valid_rarities)}.", ephemeral=True
                 )
                 return
+            rarity = known_rarity.name
 
             # Get card channel
             card_channel_id = await self.get_support_server_channel_id()
@@ -147,67 +394,31 @@ class CardCog(commands.Cog):
                 await interaction.followup.send("Error: Cannot access the configured image channel.", ephemeral=True)
                 return
 
-            guild_dir = f'./data/card_images/{interaction.guild.id}'
-            os.makedirs(guild_dir, exist_ok=True)
-            file_path = f'{guild_dir}/{file.filename}'
-            await file.save(file_path)
-
-            try:
-                print("DEBUG: Starting image moderation")  # or logger.info(...)
-                with open(file_path, "rb") as f:
-                    raw = f.read()
-                b64 = base64.b64encode(raw).decode("utf-8")
-                ext = file.filename.rsplit(".", 1)[-1].lower()
-                data_url = f"data:image/{ext};base64,{b64}"
-                print(f"DEBUG: data_url length = {len(data_url)}")
-
-                # 3) Call the omni moderation endpoint
-                resp = await self.mod_client.moderations.create(
-                    model="omni-moderation-latest",
-                    input=[{
-                        "type": "image_url",
-                        "image_url": {"url": data_url}
-                    }]
-                )
-                result = resp.results[0]
-                print(f"DEBUG: moderation categories = {result.categories}")
-
-                # 4) Reject if sexual flagged
-                if result.categories.sexual_minors:
-                    print("DEBUG: content flagged as sexual → rejecting")
-                    os.remove(file_path)
-                    await interaction.followup.send(
-                        "❌ Upload rejected: image flagged as sexual content.",
-                        ephemeral=True
-                    )
-                    return
-                else:
-                    print("DEBUG: content passed moderation")
-
-            except Exception as e:
-                print(f"DEBUG: Moderation threw exception: {e}")
-                logger.error(f"Image moderation failed: {e}")
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                await interaction.followup.send(
-                    "⚠️ Could not verify the image for policy compliance. Please try again later.",
-                    ephemeral=True
-                )
+            timer = StageTimer(f"card_create {name!r} in guild {interaction.guild.id}")
+            with timer.stage("download"):
+                data = await file.read()
+            digest, file_path, image_url, thumb_url, error = await self.store_card_image(
+                channel, file.filename, data, timer)
+            if error:
+                timer.log()
+                await interaction.followup.send(error, ephemeral=True)
                 return
-            # Upload to Discord
-            discord_file = discord.File(file_path)
-            message = await channel.send(file=discord_file)
-            image_url = message.attachments[0].url
 
-            async with aiosqlite.connect(db_path) as conn:
-                cursor = await conn.execute('''
-                    INSERT INTO cards (guild_id, name, description, rarity, img_url, local_img_url)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (interaction.guild.id, name, description, rarity, image_url, file_path))
-                await conn.commit()
-                new_card_id = cursor.lastrowid
+            with timer.stage("insert"):
+                async with aiosqlite.connect(db_path) as conn:
+                    new_card_id = await allocate_card_ids(conn, interaction.guild.id)
+                    await conn.execute('''
+                        INSERT INTO cards (guild_id, card_id, name, description, rarity, img_url, local_img_url, image_hash,
+                                           thumb_url, img_expires_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (interaction.guild.id, new_card_id, name, description, rarity, image_url, file_path, digest,
+                          thumb_url, url_expiry(image_url)))
+                    await conn.execute(ACQUIRE_IMAGE_SQL, (digest,))
+                    await conn.commit()
+                    bump_version(interaction.guild.id, CARDS)
 
-            display_id = f"{new_card_id:08d}"
+            timer.log()
+            display_id = format_card_id(new_card_id)
 
             if set:
                 set_cog = self.bot.get_cog("SetCog")
@@ -238,6 +449,50 @@ class CardCog(commands.Cog):
 
     # ---------------------------------------------------------------------------------------------------------------------
 
+    @app_commands.command(description="Admin: Create many cards from a zip of images and a manifest")
+    @app_commands.describe(archive="A .zip with the card images and a manifest.csv or manifest.json")
+    async def card_bulk_create(self, interaction: discord.Interaction, archive: discord.Attachment):
+        if not await check_permissions(interaction):
+            await interaction.response.send_message(
+                "You do not have permission to use this command. An Admin needs to `/authorise` you!", ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            if not archive.filename.lower().endswith('.zip'):
+                await interaction.followup.send("Error: Please upload a .zip archive.", ephemeral=True)
+                return
+
+            data = await archive.read()
+            try:
+                results = await self.bulk_create_cards(interaction.guild.id, data)
+            except BulkArchiveError as e:
+                await interaction.followup.send(f"Error: {e}", ephemeral=True)
+                return
+
+            created = sum(1 for result in results if result["status"] == "created")
+            failures = [result for result in results if result["status"] != "created"]
+            message = f"Created `{created}` of `{len(results)}` cards."
+            if failures:
+                message += "\n" + "\n".join(f"Row {result['row']} `{result['name']}`: {result['message']}"
+                                            for result in failures[:10])
+                if len(failures) > 10:
+                    message += f"\n...and {len(failures) - 10} more, see the attached report."
+
+            report = discord.File(io.BytesIO(results_csv(results).encode('utf-8')), filename="bulk_results.csv")
+            await interaction.followup.send(message[:2000], file=report, ephemeral=True)
+
+        except Exception as e:
+            logger.error(f"Failed to bulk create cards: {e}")
+            await interaction.followup.send("Error: Something unexpected happened during bulk card creation.",
+                                            ephemeral=True)
+        finally:
+            await log_command_usage(self.bot, interaction)
+
+    # ---------------------------------------------------------------------------------------------------------------------
+
     @app_commands.command(description="Admin: Delete a custom card")
     @app_commands.autocomplete(card_name=card_name_autocomplete)
     @app_commands.describe(card_name="The name of the card to delete")
@@ -255,9 +510,11 @@ class CardCog(commands.Cog):
                                             (card_name, interaction.guild.id))
                 card = await cursor.fetchone()
                 if card:
+                    await conn.execute(RELEASE_CARD_IMAGE_SQL, (card[0], interaction.guild.id))
                     await conn.execute('DELETE FROM cards WHERE card_id = ? AND guild_id = ?',
                                        (card[0], interaction.guild.id))
                     await conn.commit()
+                    bump_version(interaction.guild.id, CARDS)
                     await interaction.followup.send(f"Card `{card_name}` has been successfully removed.",
                                                     ephemeral=True)
                 else:
@@ -315,6 +572,7 @@ class CardCog(commands.Cog):
                         )
 
                     await conn.commit()
+                    bump_version(interaction.guild.id, INVENTORY)
                     await interaction.followup.send(
                         f"Card `{card_name}` has been successfully given to {member.display_name}.",
                         ephemeral=True
@@ -365,6 +623,7 @@ class CardCog(commands.Cog):
                         await conn.execute('DELETE FROM user_inventory WHERE user_id = ? AND card_id = ? AND guild_id = ?',
                                            (member.id, card[0], interaction.guild.id))
                     await conn.commit()
+                    bump_version(interaction.guild.id, INVENTORY)
                     await interaction.followup.send(
                         f"Removed 1x `{card_name}` from {member.display_name}'s inventory.", ephemeral=True)
                 else:
@@ -412,7 +671,7 @@ class CardCog(commands.Cog):
             async with aiosqlite.connect(db_path) as conn:
                 # Fetch the card from the database
                 cursor = await conn.execute(
-                    "SELECT card_id, name, description, rarity, img_url, local_img_url FROM cards WHERE name = ? AND guild_id = ?",
+                    "SELECT card_id, name, description, rarity, img_url, local_img_url, image_hash, thumb_url FROM cards WHERE name = ? AND guild_id = ?",
                     (card_name, interaction.guild.id)
                 )
                 card = await cursor.fetchone()
@@ -421,40 +680,32 @@ class CardCog(commands.Cog):
                     await interaction.followup.send("Error: Card not found.", ephemeral=True)
                     return
 
-                card_id, old_name, old_description, old_rarity, old_img_url, old_local_img_url = card
+                card_id, old_name, old_description, old_rarity, old_img_url, old_local_img_url, old_hash, old_thumb_url = card
 
                 # Keep old values if new ones are not provided
                 new_name = new_name or old_name
                 new_description = new_description or old_description
-                # Normalize rarity
-                new_rarity = new_rarity.strip().lower() if new_rarity else old_rarity
-
-                # Validate rarity dynamically
-                cursor = await conn.execute(
-                    "SELECT rarity FROM rarity_weights WHERE guild_id = ?",
-                    (interaction.guild.id,)
-                )
-                valid_rarities = [row[0].lower() for row in await cursor.fetchall()]
-                await cursor.close()
-
-                if new_rarity.lower() not in valid_rarities:
-                    await interaction.followup.send(
-                        f"Error: Invalid rarity. Available options are: `{', '.join(valid_rarities)}`.",
-                        ephemeral=True
-                    )
-                    return
+                # Validate rarity dynamically; cards store the rarity's own spelling
+                if new_rarity:
+                    known_rarity = await get_rarity(interaction.guild.id, new_rarity)
+                    if not known_rarity:
+                        valid_rarities = [known.name for known in (await get_rarities(interaction.guild.id)).values()]
+                        await interaction.followup.send(
+                            f"Error: Invalid rarity. Available options are: `{', '.join(valid_rarities)}`.",
+                            ephemeral=True
+                        )
+                        return
+                    new_rarity = known_rarity.name
+                else:
+                    new_rarity = old_rarity
 
                 # Handle file upload if a new file is provided
                 new_img_url = old_img_url
                 new_local_img_url = old_local_img_url
+                new_hash = old_hash
+                new_thumb_url = old_thumb_url
 
                 if new_file:
-                    guild_dir = f'./data/card_images/{interaction.guild.id}'
-                    os.makedirs(guild_dir, exist_ok=True)
-
-                    file_path = f'{guild_dir}/{new_file.filename}'
-                    await new_file.save(file_path)
-
                     card_channel_id = await self.get_support_server_channel_id()
                     if not card_channel_id:
                         await interaction.followup.send(
@@ -471,18 +722,28 @@ class CardCog(commands.Cog):
                         )
                         return
 
-                    discord_file = discord.File(file_path)
-                    message = await channel.send(file=discord_file)
-                    new_img_url = message.attachments[0].url
-                    new_local_img_url = file_path
+                    timer = StageTimer(f"card_edit {old_name!r} in guild {interaction.guild.id}")
+                    with timer.stage("download"):
+                        data = await new_file.read()
+                    new_hash, new_local_img_url, new_img_url, new_thumb_url, error = await self.store_card_image(
+                        channel, new_file.filename, data, timer)
+                    timer.log()
+                    if error:
+                        await interaction.followup.send(error, ephemeral=True)
+                        return
 
                 # Update the database entry
                 await conn.execute(
-                    "UPDATE cards SET name = ?, description = ?, rarity = ?, img_url = ?, local_img_url = ? WHERE card_id = ? AND guild_id = ?",
-                    (new_name, new_description, new_rarity, new_img_url, new_local_img_url, card_id,
-                     interaction.guild.id)
+                    "UPDATE cards SET name = ?, description = ?, rarity = ?, img_url = ?, local_img_url = ?, image_hash = ?, thumb_url = ?, img_expires_at = ? WHERE card_id = ? AND guild_id = ?",
+                    (new_name, new_description, new_rarity, new_img_url, new_local_img_url, new_hash, new_thumb_url,
+                     url_expiry(new_img_url), card_id, interaction.guild.id)
                 )
+                if new_hash != old_hash:
+                    if old_hash:
+                        await conn.execute(RELEASE_IMAGE_SQL, (old_hash,))
+                    await conn.execute(ACQUIRE_IMAGE_SQL, (new_hash,))
                 await conn.commit()
+                bump_version(interaction.guild.id, CARDS)
 
                 await interaction.followup.send(
                     f"Card `{old_name}` has been updated successfully!",
@@ -506,7 +767,7 @@ class CardCog(commands.Cog):
         async with aiosqlite.connect(db_path) as conn:
             try:
                 cursor = await conn.execute(
-                    "SELECT name, description, rarity, img_url, local_img_url FROM cards WHERE name LIKE ? AND guild_id = ?",
+                    "SELECT name, description, rarity, img_url, local_img_url, img_expires_at FROM cards WHERE name LIKE ? AND guild_id = ?",
                     ('%' + card_name + '%', interaction.guild.id,)
                 )
                 card = await cursor.fetchone()
@@ -516,50 +777,26 @@ class CardCog(commands.Cog):
                     colour = await get_embed_colour(guild_id)
                     embed = discord.Embed(title=f"{card[0]} ({card[2].capitalize()})", description=f"*{card[1]}*",
                                           color=colour)
+                    embed.set_footer(text=f"Card Information for '{card[0]}'")
+                    embed.timestamp = discord.utils.utcnow()
 
-                    if card[3]:
+                    # Missing or lapsed links are served from the local copy; the CDN refresh job renews them later
+                    link_expired = bool(card[5]) and card[5] < time.time()
+                    if card[3] and not link_expired:
                         embed.set_image(url=card[3])
-                        embed.set_footer(text=f"Card Information for '{card[0]}'")
-                        embed.timestamp = discord.utils.utcnow()
                         await interaction.response.send_message(embed=embed)
+                        return
+
+                    data = await self.read_image(card[4]) if card[4] else None
+                    if data is not None:
+                        filename = f"card{os.path.splitext(card[4])[1]}"
+                        embed.set_image(url=f"attachment://{filename}")
+                        await interaction.response.send_message(embed=embed,
+                                                                file=discord.File(io.BytesIO(data), filename=filename))
                     else:
-                        card_channel_id = await self.get_card_channel_id(guild_id)
-                        if not card_channel_id:
-                            await interaction.followup.send(
-                                "Error: Card image channel is not configured properly. Please run the setup command.",
-                                ephemeral=True)
-                            return
-
-                        channel = self.bot.get_channel(int(card_channel_id))
-                        if not channel:
-                            await interaction.followup.send(
-                                "Error: The configured channel ID is invalid or the bot does not have access to it.",
-                                ephemeral=True)
-                            return
-
-                        try:
-                            with open(card[4], 'rb') as image_file:
-                                discord_file = discord.File(image_file)
-                                message = await channel.send(file=discord_file)
-                                new_image_url = message.attachments[0].url
-
-                                await conn.execute(
-                                    "UPDATE cards SET img_url = ? WHERE card_id = ? AND guild_id = ?",
-                                    (new_image_url, card[4], interaction.guild.id)
-                                )
-                                await conn.commit()
-
-                                embed.set_image(url=new_image_url)
-                                embed.set_footer(text=f"Card Information for '{card[0]}'")
-                                embed.timestamp = discord.utils.utcnow()
-                                await interaction.response.send_message(embed=embed)
-
-                        except Exception as e:
-                            logger.error(f"Failed to re-upload card image: {e}")
-                            await interaction.response.send_message(
-                                "Error: Failed to re-upload the card image. Please contact the admin.",
-                                ephemeral=True
-                            )
+                        if card[3]:
+                            embed.set_image(url=card[3])
+                        await interaction.response.send_message(embed=embed)
 
                 else:
                     await interaction.response.send_message("Card not found. Please check the name and try again.",
@@ -587,46 +824,22 @@ class CardCog(commands.Cog):
         await interaction.response.defer(ephemeral=True)
 
         try:
-            async with aiosqlite.connect(db_path) as conn:
-                # Fetch the user's inventory
-                cursor = await conn.execute('''
-                    SELECT cards.name, user_inventory.quantity 
-                    FROM user_inventory
-                    JOIN cards ON user_inventory.card_id = cards.card_id
-                    WHERE user_inventory.guild_id = ? AND user_inventory.user_id = ?
-                ''', (interaction.guild.id, member.id))
-                inventory = await cursor.fetchall()
-
-                if not inventory:
-                    await interaction.followup.send(f"{member.display_name} has no cards in their inventory.",
-                                                    ephemeral=True)
-                    return
+            model = await InspectInventoryViewModel.load(interaction.guild.id, member)
 
-                # Create embeds for pagination
-                guild_id = interaction.guild.id
-                embed_colour = await get_embed_colour(guild_id)
-                embeds = []
-
-                # Split inventory into chunks of 10 items per page
-                for i in range(0, len(inventory), 10):
-                    page_items = inventory[i:i + 10]
-                    embed = discord.Embed(title=f"{member.display_name}'s Inventory", color=embed_colour)
-                    for card_name, quantity in page_items:
-                        embed.add_field(name=card_name, value=f"Quantity: {quantity}", inline=False)
-                    embed.set_footer(
-                        text=f"Page {len(embeds) + 1} of {(len(inventory) - 1) // 10 + 1} | Inventory for {member.display_name}")
-                    embed.timestamp = discord.utils.utcnow()
-                    embeds.append(embed)
+            if not model.total:
+                await interaction.followup.send(f"{member.display_name} has no cards in their inventory.",
+                                                ephemeral=True)
+                return
 
-                # Create the pagination view
-                view = InventoryPaginationView(embeds, self.bot, interaction.user.id, is_ephemeral=True)
+            # Create the pagination view
+            view = InventoryPaginationView(model, self.bot, interaction.user.id, is_ephemeral=True)
 
-                # Remove the "Show/Hide" and "Toggle Descriptions" buttons
-                view.remove_item(view.show_hide_button)
-                view.remove_item(view.toggle_descriptions_button)
+            # Remove the "Show/Hide" and "Toggle Descriptions" buttons
+            view.remove_item(view.show_hide_button)
+            view.remove_item(view.toggle_descriptions_button)
 
-                # Send the initial embed
-                await interaction.followup.send(embed=embeds[0], view=view, ephemeral=True)
+            # Send the initial embed
+            await interaction.followup.send(embed=await view.current_embed(), view=view, ephemeral=True)
 
         except Exception as e:
             logger.error(f"Failed to inspect inventory: {e}")
@@ -647,7 +860,7 @@ async def setup(bot):
         await conn.execute('''
             CREATE TABLE IF NOT EXISTS cards (
                 guild_id INTEGER,
-                card_id TEXT,
+                card_id INTEGER NOT NULL,
                 name TEXT NOT NULL,
                 description TEXT,
                 rarity TEXT,
@@ -657,16 +870,94 @@ async def setup(bot):
             )
         ''')
 
+        # Content-addressed image store shared by every guild
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS image_blobs (
+                image_hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER,
+                cdn_url TEXT,
+                thumb_path TEXT,
+                thumb_url TEXT,
+                cdn_expires_at INTEGER,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                released_at TIMESTAMP
+            )
+        ''')
+
+        # Moderation verdicts per image hash and model, so repeat uploads skip the external call
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS moderation_verdicts (
+                image_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                flagged INTEGER NOT NULL,
+                categories TEXT NOT NULL,
+                checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (image_hash, model)
+            )
+        ''')
+
+        cursor = await conn.execute("PRAGMA table_info(image_blobs)")
+        column_names = [column[1] for column in await cursor.fetchall()]
+        for column, column_type in (('thumb_path', 'TEXT'), ('thumb_url', 'TEXT'), ('cdn_expires_at', 'INTEGER')):
+            if column not in column_names:
+                await conn.execute(f'ALTER TABLE image_blobs ADD COLUMN {column} {column_type}')
+                logger.info(f"Added '{column}' column to 'image_blobs' table.")
+
+        cursor = await conn.execute("PRAGMA table_info(cards)")
+        column_names = [column[1] for column in await cursor.fetchall()]
+        if 'image_hash' not in column_names:
+            await conn.execute('ALTER TABLE cards ADD COLUMN image_hash TEXT')
+            logger.info("Added 'image_hash' column to 'cards' table.")
+        if 'thumb_url' not in column_names:
+            await conn.execute('ALTER TABLE cards ADD COLUMN thumb_url TEXT')
+            logger.info("Added 'thumb_url' column to 'cards' table.")
+        if 'img_expires_at' not in column_names:
+            # Unix time the img_url link expires; filled in by the CDN refresh job for existing rows
+            await conn.execute('ALTER TABLE cards ADD COLUMN img_expires_at INTEGER')
+            logger.info("Added 'img_expires_at' column to 'cards' table.")
+
+        # Card IDs used to be zero-padded TEXT; move both tables to integers before their indexes are built
+        await number_missing_card_ids(conn)
+        await migrate_card_id_column(conn, 'cards')
+        await migrate_card_id_column(conn, 'user_inventory')
+
+        # Last card ID handed out per guild
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS card_id_sequence (
+                guild_id INTEGER PRIMARY KEY,
+                last_id INTEGER NOT NULL
+            )
+        ''')
+        await conn.execute(SYNC_CARD_ID_SEQUENCE_SQL)
+
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_cards_image_hash ON cards (image_hash)')
+        await add_rarity_key(conn, 'cards')
+
+        # Keyset pagination and name search walk cards in (name, card_id) order per guild
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_cards_guild_name ON cards (guild_id, name, card_id)
+        ''')
+
+        # Inventory and set joins look cards up by (guild_id, card_id) and mostly read only the name and rarity
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_cards_guild_card ON cards (guild_id, card_id, name, rarity)
+        ''')
+
         # Recreate the user_inventory table to ensure the correct primary key is set
         await conn.execute('''
             CREATE TABLE IF NOT EXISTS user_inventory(
                 guild_id INTEGER NOT NULL,
                 user_id INTEGER NOT NULL,
-                card_id TEXT NOT NULL,
+                card_id INTEGER NOT NULL,
                 quantity INTEGER,
                 FOREIGN KEY (card_id) REFERENCES cards(card_id),
                 PRIMARY KEY (guild_id, user_id, card_id)
             )
         ''')
+        # The primary key already serves (guild_id, user_id, card_id) lookups; a covering copy only doubled writes
+        await conn.execute('DROP INDEX IF EXISTS idx_user_inventory_cards')
+        await conn.commit()
 
     await bot.add_cog(CardCog(bot))
@@ -10,6 +10,10 @@ from discord import app_commands
 from discord.ui import View, Select, Button
 
 from core.utils import log_command_usage, check_permissions
+from core.versioning import INVENTORY, bump_version
+from core.rarities import get_rarities, rarity_key
+from core.card_ids import format_card_id
+from core.joins import SET_CARDS
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Database Configuration
@@ -111,7 +115,7 @@ class ClaimSelect(PaginatedSelect):
 
                             # Check if a valid card ID was returned
                             if card_id:
-                                reward_details.append(f"Card: {card_name} (ID: {card_id})")
+                                reward_details.append(f"Card: {card_name} (ID: {format_card_id(card_id)})")
                                 # Update inventory
                                 await conn.execute(
                                     """
@@ -137,6 +141,7 @@ class ClaimSelect(PaginatedSelect):
                     )
 
                     await conn.commit()
+                    bump_version(interaction.guild.id, INVENTORY)
 
                     # Prepare and send the embed
                     embed = discord.Embed(
@@ -264,12 +269,11 @@ class EventCog(commands.Cog):
 
     async def handle_set_reward(self, guild_id, set_id):
         async with aiosqlite.connect(db_path) as conn:
-            cursor = await conn.execute("""
-                SELECT cards.card_id, cards.rarity, cards.img_url, cards.name, cards.description 
-                FROM set_cards
-                JOIN cards ON set_cards.card_id = cards.card_id
-                WHERE set_cards.set_id = ? AND set_cards.guild_id = ? AND cards.guild_id = ?
-            """, (set_id, guild_id, guild_id))
+            cursor = await conn.execute(f"""
+                SELECT c.card_id, c.rarity, c.img_url, c.name, c.description
+                FROM {SET_CARDS}
+                WHERE sc.set_id = ? AND sc.guild_id = ?
+            """, (set_id, guild_id))
             cards = await cursor.fetchall()
 
         if not cards:
@@ -280,12 +284,18 @@ class EventCog(commands.Cog):
         if len(cards) == 1:
             chosen_card = cards[0]
         else:
-            rarity_weights = {"Common": 1, "Uncommon": 0.5, "Rare": 0.2, "Legendary": 0.01}
-            card_pool = [(card[0], rarity_weights.get(card[1], 1), card[2], card[3], card[4]) for card in cards]
-            probabilities = [weight for _, weight, _, _, _ in card_pool]
+            # Weighted by the guild's own rarity table; rarities without a weight count as fully common
+            rarities = await get_rarities(guild_id)
+            probabilities = []
+            for card in cards:
+                rarity = rarities.get(rarity_key(card[1]))
+                probabilities.append(rarity.weight if rarity and rarity.weight is not None else 1)
             total_prob = sum(probabilities)
-            normalized_probs = [prob / total_prob for prob in probabilities]
-            chosen_index = random.choices(range(len(card_pool)), weights=normalized_probs, k=1)[0]
+            if total_prob > 0:
+                normalized_probs = [prob / total_prob for prob in probabilities]
+                chosen_index = random.choices(range(len(cards)), weights=normalized_probs, k=1)[0]
+            else:
+                chosen_index = random.randrange(len(cards))
             chosen_card = cards[chosen_index]
 
         chosen_card_id, chosen_rarity, chosen_img_url, chosen_name, chosen_description = chosen_card
@@ -1,12 +1,14 @@
 import discord
 import logging
-import random
 import aiosqlite
 import os
+import time
 
-from discord.ext import commands
+from typing import NamedTuple, Optional
+from discord.ext import commands, tasks
 from discord import app_commands
 from core.utils import log_command_usage, check_permissions, get_embed_colour
+from core.versioning import INVENTORY, bump_version
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Database Configuration
@@ -20,6 +22,103 @@ db_path = './data/databases/tcg.db'
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# ---------------------------------------------------------------------------------------------------------------------
+# Lottery Draws
+# ---------------------------------------------------------------------------------------------------------------------
+# Every lottery is drawn at its draw_at time by the one scheduler loop in LotteryCog, whichever guild it belongs to,
+# or earlier by /lottery_end. The winning ticket is picked by a single query that also counts the tickets sold. The
+# event is closed and the prize paid out in the same transaction, so a lottery is never drawn twice and no ticket can
+# be bought after its winner was picked. A lottery that sold no tickets simply ends without a winner.
+
+WINNER_SHARE = 0.95  # Share of ticket sales paid out for a points prize; the rest goes to the house
+DRAW_CHECK_MINUTES = 1
+MAX_DRAW_HOURS = 24 * 30
+
+# Parameters (event_id,); returns (user_id, ticket_number, tickets sold) or nothing if no tickets were sold
+DRAW_WINNER_SQL = '''
+    SELECT user_id, ticket_number, COUNT(*) OVER ()
+    FROM lottery_tickets
+    WHERE event_id = ?
+    ORDER BY RANDOM()
+    LIMIT 1
+'''
+
+
+class LotteryDraw(NamedTuple):
+    event_id: int
+    guild_id: int
+    channel_id: Optional[int]
+    name: str
+    prize_type: str
+    winner_id: Optional[int]       # None when no tickets were sold
+    ticket_number: Optional[int]
+    prize: Optional[str]           # Points won or the card's name
+    img_url: Optional[str]
+
+
+async def draw_lottery(conn, event_id, house_user_id):
+    """Draw an active lottery and pay out its prize. Returns a LotteryDraw, or None if it was no longer active."""
+    await conn.commit()
+    await conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = await conn.execute(
+            "SELECT guild_id, channel_id, name, prize_type, card_prize, ticket_price "
+            "FROM lottery_events WHERE id = ? AND active = 1",
+            (event_id,)
+        )
+        event = await cursor.fetchone()
+        if not event:
+            await conn.rollback()
+            return None
+        guild_id, channel_id, name, prize_type, card_prize, ticket_price = event
+
+        cursor = await conn.execute(DRAW_WINNER_SQL, (event_id,))
+        winner = await cursor.fetchone()
+        winner_id = ticket_number = prize = img_url = None
+        if winner:
+            winner_id, ticket_number, ticket_count = winner
+            if prize_type == "points":
+                total_points = ticket_count * ticket_price
+                winner_prize = int(total_points * WINNER_SHARE)
+                await conn.executemany(
+                    "INSERT INTO economy (guild_id, user_id, balance) VALUES (?, ?, ?) "
+                    "ON CONFLICT(guild_id, user_id) DO UPDATE SET balance = balance + excluded.balance",
+                    [(guild_id, winner_id, winner_prize), (guild_id, house_user_id, total_points - winner_prize)]
+                )
+                prize = f"{winner_prize} points"
+            elif prize_type == "card" and card_prize is not None:
+                cursor = await conn.execute(
+                    "SELECT card_id, name, img_url FROM cards WHERE guild_id = ? AND card_id = ?",
+                    (guild_id, card_prize)
+                )
+                card = await cursor.fetchone()
+                if card:
+                    card_id, prize, img_url = card
+                    await conn.execute(
+                        "INSERT INTO user_inventory (guild_id, user_id, card_id, quantity) VALUES (?, ?, ?, 1) "
+                        "ON CONFLICT(guild_id, user_id, card_id) DO UPDATE SET quantity = quantity + 1",
+                        (guild_id, winner_id, card_id)
+                    )
+
+        await conn.execute("UPDATE lottery_events SET active = 0, winner_id = ? WHERE id = ?", (winner_id, event_id))
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+
+    if winner_id and prize_type == "card":
+        bump_version(guild_id, INVENTORY)
+    return LotteryDraw(event_id, guild_id, channel_id, name, prize_type, winner_id, ticket_number, prize, img_url)
+
+
+async def due_lotteries(conn, now=None):
+    """Return the IDs of active lotteries whose draw time has passed, earliest first."""
+    cursor = await conn.execute(
+        "SELECT id FROM lottery_events WHERE active = 1 AND draw_at <= ? ORDER BY draw_at",
+        (int(now or time.time()),)
+    )
+    return [row[0] for row in await cursor.fetchall()]
+
 # ---------------------------------------------------------------------------------------------------------------------
 # LotteryCog Class
 # ---------------------------------------------------------------------------------------------------------------------
@@ -28,6 +127,60 @@ class LotteryCog(commands.Cog):
         self.bot = bot
         self.house_user_id = 111941993629806592
 
+    async def cog_load(self):
+        self.run_draws.start()
+
+    async def cog_unload(self):
+        self.run_draws.cancel()
+
+    @tasks.loop(minutes=DRAW_CHECK_MINUTES)
+    async def run_draws(self):
+        draws = []
+        try:
+            async with aiosqlite.connect(db_path) as conn:
+                for event_id in await due_lotteries(conn):
+                    try:
+                        draw = await draw_lottery(conn, event_id, self.house_user_id)
+                    except Exception as e:
+                        logger.error(f"Lottery draw for event {event_id} failed: {e}")
+                        continue
+                    if draw:
+                        draws.append(draw)
+        except Exception as e:
+            logger.error(f"Lottery draw sweep failed: {e}")
+
+        for draw in draws:
+            if not draw.channel_id:
+                logger.info(f"Lottery {draw.event_id} was drawn but has no channel to announce in.")
+                continue
+            try:
+                embed = await self.draw_embed(draw)
+                content = f"<@{draw.winner_id}>" if draw.winner_id else None
+                await self.bot.get_partial_messageable(draw.channel_id).send(content=content, embed=embed)
+            except discord.HTTPException as e:
+                logger.warning(f"Could not announce the draw of lottery {draw.event_id}: {e}")
+
+    @run_draws.before_loop
+    async def before_run_draws(self):
+        await self.bot.wait_until_ready()
+
+    async def draw_embed(self, draw):
+        colour = await get_embed_colour(draw.guild_id)
+        embed = discord.Embed(title=f"🎉 {draw.name} Draw 🎉", color=colour)
+        if draw.winner_id:
+            embed.description = f"<@{draw.winner_id}> has won the `{draw.name}` lottery!"
+            embed.add_field(name="Winning Ticket Number", value=f"{draw.ticket_number}", inline=False)
+            if draw.prize:
+                embed.add_field(name="Prize", value=draw.prize if draw.prize_type == "points" else f"Card: {draw.prize}",
+                                inline=False)
+            if draw.img_url:
+                embed.set_image(url=draw.img_url)
+        else:
+            embed.description = f"No tickets were sold for `{draw.name}`, so there is no winner."
+        embed.add_field(name="Thank you for participating!", value="\u200b", inline=False)
+        embed.timestamp = discord.utils.utcnow()
+        return embed
+
     async def lottery_event_names_autocomplete(self, interaction: discord.Interaction, current: str):
         async with aiosqlite.connect(db_path) as conn:
             cursor = await conn.execute(
@@ -80,10 +233,11 @@ class LotteryCog(commands.Cog):
     @app_commands.command(description="Admin: Create a lottery event")
     @app_commands.describe(name="Name of the lottery event", prize_type="Type of prize (points or card)",
                            card_prize="Optional card prize (if applicable)",
-                           ticket_price="Price of a lottery ticket")
+                           ticket_price="Price of a lottery ticket",
+                           draw_in="Hours until the winner is drawn")
     @app_commands.autocomplete(prize_type=prize_type_autocomplete, card_prize=card_prize_autocomplete)
     async def lottery_create(self, interaction: discord.Interaction, name: str, prize_type: str, ticket_price: int,
-                             card_prize: str = None):
+                             card_prize: str = None, draw_in: app_commands.Range[int, 1, MAX_DRAW_HOURS] = 24):
         if not await check_permissions(interaction):
             await interaction.response.send_message(
                 "You do not have permission to use this command. An Admin needs to `/authorise` you!", ephemeral=True)
@@ -119,25 +273,24 @@ class LotteryCog(commands.Cog):
                                                         ephemeral=True)
                 return
 
-            # Generate a random number for the lottery event
-            lottery_number = random.randint(1, 5000)
-
+            # lottery_number is left over from instant-win lotteries; winners are now drawn at draw_at
+            draw_at = int(time.time()) + draw_in * 3600
             await conn.execute('''
-                INSERT INTO lottery_events (guild_id, name, prize_type, card_prize, ticket_price, active, lottery_number)
-                VALUES (?, ?, ?, ?, ?, 1, ?)
-            ''', (interaction.guild.id, name, prize_type, card_prize, ticket_price, lottery_number))
+                INSERT INTO lottery_events (guild_id, name, prize_type, card_prize, ticket_price, active, lottery_number,
+                                            draw_at, channel_id)
+                VALUES (?, ?, ?, ?, ?, 1, 0, ?, ?)
+            ''', (interaction.guild.id, name, prize_type, card_prize, ticket_price, draw_at, interaction.channel_id))
             await conn.commit()
 
+        created = f"Lottery event `{name}` created successfully! The winner will be drawn <t:{draw_at}:R>."
         if message_to_send:
-            await interaction.response.send_message(f"Lottery event `{name}` created successfully!\n"
-                                                    f"{message_to_send}",
-                                                    ephemeral=True)
+            await interaction.response.send_message(f"{created}\n{message_to_send}", ephemeral=True)
         else:
-            await interaction.response.send_message(f"Lottery event `{name}` created successfully!", ephemeral=True)
+            await interaction.response.send_message(created, ephemeral=True)
 
         await log_command_usage(self.bot, interaction)
 
-    @app_commands.command(description="Admin: End a lottery event")
+    @app_commands.command(description="Admin: End a lottery event now and draw its winner")
     @app_commands.describe(event_name="The ID of the lottery event")
     @app_commands.autocomplete(event_name=lottery_event_names_autocomplete)
     async def lottery_end(self, interaction: discord.Interaction, event_name: str):
@@ -149,26 +302,19 @@ class LotteryCog(commands.Cog):
 
         async with aiosqlite.connect(db_path) as conn:
             cursor = await conn.execute('''
-                SELECT id, name FROM lottery_events WHERE id = ? AND guild_id = ? AND active = 1
+                SELECT id FROM lottery_events WHERE id = ? AND guild_id = ? AND active = 1
             ''', (event_name, interaction.guild.id))
             event = await cursor.fetchone()
+            draw = await draw_lottery(conn, event[0], self.house_user_id) if event else None
 
-            if not event:
-                await interaction.response.send_message(
-                    "Lottery event not found or already ended.",
-                    ephemeral=True)
-                return
-
-            event_id, event_name = event
-
-            # Remove the lottery event and its tickets from the database
-            await conn.execute('DELETE FROM lottery_tickets WHERE event_id = ?', (event_id,))
-            await conn.execute('DELETE FROM lottery_events WHERE id = ?', (event_id,))
-            await conn.commit()
+        if not draw:
+            await interaction.response.send_message(
+                "Lottery event not found or already ended.",
+                ephemeral=True)
+            return
 
-        await interaction.response.send_message(
-            f"The lottery event `{event_name}` has been ended and removed from the database.",
-            ephemeral=True)
+        content = f"<@{draw.winner_id}>" if draw.winner_id else None
+        await interaction.response.send_message(content=content, embed=await self.draw_embed(draw))
         await log_command_usage(self.bot, interaction)
 
     # ---------------------------------------------------------------------------------------------------------------------
@@ -179,7 +325,7 @@ class LotteryCog(commands.Cog):
         colour = await get_embed_colour(interaction.guild.id)
         async with aiosqlite.connect(db_path) as conn:
             cursor = await conn.execute('''
-                SELECT name, prize_type, card_prize, ticket_price, lottery_number
+                SELECT name, prize_type, card_prize, ticket_price, draw_at
                 FROM lottery_events WHERE id = ? AND guild_id = ? AND active = 1
             ''', (event_name, interaction.guild.id))
             event = await cursor.fetchone()
@@ -188,7 +334,7 @@ class LotteryCog(commands.Cog):
                 await interaction.response.send_message("Lottery event not found or not active.", ephemeral=True)
                 return
 
-            name, prize_type, card_prize, ticket_price, lottery_number = event
+            name, prize_type, card_prize, ticket_price, draw_at = event
 
             cursor = await conn.execute('''
                 SELECT COUNT(*) FROM lottery_tickets WHERE event_id = ?
@@ -212,11 +358,13 @@ class LotteryCog(commands.Cog):
                     embed.add_field(name="Current Prize", value=f"Card: {card_name}", inline=False)
                     embed.set_image(url=card_img_url)
             elif prize_type == "points":
-                current_prize = int(ticket_price * entry_count * 0.95)  # 95% of total ticket sales
+                current_prize = int(ticket_price * entry_count * WINNER_SHARE)
                 embed.add_field(name="Current Prize", value=f"{current_prize} points", inline=False)
 
             embed.add_field(name="Ticket Price", value=f"{ticket_price} points", inline=False)
             embed.add_field(name="Number of Entries", value=str(entry_count), inline=False)
+            if draw_at:
+                embed.add_field(name="Draw", value=f"<t:{draw_at}:F> (<t:{draw_at}:R>)", inline=False)
             embed.set_thumbnail(url=self.bot.user.display_avatar.url)
 
             embed.set_footer(text=f"{name} Information")
@@ -241,7 +389,7 @@ class LotteryCog(commands.Cog):
         async with aiosqlite.connect(db_path) as conn:
             # Fetch the event details, including the name
             cursor = await conn.execute('''
-                SELECT id, name, ticket_price, lottery_number, prize_type, card_prize 
+                SELECT id, name, ticket_price, draw_at
                 FROM lottery_events WHERE id = ? AND guild_id = ? AND active = 1
             ''', (event_name, interaction.guild.id))
             event = await cursor.fetchone()
@@ -250,7 +398,7 @@ class LotteryCog(commands.Cog):
                 await interaction.response.send_message("Lottery event not found or not active.", ephemeral=True)
                 return
 
-            event_id, event_name, ticket_price, lottery_number, prize_type, card_prize = event
+            event_id, event_name, ticket_price, draw_at = event
 
             cursor = await conn.execute('''
                 SELECT balance FROM economy WHERE user_id = ? AND guild_id = ?
@@ -273,77 +421,40 @@ class LotteryCog(commands.Cog):
                     "This ticket number is already taken for this event. Please choose another number.", ephemeral=True)
                 return
 
-            # Deduct the ticket price from the user's balance
-            await conn.execute('''
-                UPDATE economy SET balance = balance - ? WHERE user_id = ? AND guild_id = ?
-            ''', (ticket_price, interaction.user.id, interaction.guild.id))
-
-            # Add ticket entry
-            await conn.execute('''
-                INSERT INTO lottery_tickets (event_id, user_id, ticket_number)
-                VALUES (?, ?, ?)
-            ''', (event_id, interaction.user.id, ticket_number))
+            # The checks above only pick the message; the writes below re-check everything, since other purchases
+            # and the draw may have run in between. The ticket is added only while the event is still open, and
+            # this write takes the database lock first, so a draw either sees the ticket or has already closed
+            # the event and nothing is charged.
+            try:
+                cursor = await conn.execute('''
+                    INSERT INTO lottery_tickets (event_id, user_id, ticket_number)
+                    SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM lottery_events WHERE id = ? AND active = 1)
+                ''', (event_id, interaction.user.id, ticket_number, event_id))
+            except aiosqlite.IntegrityError:
+                await conn.rollback()
+                await interaction.response.send_message(
+                    "This ticket number is already taken for this event. Please choose another number.", ephemeral=True)
+                return
+            if not cursor.rowcount:
+                await conn.rollback()
+                await interaction.response.send_message("This lottery has just been drawn.", ephemeral=True)
+                return
 
+            # Deduct the ticket price only if the balance still covers it
+            cursor = await conn.execute('''
+                UPDATE economy SET balance = balance - ? WHERE user_id = ? AND guild_id = ? AND balance >= ?
+            ''', (ticket_price, interaction.user.id, interaction.guild.id, ticket_price))
+            if not cursor.rowcount:
+                await conn.rollback()
+                await interaction.response.send_message("You do not have enough points to buy a ticket.",
+                                                        ephemeral=True)
+                return
             await conn.commit()
 
-            # Check if the purchased ticket is the winning number
-            if ticket_number == lottery_number:
-                # Award the prize immediately
-                if prize_type == "points":
-                    cursor = await conn.execute('''
-                        SELECT COUNT(*) FROM lottery_tickets WHERE event_id = ?
-                    ''', (event_id,))
-                    ticket_count_row = await cursor.fetchone()
-                    ticket_count = ticket_count_row[0]
-
-                    total_points = ticket_count * ticket_price
-                    winner_prize = int(total_points * 0.95)
-                    house_cut = total_points - winner_prize
-                    await conn.execute(
-                        "UPDATE economy SET balance = balance + ? WHERE user_id = ? AND guild_id = ?",
-                        (winner_prize, interaction.user.id, interaction.guild.id))
-                    await conn.execute(
-                        "UPDATE economy SET balance = balance + ? WHERE user_id = ? AND guild_id = ?",
-                        (house_cut, self.house_user_id, interaction.guild.id))
-                elif prize_type == "card" and card_prize:
-                    cursor = await conn.execute(
-                        "SELECT card_id, img_url FROM cards WHERE card_id = ? AND guild_id = ?", (card_prize, interaction.guild.id))
-                    card = await cursor.fetchone()
-                    if card:
-                        card_id, img_url = card[0], card[1]
-                        await conn.execute(
-                            "INSERT INTO user_inventory (guild_id, user_id, card_id, quantity) VALUES (?, ?, ?, 1) "
-                            "ON CONFLICT(guild_id, user_id, card_id) DO UPDATE SET quantity = quantity + 1",
-                            (interaction.guild.id, interaction.user.id, card_id))
-
-                # End the lottery event
-                await conn.execute('UPDATE lottery_events SET active = 0 WHERE id = ?', (event_id,))
-                await conn.commit()
-
-                colour = await get_embed_colour(interaction.guild.id)
-                embed = discord.Embed(
-                    title="🎉 Congratulations! 🎉",
-                    description=f"You've won the `{event_name}` lottery!",
-                    color=colour
-                )
-                embed.add_field(name="Winning Ticket Number", value=f"{ticket_number}", inline=False)
-
-                if prize_type == "points":
-                    embed.add_field(name="Prize", value=f"{winner_prize} points", inline=False)
-                elif prize_type == "card":
-                    embed.add_field(name="Prize", value=f"Card: {card_prize}", inline=False)
-                    embed.set_thumbnail(url=img_url)
-
-                embed.add_field(name="Thank you for participating!", value="\u200b", inline=False)
-                embed.set_thumbnail(url=interaction.user.display_avatar.url)
-                embed.timestamp = discord.utils.utcnow()
-
-                await interaction.response.send_message(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message(
-                    f"You have successfully purchased ticket number `{ticket_number}` for "
-                    f"`{event_name}`. Unfortunately, this is not the winning number.",
-                    ephemeral=True)
+            draw_note = f" The winner will be drawn <t:{draw_at}:R>." if draw_at else ""
+            await interaction.response.send_message(
+                f"You have successfully purchased ticket number `{ticket_number}` for `{event_name}`.{draw_note}",
+                ephemeral=True)
 
         await log_command_usage(self.bot, interaction)
 
@@ -376,6 +487,24 @@ async def setup(bot):
             )
         ''')
 
+        cursor = await conn.execute("PRAGMA table_info(lottery_events)")
+        columns = [column[1] for column in await cursor.fetchall()]
+        if 'draw_at' not in columns:
+            await conn.execute('ALTER TABLE lottery_events ADD COLUMN draw_at INTEGER')
+            await conn.execute('ALTER TABLE lottery_events ADD COLUMN channel_id INTEGER')
+            await conn.execute('ALTER TABLE lottery_events ADD COLUMN winner_id INTEGER')
+            # Instant-win lotteries had no draw time; draw the ones still open a day from now
+            await conn.execute(
+                "UPDATE lottery_events SET draw_at = ? WHERE active = 1",
+                (int(time.time()) + 24 * 3600,)
+            )
+            logger.info("Added draw columns to 'lottery_events' table.")
+
+        # The scheduler looks up active lotteries by draw time
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_lottery_events_draw ON lottery_events (active, draw_at)
+        ''')
+
         await conn.commit()
     await bot.add_cog(LotteryCog(bot))
 
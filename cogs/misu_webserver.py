@@ -1,21 +1,43 @@
 import os
 import io
+import sys
 import json
+import base64
+import asyncio
 import random
 import logging
 import sqlite3
 import requests
 import socket
+import uuid
+import threading
+import aiohttp
+import aiosqlite
 from threading import Thread
 from datetime import datetime
-from functools import lru_cache
+from functools import lru_cache, wraps
+from contextlib import asynccontextmanager, closing
+from urllib.parse import unquote_to_bytes
+from aiohttp import web
 from discord.ext import commands
-from flask import Flask, request, render_template, url_for, redirect, session, jsonify, Response
+from flask import Flask, request, render_template, url_for, redirect, session, jsonify, Response, make_response, \
+    send_file
 
-from waitress import serve
+from waitress import serve, create_server
 from werkzeug.middleware.proxy_fix import ProxyFix
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
-from config import DISCORD_TOKEN, DISCORD_CLIENT_ID, DISCORD_CLIENT_SECRET, DISCORD_REDIRECT_URL
+from config import DISCORD_TOKEN, DISCORD_CLIENT_ID, DISCORD_CLIENT_SECRET, DISCORD_REDIRECT_URL, WEB_SERVER_MODE, \
+    WEB_DB_POOL_SIZE, WEB_THREADS, WEB_BACKLOG, WEB_CHANNEL_TIMEOUT, WEB_CONNECTION_LIMIT, WEB_OFFLOAD_WORKERS, \
+    WEB_OFFLOAD_QUEUE_LIMIT
+from core.versioning import CARDS, SETS, INVENTORY, bump_version, make_etag
+from core.rarities import ADD_RARITY_SQL, UPSERT_RARITY_SQL, invalidate_rarities, rarity_key
+from core.card_ids import ALLOCATE_CARD_IDS_SQL, LAST_CARD_ID_SQL
+from core.joins import INVENTORY_CARDS, SET_CARDS
+from core.image_store import RELEASE_CARD_IMAGE_SQL
+from core.exporter import EXPORT_CARDS_QUERY, SetExportEncoder, iter_set_export, encode_chunks, export_filename, \
+    load_preset_bytes, PresetTooLargeError, MAX_PRESET_BYTES
+from core.bulk_cards import MAX_ARCHIVE_BYTES
 
 RUN_IN_IDE = False
 
@@ -92,6 +114,358 @@ def fetch_guild_info(guild_id):
         return response.json()
     return None
 
+# ---------------------------------------------------------------------------------------------------------------------
+# Pagination Helpers
+# ---------------------------------------------------------------------------------------------------------------------
+
+PAGE_LIMIT_DEFAULT = 50
+PAGE_LIMIT_MAX = 200
+
+
+def wants_pagination(args=None):
+    """Paginated responses are opt-in so existing dashboard calls keep receiving plain arrays."""
+    args = request.args if args is None else args
+    return any(arg in args for arg in ('limit', 'cursor', 'q'))
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class QueryArgError(ValueError):
+    """A malformed query argument; the JSON routes answer it with a 400 instead of failing the request."""
+
+
+def parse_guild_id(guild_id):
+    try:
+        return int(guild_id)
+    except (TypeError, ValueError):
+        raise QueryArgError("Invalid guild ID") from None
+
+
+def parse_page_args(args=None, cursor_size=2):
+    """Return (limit, cursor values, search term) from the query string."""
+    args = request.args if args is None else args
+    try:
+        limit = int(args.get('limit', PAGE_LIMIT_DEFAULT))
+    except ValueError:
+        limit = PAGE_LIMIT_DEFAULT
+    limit = max(1, min(limit, PAGE_LIMIT_MAX))
+    cursor = decode_cursor(args.get('cursor'))
+    if args.get('cursor') and (cursor is None or len(cursor) != cursor_size):
+        raise QueryArgError("Invalid cursor")
+    q = (args.get('q') or '').strip()
+    return limit, cursor, q
+
+
+def optional_page_args(args=None, cursor_size=2):
+    """parse_page_args() for paginated calls; (None, None, '') when the caller wants the plain array."""
+    if not wants_pagination(args):
+        return None, None, ''
+    return parse_page_args(args, cursor_size)
+
+
+def like_pattern(q):
+    escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def page_payload(items, rows, limit, cursor_key):
+    """Build the paginated body; rows holds up to limit + 1 entries so we know if another page exists."""
+    next_cursor = encode_cursor(cursor_key(rows[limit - 1])) if len(rows) > limit else None
+    return {"items": items[:limit], "next_cursor": next_cursor}
+
+
+def card_page_query(guild_id, limit, cursor, q):
+    """Keyset page over a guild's cards ordered by (name, card_id)."""
+    query = "SELECT card_id, name FROM cards WHERE guild_id = ?"
+    params = [guild_id]
+    if q:
+        query += " AND name LIKE ? ESCAPE '\\'"
+        params.append(like_pattern(q))
+    if cursor and len(cursor) == 2:
+        query += " AND (name, card_id) > (?, ?)"
+        params.extend(cursor)
+    query += " ORDER BY name, card_id LIMIT ?"
+    params.append(limit + 1)
+    return query, params
+
+
+# Shared by the Flask and aiohttp routes: parameters (guild_id, user_id) and (guild_id, set_id)
+USER_CARDS_SQL = f"""
+    SELECT c.card_id, c.name, ui.quantity
+    FROM {INVENTORY_CARDS}
+    WHERE ui.guild_id = ? AND ui.user_id = ?
+"""
+SET_CARDS_SQL = f"""
+    SELECT c.card_id, c.name
+    FROM {SET_CARDS}
+    WHERE sc.guild_id = ? AND sc.set_id = ?
+"""
+
+
+def user_card_page_query(guild_id, user_id, limit, cursor, q):
+    """Keyset page over one user's inventory ordered by (name, card_id)."""
+    query = USER_CARDS_SQL
+    params = [guild_id, user_id]
+    if q:
+        query += " AND c.name LIKE ? ESCAPE '\\'"
+        params.append(like_pattern(q))
+    if cursor and len(cursor) == 2:
+        query += " AND (c.name, c.card_id) > (?, ?)"
+        params.extend(cursor)
+    query += " ORDER BY c.name, c.card_id LIMIT ?"
+    params.append(limit + 1)
+    return query, params
+
+
+def fetch_card_page(conn, guild_id, limit, cursor, q):
+    query, params = card_page_query(guild_id, limit, cursor, q)
+    return conn.execute(query, params).fetchall()
+
+# ---------------------------------------------------------------------------------------------------------------------
+# JSON Payloads
+# ---------------------------------------------------------------------------------------------------------------------
+# Row shaping for the dashboard's JSON endpoints, shared by the Flask routes and AsyncDashboardServer so both
+# answer with the same bodies. Each takes the fetched rows and, for paginated calls, the page limit.
+
+CARD_NAMES_SQL = "SELECT card_id, name FROM cards WHERE guild_id = ?"
+USER_IDS_SQL = "SELECT DISTINCT user_id FROM user_inventory WHERE guild_id = ?"
+SETS_SQL = "SELECT set_id, name, description FROM card_sets WHERE guild_id = ?"
+
+
+def card_cursor_key(row):
+    return row[1], row[0]
+
+
+def build_page(items, rows, limit, cursor_key=card_cursor_key):
+    return items if limit is None else page_payload(items, rows, limit, cursor_key)
+
+
+def build_card_names(rows, limit=None):
+    return build_page([row[1] for row in rows], rows, limit)
+
+
+def build_all_cards(rows, limit=None):
+    return build_page([{"card_id": row[0], "name": row[1]} for row in rows], rows, limit)
+
+
+def build_user_cards(rows, limit=None):
+    return build_page([{"card_id": row[0], "name": row[1], "quantity": row[2]} for row in rows], rows, limit)
+
+
+def build_users(guild, rows):
+    return [{"user_id": str(row[0]), "username": member_display_name(guild, row[0])} for row in rows]
+
+
+def build_user_page(users, limit):
+    return page_payload(users, users, limit, lambda user: (int(user["user_id"]),))
+
+
+def build_sets(rows):
+    return [{"id": row[0], "name": row[1], "description": row[2]} for row in rows]
+
+
+def build_set_cards(rows):
+    return [{"card_id": row[0], "name": row[1]} for row in rows]
+
+
+def build_presets(filenames):
+    return [f.replace('.json', '') for f in filenames if f.endswith('.json')]
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Conditional Requests
+# ---------------------------------------------------------------------------------------------------------------------
+
+# Member nicknames change without any write on our side, so user listings also roll over on a short interval
+MEMBER_NAME_TTL = 300
+
+
+def preset_dir_stamp():
+    try:
+        return os.stat(PRESET_DIR).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def member_name_stamp():
+    return int(datetime.now().timestamp() // MEMBER_NAME_TTL)
+
+
+def conditional(*scopes, extra=None):
+    """Tag JSON responses with the guild's data versions and answer If-None-Match before the view runs."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            guild_id = kwargs.get('guild_id') or request.args.get('guild_id') or 0
+            etag = make_etag(guild_id, scopes, *(extra() if extra else ()))
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Offloaded Work
+# ---------------------------------------------------------------------------------------------------------------------
+
+OFFLOAD_JOB_HISTORY = 200
+SYNC_PRESET_CARD_LIMIT = 200  # Presets up to this size are imported within the request so errors reach the user
+
+
+class TrackedThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that counts queued and running work so the pool can be sized from /server_metrics."""
+
+    def __init__(self, max_workers, queue_limit):
+        super().__init__(max_workers=max_workers, thread_name_prefix='misu-web')
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self._stats_lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._stats_lock:
+            self.pending += 1
+        return self._submit_counted(fn, args, kwargs)
+
+    def _submit_counted(self, fn, args, kwargs):
+        """Hand work already counted in `pending` to the pool."""
+        def run():
+            with self._stats_lock:
+                self.active += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+                    self.pending -= 1
+                    self.completed += 1
+
+        try:
+            return super().submit(run)
+        except Exception:
+            with self._stats_lock:
+                self.pending -= 1
+            raise
+
+    def try_submit(self, fn, *args, **kwargs):
+        """Submit unless the backlog is full, in which case return None so the caller can shed load."""
+        # The slot is taken under the same lock as the check, so concurrent callers cannot all squeeze past it
+        with self._stats_lock:
+            if self.pending >= self.max_workers + self.queue_limit:
+                self.rejected += 1
+                return None
+            self.pending += 1
+        return self._submit_counted(fn, args, kwargs)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "workers": self.max_workers,
+                "active": self.active,
+                "queued": max(self.pending - self.active, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+offload_jobs = OrderedDict()
+offload_jobs_lock = threading.Lock()
+
+
+def start_offload_job(fn, *args):
+    future = app.executor.try_submit(fn, *args)
+    if future is None:
+        return None
+    return register_offload_job(future)
+
+
+def register_offload_job(future):
+    """Track any concurrent future (pool work or a coroutine scheduled on the bot loop) under a pollable job ID."""
+    job_id = uuid.uuid4().hex
+    with offload_jobs_lock:
+        offload_jobs[job_id] = future
+        while len(offload_jobs) > OFFLOAD_JOB_HISTORY:
+            offload_jobs.popitem(last=False)
+    return job_id
+
+
+def offload_job_payload(job_id):
+    """Describe a tracked job for polling, or return None if the ID is unknown or has aged out."""
+    with offload_jobs_lock:
+        future = offload_jobs.get(job_id)
+    if future is None:
+        return None
+    if not future.done():
+        return {"status": "running" if future.running() else "queued"}
+    if future.exception():
+        return {"status": "failed", "error": str(future.exception())}
+    result = future.result()
+    payload = {"status": "done" if result else "skipped"}
+    if isinstance(result, (list, dict)):
+        payload["result"] = result
+    return payload
+
+
+def busy_response():
+    return Response("Error: The dashboard is busy, please try again shortly.", status=503,
+                    headers={"Retry-After": "5"})
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Local Image Serving
+# ---------------------------------------------------------------------------------------------------------------------
+
+CARD_IMAGE_ROOT = os.path.realpath('./data/card_images')
+# A card's image can change when it is edited, so card-addressed responses are revalidated quickly; blobs are
+# content-addressed and never change.
+CARD_IMAGE_MAX_AGE = 300
+BLOB_IMAGE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def local_image_path(path):
+    """Resolve a stored image path, refusing anything outside the card image directory.
+
+    local_img_url can arrive through imported presets, so it is never trusted as a filesystem path on its own.
+    """
+    if not path:
+        return None
+    resolved = os.path.realpath(path)
+    if os.path.commonpath([resolved, CARD_IMAGE_ROOT]) != CARD_IMAGE_ROOT or not os.path.isfile(resolved):
+        return None
+    return resolved
+
+
+def send_card_image(path, max_age, immutable=False):
+    # conditional=True answers If-None-Match, If-Modified-Since and Range requests; the body goes through the server's
+    # wsgi.file_wrapper where one is available instead of being read into memory
+    response = send_file(path, conditional=True, etag=True, max_age=max_age)
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
 # ---------------------------------------------------------------------------------------------------------------------
 # Flask Routes
 # ---------------------------------------------------------------------------------------------------------------------
@@ -122,18 +496,24 @@ def tos():
 
 
 @app.route('/get_card_names')
+@conditional(CARDS)
 def get_card_names():
     guild_id = request.args.get('guild_id')
     if not guild_id:
         return jsonify([])
 
+    try:
+        limit, cursor, q = optional_page_args()
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
+
     with sqlite3.connect(db_path) as conn:
-        cursor = conn.execute('''
-            SELECT name FROM cards WHERE guild_id = ?
-        ''', (guild_id,))
-        card_names = [row[0] for row in cursor.fetchall()]
+        if limit is not None:
+            rows = fetch_card_page(conn, guild_id, limit, cursor, q)
+        else:
+            rows = conn.execute(CARD_NAMES_SQL, (guild_id,)).fetchall()
 
-    return jsonify(card_names)
+    return jsonify(build_card_names(rows, limit))
 
 @app.route('/auth/callback')
 def auth_callback():
@@ -329,9 +709,13 @@ def settings(guild_id):
     if 'embed_color' in settings and not settings['embed_color'].startswith('#'):
         settings['embed_color'] = f"#{settings['embed_color']}"
 
+    # Background work started by the previous request (large preset imports, card uploads) reports back here
+    job_id = request.args.get('job')
+    job = offload_job_payload(job_id) if job_id else None
+
     return render_template('settings.html', user=user, guild=guild, settings=settings,
                            lotteries=lotteries, burn_settings=burn_settings, rarities=rarities,
-                           events=events, sets=sets, cards=cards, active_tab=active_tab)
+                           events=events, sets=sets, cards=cards, active_tab=active_tab, job=job)
 
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -769,9 +1153,10 @@ def update_burn_settings(guild_id):
         conn.execute('''
             UPDATE rarity_weights
             SET burn_value = ?
-            WHERE guild_id = ? AND rarity = ?
-        ''', (burn_value, guild_id, rarity))
+            WHERE guild_id = ? AND rarity_key = ?
+        ''', (burn_value, guild_id, rarity_key(rarity)))
         conn.commit()
+    invalidate_rarities(guild_id)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='burn'))
 
@@ -827,14 +1212,9 @@ def update_rarity_settings(guild_id):
 
     # Update the rarity in the database
     with sqlite3.connect(db_path) as conn:
-        conn.execute('''
-            INSERT INTO rarity_weights (guild_id, rarity, weight, burn_value)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(guild_id, rarity) DO UPDATE SET 
-                weight = excluded.weight, 
-                burn_value = excluded.burn_value
-        ''', (guild_id, rarity, weight, burn_value))
+        conn.execute(UPSERT_RARITY_SQL, (guild_id, rarity, weight, burn_value))
         conn.commit()
+    invalidate_rarities(guild_id)
 
     # Redirect back to the settings page using the same active_tab
     return redirect(url_for('settings', guild_id=guild_id, active_tab=active_tab))
@@ -875,12 +1255,9 @@ def create_rarity(guild_id):
         return "Error: Weight must be a number and burn value must be an integer", 400
 
     with sqlite3.connect(db_path) as conn:
-        conn.execute('''
-            INSERT INTO rarity_weights (guild_id, rarity, weight, burn_value)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(guild_id, rarity) DO NOTHING
-        ''', (guild_id, rarity, weight, burn_value))
+        conn.execute(ADD_RARITY_SQL, (guild_id, rarity, weight, burn_value))
         conn.commit()
+    invalidate_rarities(guild_id)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='rarities'))
 
@@ -911,8 +1288,9 @@ def delete_rarity(guild_id):
         return "Error: No rarity selected", 400
 
     with sqlite3.connect(db_path) as conn:
-        conn.execute('DELETE FROM rarity_weights WHERE guild_id = ? AND rarity = ?', (guild_id, rarity))
+        conn.execute('DELETE FROM rarity_weights WHERE guild_id = ? AND rarity_key = ?', (guild_id, rarity_key(rarity)))
         conn.commit()
+    invalidate_rarities(guild_id)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='rarities'))
 
@@ -948,11 +1326,9 @@ def reset_rarities(guild_id):
     with sqlite3.connect(db_path) as conn:
         conn.execute('DELETE FROM rarity_weights WHERE guild_id = ?', (guild_id,))
         for rarity, weight, burn_value in default_rarities:
-            conn.execute('''
-                INSERT INTO rarity_weights (guild_id, rarity, weight, burn_value)
-                VALUES (?, ?, ?, ?)
-            ''', (guild_id, rarity, weight, burn_value))
+            conn.execute(ADD_RARITY_SQL, (guild_id, rarity, weight, burn_value))
         conn.commit()
+    invalidate_rarities(guild_id)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='rarities'))
 
@@ -1189,25 +1565,25 @@ def delete_event(guild_id):
 # ---------------------------------------------------------------------------------------------------------------------
 # ---------------------------------------------------------------------------------------------------------------------
 @app.route('/get_user_cards/<guild_id>', methods=['GET'])
+@conditional(INVENTORY, CARDS)
 def get_user_cards(guild_id):
     user_id = request.args.get('user_id')
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
 
+    try:
+        limit, cursor, q = optional_page_args()
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         with sqlite3.connect(db_path) as conn:
-            cursor = conn.execute("""
-                SELECT c.card_id, c.name, uc.quantity
-                FROM user_inventory uc
-                JOIN cards c ON uc.card_id = c.card_id
-                WHERE uc.guild_id = ? AND uc.user_id = ?
-            """, (guild_id, user_id))
-
-            user_cards = [
-                {"card_id": row[0], "name": row[1], "quantity": row[2]}
-                for row in cursor.fetchall()
-            ]
+            if limit is not None:
+                rows = conn.execute(*user_card_page_query(guild_id, user_id, limit, cursor, q)).fetchall()
+            else:
+                rows = conn.execute(USER_CARDS_SQL, (guild_id, user_id)).fetchall()
 
+        user_cards = build_user_cards(rows, limit)
         logger.debug(f"User {user_id} in Guild {guild_id} has Cards: {user_cards}")
         return jsonify(user_cards)
 
@@ -1216,35 +1592,85 @@ def get_user_cards(guild_id):
         return jsonify({"error": "Failed to fetch user cards"}), 500
 
 
+def member_display_name(guild, user_id):
+    member = guild.get_member(int(user_id))  # Fetch from bot's cache
+    if member:
+        return member.nick or member.name  # Prefer nickname
+    return f"Unknown User {user_id}"  # Fallback
+
+
+USER_PAGE_QUERY = """
+    SELECT DISTINCT user_id FROM user_inventory
+    WHERE guild_id = ? AND user_id > ?
+    ORDER BY user_id LIMIT ?
+"""
+
+
+def collect_users(guild, rows, needle, users, limit):
+    for (user_id,) in rows:
+        username = member_display_name(guild, user_id)
+        if not needle or needle in username.lower() or needle in str(user_id):
+            users.append({"user_id": str(user_id), "username": username})
+            if len(users) > limit:
+                return
+
+
+def user_page_start(cursor):
+    """The user_id a users page resumes after; user cursors carry a single integer."""
+    if not cursor:
+        return -1
+    if not isinstance(cursor[0], int):
+        raise QueryArgError("Invalid cursor")
+    return cursor[0]
+
+
+def user_chunk_size(limit, q):
+    return limit + 1 if not q else max(PAGE_LIMIT_MAX, limit + 1)
+
+
+def fetch_user_page(guild, guild_id, limit, after, q):
+    """Keyset page over users holding cards, ordered by user_id.
+
+    Names live in the bot's member cache rather than SQLite, so a search scans forward in
+    fixed-size chunks and filters in Python until the page is full.
+    """
+    chunk_size = user_chunk_size(limit, q)
+    users = []
+
+    with sqlite3.connect(db_path) as conn:
+        while len(users) <= limit:
+            rows = conn.execute(USER_PAGE_QUERY, (guild_id, after, chunk_size)).fetchall()
+            collect_users(guild, rows, q.lower(), users, limit)
+            if len(rows) < chunk_size:
+                break
+            after = rows[-1][0]
+
+    return users
+
+
 @app.route('/get_users/<guild_id>', methods=['GET'])
+@conditional(INVENTORY, extra=lambda: (member_name_stamp(),))
 def get_users(guild_id):
     bot = app.bot
-    guild = bot.get_guild(int(guild_id))
+    try:
+        guild = bot.get_guild(parse_guild_id(guild_id))
+        limit, cursor, q = optional_page_args(cursor_size=1)
+        after = user_page_start(cursor)
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
 
     if not guild:
         return jsonify({"error": "Guild not found"}), 404
 
     try:
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.execute("""
-                SELECT DISTINCT user_id FROM user_inventory WHERE guild_id = ?
-            """, (guild_id,))
-            user_ids = [str(row[0]) for row in cursor.fetchall()]  # ✅ Ensure IDs remain strings
-
-        if not user_ids:
-            return jsonify([])
-
-        users = []
-        for user_id in user_ids:
-            member = guild.get_member(int(user_id))  # Fetch from bot's cache
-            if member:
-                username = member.nick or member.name  # Prefer nickname
-            else:
-                username = f"Unknown User {user_id}"  # Fallback
+        if limit is not None:
+            users = fetch_user_page(guild, guild_id, limit, after, q)
+            return jsonify(build_user_page(users, limit))
 
-            users.append({"user_id": str(user_id), "username": username})  # ✅ Ensure `user_id` is always a string
+        with sqlite3.connect(db_path) as conn:
+            rows = conn.execute(USER_IDS_SQL, (guild_id,)).fetchall()
 
-        return jsonify(users)
+        return jsonify(build_users(guild, rows))
 
     except Exception as e:
         logger.error(f"Error fetching users: {e}")
@@ -1253,14 +1679,20 @@ def get_users(guild_id):
 
 # Fetch all cards in the guild
 @app.route('/get_all_cards/<guild_id>', methods=['GET'])
+@conditional(CARDS)
 def get_all_cards(guild_id):
+    try:
+        limit, cursor, q = optional_page_args()
+    except QueryArgError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         with sqlite3.connect(db_path) as conn:
-            cursor = conn.execute("""
-                SELECT card_id, name FROM cards WHERE guild_id = ?
-            """, (guild_id,))
-            cards = [{"card_id": row[0], "name": row[1]} for row in cursor.fetchall()]
-        return jsonify(cards)
+            if limit is not None:
+                rows = fetch_card_page(conn, guild_id, limit, cursor, q)
+            else:
+                rows = conn.execute(CARD_NAMES_SQL, (guild_id,)).fetchall()
+        return jsonify(build_all_cards(rows, limit))
     except Exception as e:
         logger.error(f"Error fetching all cards: {e}")
         return jsonify({"error": "Failed to fetch cards"}), 500
@@ -1298,19 +1730,51 @@ def create_card(guild_id):
         cursor = conn.cursor()
 
         # Generate a new card ID
-        cursor.execute("SELECT MAX(CAST(card_id AS INTEGER)) FROM cards WHERE guild_id = ?", (guild_id,))
-        max_card_id = cursor.fetchone()[0]
-        new_card_id = max_card_id + 1 if max_card_id else 1
+        cursor.execute(ALLOCATE_CARD_IDS_SQL, (guild_id, 1))
+        new_card_id = cursor.execute(LAST_CARD_ID_SQL, (guild_id,)).fetchone()[0]
 
         cursor.execute('''
             INSERT INTO cards (guild_id, card_id, name, description, rarity, img_url) 
             VALUES (?, ?, ?, ?, ?, ?)
-        ''', (guild_id, str(new_card_id), card_name, description, rarity, img_url))
+        ''', (guild_id, new_card_id, card_name, description, rarity, img_url))
         conn.commit()
+        bump_version(guild_id, CARDS)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='cards'))
 
 
+@app.route('/bulk_create_cards/<guild_id>', methods=['POST'])
+def bulk_create_cards(guild_id):
+    if 'access_token' not in session or 'expires_at' not in session or session[
+        'expires_at'] < datetime.now().timestamp():
+        return redirect(url_for('login'))
+
+    user_guilds = fetch_user_guilds(session["access_token"])
+    user_guild = next((g for g in user_guilds if g['id'] == guild_id), None)
+    if not user_guild or not ((int(user_guild['permissions']) & 0x8) == 0x8):
+        return "Error: You do not have permission to manage this guild", 403
+
+    file = request.files.get('bulk_file')
+    if not file or file.filename == '':
+        return "Error: No file selected", 400
+    if not file.filename.lower().endswith('.zip'):
+        return "Error: Invalid file type. Please upload a .zip archive.", 400
+
+    card_cog = app.bot.get_cog('CardCog')
+    if card_cog is None:
+        return "Error: Card functionality is unavailable", 503
+
+    data = file.stream.read(MAX_ARCHIVE_BYTES + 1)
+    if len(data) > MAX_ARCHIVE_BYTES:
+        return f"Error: The archive is larger than {MAX_ARCHIVE_BYTES // (1024 * 1024)} MB.", 413
+
+    # Moderation and uploads belong to the bot, so the work runs on its event loop; poll /offload_job for results
+    future = asyncio.run_coroutine_threadsafe(card_cog.bulk_create_cards(int(guild_id), data), app.bot.loop)
+    job_id = register_offload_job(future)
+
+    return redirect(url_for('settings', guild_id=guild_id, active_tab='cards', job=job_id))
+
+
 @app.route('/edit_card/<guild_id>', methods=['POST'])
 def edit_card(guild_id):
     if 'access_token' not in session or 'expires_at' not in session or session[
@@ -1330,12 +1794,24 @@ def edit_card(guild_id):
 
     with sqlite3.connect(db_path) as conn:
         cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        row = cursor.execute("SELECT img_url FROM cards WHERE guild_id = ? AND card_id = ?",
+                             (guild_id, card_id)).fetchone()
+        if row and row[0] != new_img_url:
+            # A new link replaces the stored image, so the card lets go of its blob and local copy
+            cursor.execute(RELEASE_CARD_IMAGE_SQL, (card_id, guild_id))
         cursor.execute('''
             UPDATE cards 
-            SET name = ?, description = ?, rarity = ?, img_url = ? 
+            SET name = ?, description = ?, rarity = ?, img_url = ?,
+                thumb_url = CASE WHEN img_url IS ? THEN thumb_url END,
+                img_expires_at = CASE WHEN img_url IS ? THEN img_expires_at END,
+                image_hash = CASE WHEN img_url IS ? THEN image_hash END,
+                local_img_url = CASE WHEN img_url IS ? THEN local_img_url END
             WHERE guild_id = ? AND card_id = ?
-        ''', (new_name, new_description, new_rarity, new_img_url, guild_id, card_id))
+        ''', (new_name, new_description, new_rarity, new_img_url, new_img_url, new_img_url, new_img_url, new_img_url,
+              guild_id, card_id))
         conn.commit()
+        bump_version(guild_id, CARDS)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='cards'))
 
@@ -1349,8 +1825,10 @@ def delete_card(guild_id):
     card_id = request.form.get('card_id')
 
     with sqlite3.connect(db_path) as conn:
+        conn.execute(RELEASE_CARD_IMAGE_SQL, (card_id, guild_id))
         conn.execute("DELETE FROM cards WHERE guild_id = ? AND card_id = ?", (guild_id, card_id))
         conn.commit()
+        bump_version(guild_id, CARDS)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='cards'))
 
@@ -1388,6 +1866,7 @@ def give_card(guild_id):
                            (guild_id, user_id, card_id))
 
         conn.commit()
+        bump_version(guild_id, INVENTORY)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='cards'))
 
@@ -1416,6 +1895,7 @@ def remove_card(guild_id):
                            (user_id, card_id, guild_id))
 
         conn.commit()
+        bump_version(guild_id, INVENTORY)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='cards'))
 
@@ -1423,31 +1903,24 @@ def remove_card(guild_id):
 # ---------------------------------------------------------------------------------------------------------------------
 
 @app.route('/get_sets/<guild_id>', methods=['GET'])
+@conditional(SETS)
 def get_sets(guild_id):
     with sqlite3.connect(db_path) as conn:
-        cursor = conn.execute("SELECT set_id, name, description FROM card_sets WHERE guild_id = ?", (guild_id,))
-        sets = [{"id": row[0], "name": row[1], "description": row[2]} for row in cursor.fetchall()]
-    return jsonify(sets)
+        rows = conn.execute(SETS_SQL, (guild_id,)).fetchall()
+    return jsonify(build_sets(rows))
 
 @app.route('/get_cards_in_set/<guild_id>/<set_id>', methods=['GET'])
+@conditional(SETS, CARDS)
 def get_cards_in_set(guild_id, set_id):
     with sqlite3.connect(db_path) as conn:
-        # Print all set_cards data
-        cursor = conn.execute("SELECT * FROM set_cards WHERE guild_id = ?", (guild_id,))
-
         # Fetch cards linked to the set
-        cursor = conn.execute('''
-            SELECT cards.card_id, cards.name
-            FROM set_cards
-            JOIN cards ON set_cards.card_id = cards.card_id
-            WHERE set_cards.set_id = ? AND set_cards.guild_id = ?
-        ''', (set_id, guild_id))
-        cards = [{"card_id": row[0], "name": row[1]} for row in cursor.fetchall()]
+        rows = conn.execute(SET_CARDS_SQL, (guild_id, set_id)).fetchall()
 
-    return jsonify(cards)
+    return jsonify(build_set_cards(rows))
 
 
 @app.route('/get_presets', methods=['GET'])
+@conditional(extra=lambda: (preset_dir_stamp(),))
 def get_presets():
     try:
         # Ensure the directory exists
@@ -1460,7 +1933,7 @@ def get_presets():
         print(f"Files in preset directory: {available_files}")
 
         # Get all JSON files in the preset directory
-        presets = [f.replace('.json', '') for f in available_files if f.endswith('.json')]
+        presets = build_presets(available_files)
 
         print(f"Available presets: {presets}")  # Debugging log
         return jsonify(presets)
@@ -1487,6 +1960,7 @@ def create_set(guild_id):
         # Create the new set
         conn.execute("INSERT INTO card_sets (guild_id, name, description) VALUES (?, ?, ?)", (guild_id, set_name, set_description))
         conn.commit()
+        bump_version(guild_id, SETS)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='sets'))
 
@@ -1508,6 +1982,7 @@ def add_card_to_set(guild_id):
         conn.execute("INSERT INTO set_cards (set_id, card_id, guild_id) VALUES (?, ?, ?)",
                      (set_id, card_id, guild_id))
         conn.commit()
+        bump_version(guild_id, SETS)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='sets'))
 
@@ -1520,6 +1995,7 @@ def remove_card_from_set(guild_id):
     with sqlite3.connect(db_path) as conn:
         cursor = conn.execute("DELETE FROM set_cards WHERE set_id = ? AND card_id = ? AND guild_id = ?", (set_id, card_id, guild_id))
         conn.commit()
+        bump_version(guild_id, SETS)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='sets'))
 
@@ -1532,6 +2008,7 @@ def delete_set(guild_id):
         conn.execute("DELETE FROM set_cards WHERE set_id = ? AND guild_id = ?", (set_id, guild_id))
         conn.execute("DELETE FROM card_sets WHERE set_id = ? AND guild_id = ?", (set_id, guild_id))
         conn.commit()
+        bump_version(guild_id, SETS)
 
     return redirect(url_for('settings', guild_id=guild_id, active_tab='sets'))
 
@@ -1544,13 +2021,15 @@ def load_preset(guild_id):
 
         if file:
             # If a file is uploaded, parse the JSON data
-            if not file.filename.endswith('.json'):
+            if not file.filename.endswith(('.json', '.json.gz')):
                 return "Error: Invalid file type. Please upload a JSON file.", 400
 
             try:
-                preset_data = json.load(file)
-            except json.JSONDecodeError:
-                return "Error: Failed to decode JSON file.", 400
+                preset_data = load_preset_bytes(file.filename, file.read(MAX_PRESET_BYTES + 1))
+            except PresetTooLargeError as e:
+                return f"Error: {e}", 413
+            except ValueError as e:
+                return f"Error: Failed to decode JSON file. {e}", 400
             is_preset = 0  # Since this is a manual import
         elif preset_name:
             # If a preset is selected from the dropdown, load it from the preset directory
@@ -1568,16 +2047,52 @@ def load_preset(guild_id):
         # Debugging output
         print(f"Loading preset: {preset_data['set']['name']} into guild {guild_id}")
 
+        with sqlite3.connect(db_path) as conn:
+            # Ensure the set does not already exist
+            cursor = conn.execute(
+                "SELECT 1 FROM card_sets WHERE name = ? AND guild_id = ?",
+                (preset_data['set']['name'], guild_id)
+            )
+            if cursor.fetchone():
+                return "Error: A set with this name already exists.", 400
+
+        return import_preset_response(guild_id, preset_data, is_preset)
+
+    except Exception as e:
+        print(f"Error loading preset: {e}")
+        return f"Error: {e}", 500
+
+
+def import_preset_response(guild_id, preset_data, is_preset):
+    """Insert a preset and redirect back to the sets tab.
+
+    Small presets are inserted within the request so a failure is answered directly. Large ones are written on the
+    offload pool to release the request thread; the redirect carries the job ID and the settings page shows its status.
+    """
+    if len(preset_data['cards']) <= SYNC_PRESET_CARD_LIMIT:
+        if not insert_preset(guild_id, preset_data, is_preset):
+            return "Error: A set with this name already exists.", 400
+        return redirect(url_for('settings', guild_id=guild_id, active_tab='sets'))
+
+    job_id = start_offload_job(insert_preset, guild_id, preset_data, is_preset)
+    if job_id is None:
+        return busy_response()
+    return redirect(url_for('settings', guild_id=guild_id, active_tab='sets', job=job_id))
+
+
+def insert_preset(guild_id, preset_data, is_preset):
+    """Insert a preset's set and cards; runs on the offload pool for load_preset and import_set."""
+    try:
         with sqlite3.connect(db_path) as conn:
             cursor = conn.cursor()
 
-            # Ensure the set does not already exist
+            # Re-check now that we hold the connection, in case the same preset was submitted twice
             cursor.execute(
                 "SELECT 1 FROM card_sets WHERE name = ? AND guild_id = ?",
                 (preset_data['set']['name'], guild_id)
             )
             if cursor.fetchone():
-                return "Error: A set with this name already exists.", 400
+                return False
 
             # Insert set data
             cursor.execute(
@@ -1586,15 +2101,13 @@ def load_preset(guild_id):
             )
             set_id = cursor.lastrowid
 
-            # Find the maximum existing card_id in the guild
-            cursor.execute("SELECT MAX(card_id) FROM cards WHERE guild_id = ?", (guild_id,))
-            max_card_id_row = cursor.fetchone()
-            max_card_id = int(max_card_id_row[0]) if max_card_id_row and max_card_id_row[0] else 0
+            # Reserve a block of card IDs for the whole preset
+            cursor.execute(ALLOCATE_CARD_IDS_SQL, (guild_id, len(preset_data['cards'])))
+            new_card_id = cursor.execute(LAST_CARD_ID_SQL, (guild_id,)).fetchone()[0] - len(preset_data['cards'])
 
             # Insert cards from the preset
             for card in preset_data['cards']:
-                max_card_id += 1
-                new_card_id = f"{max_card_id:08}"  # Format ID as an 8-digit string
+                new_card_id += 1
 
                 cursor.execute(
                     "INSERT INTO cards (guild_id, card_id, name, description, rarity, img_url, local_img_url) "
@@ -1610,12 +2123,11 @@ def load_preset(guild_id):
                 )
 
             conn.commit()
-
-        return redirect(url_for('settings', guild_id=guild_id, active_tab='sets'))
-
+            bump_version(guild_id, SETS, CARDS)
+            return True
     except Exception as e:
-        print(f"Error loading preset: {e}")
-        return f"Error: {e}", 500
+        logger.error(f"Error inserting preset into guild {guild_id}: {e}")
+        raise
 
 
 @app.route('/export_set/<guild_id>', methods=['GET'])
@@ -1625,6 +2137,9 @@ def export_set(guild_id):
     if not set_id:
         return "Error: Set ID is required", 400
 
+    compress = request.args.get('gzip') in ('1', 'true')
+    compact = request.args.get('compact') in ('1', 'true')
+
     print(f"Exporting set: {set_id} for guild {guild_id}")  # Debugging log
 
     with sqlite3.connect(db_path) as conn:
@@ -1634,51 +2149,26 @@ def export_set(guild_id):
         )
         set_row = cursor.fetchone()
 
-        if not set_row:
-            return "Error: Set not found", 400
+    if not set_row:
+        return "Error: Set not found", 400
 
-        set_name, set_description, is_preset = set_row
+    set_name, set_description, is_preset = set_row
 
-        # Prevent exporting preset sets
-        if is_preset:
-            return "Error: Preset sets cannot be exported", 400
+    # Prevent exporting preset sets
+    if is_preset:
+        return "Error: Preset sets cannot be exported", 400
 
-        # Fetch all cards in the set
-        cursor = conn.execute(
-            """SELECT cards.name, cards.description, cards.rarity, cards.img_url, cards.local_img_url
-               FROM set_cards
-               JOIN cards ON set_cards.card_id = cards.card_id AND set_cards.guild_id = cards.guild_id
-               WHERE set_cards.set_id = ? AND set_cards.guild_id = ?""",
-            (set_id, guild_id)
-        )
-        cards = cursor.fetchall()
-
-        # Construct JSON structure
-        preset_data = {
-            "set": {
-                "name": set_name,
-                "description": set_description
-            },
-            "cards": [
-                {
-                    "name": card[0],
-                    "description": card[1],
-                    "rarity": card[2],
-                    "img_url": card[3],
-                    "local_img_url": card[4]
-                } for card in cards
-            ]
-        }
+    def generate():
+        # The connection lives as long as the download, reading cards in batches as the client consumes them
+        with closing(sqlite3.connect(db_path)) as conn:
+            cursor = conn.execute(EXPORT_CARDS_QUERY, (set_id, guild_id))
+            encoder = SetExportEncoder(set_name, set_description, compact=compact)
+            yield from encode_chunks(iter_set_export(encoder, cursor), compress=compress)
 
-        # Convert the JSON to a file-like object
-        json_data = json.dumps(preset_data, indent=4)
-        json_file = io.BytesIO(json_data.encode('utf-8'))  # Convert to BytesIO for Flask response
-
-    # Return JSON file for download
     return Response(
-        json_file.getvalue(),
-        mimetype="application/json",
-        headers={"Content-Disposition": f"attachment;filename={set_name}.json"}
+        generate(),
+        mimetype="application/gzip" if compress else "application/json",
+        headers={"Content-Disposition": f"attachment;filename={export_filename(set_name, compress)}"}
     )
 
 
@@ -1694,60 +2184,108 @@ def import_set(guild_id):
         return "Error: No file selected", 400
 
     # Ensure the file is a JSON file
-    if not file.filename.endswith('.json'):
+    if not file.filename.endswith(('.json', '.json.gz')):
         return "Error: Invalid file type. Please upload a JSON file.", 400
 
     try:
-        preset_data = json.load(file)
-    except json.JSONDecodeError:
-        return "Error: Failed to decode JSON file.", 400
+        preset_data = load_preset_bytes(file.filename, file.read(MAX_PRESET_BYTES + 1))
+    except PresetTooLargeError as e:
+        return f"Error: {e}", 413
+    except ValueError as e:
+        return f"Error: Failed to decode JSON file. {e}", 400
 
     print(f"Importing set: {preset_data['set']['name']} into guild {guild_id}")  # Debugging log
 
     with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-
         # Check if the set already exists
-        cursor.execute(
+        cursor = conn.execute(
             "SELECT 1 FROM card_sets WHERE name = ? AND guild_id = ?",
             (preset_data['set']['name'], guild_id)
         )
         if cursor.fetchone():
             return "Error: A set with this name already exists", 400
 
-        # Insert the new set
-        cursor.execute(
-            "INSERT INTO card_sets (guild_id, name, description) VALUES (?, ?, ?)",
-            (guild_id, preset_data['set']['name'], preset_data['set']['description'])
-        )
-        set_id = cursor.lastrowid
+    try:
+        return import_preset_response(guild_id, preset_data, 0)
+    except Exception as e:
+        return f"Error: {e}", 500
 
-        # Find the highest current card_id for this guild
-        cursor.execute(
-            "SELECT MAX(card_id) FROM cards WHERE guild_id = ?", (guild_id,)
-        )
-        max_card_id_row = cursor.fetchone()
-        max_card_id = int(max_card_id_row[0]) if max_card_id_row and max_card_id_row[0] else 0
 
-        # Insert cards
-        for card in preset_data['cards']:
-            max_card_id += 1
-            new_card_id = f"{max_card_id:08}"  # Ensure it's zero-padded
+@app.route('/card_image/<guild_id>/<card_id>', methods=['GET'])
+def card_image(guild_id, card_id):
+    """Serve a card's image (or its thumbnail with ?thumb=1) from the local store."""
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute('''
+            SELECT c.img_url, c.local_img_url, b.path, b.thumb_path
+            FROM cards c
+            LEFT JOIN image_blobs b ON b.image_hash = c.image_hash
+            WHERE c.guild_id = ? AND c.card_id = ?
+        ''', (guild_id, card_id)).fetchone()
+
+    if not row:
+        return "Error: Card not found", 404
+
+    img_url, local_img_url, blob_file, thumb_file = row
+    candidates = [thumb_file] if request.args.get('thumb') == '1' else []
+    candidates += [blob_file, local_img_url]
+    path = next((resolved for resolved in map(local_image_path, candidates) if resolved), None)
+
+    if path is None:
+        # No local copy (e.g. cards from presets); fall back to the CDN link rather than a broken image
+        if img_url:
+            return redirect(img_url)
+        return "Error: Image not found", 404
+    return send_card_image(path, CARD_IMAGE_MAX_AGE)
+
+
+@app.route('/image/<image_hash>', methods=['GET'])
+def image_blob(image_hash):
+    """Serve a stored image by content hash; the response never changes, so it is cached indefinitely."""
+    if len(image_hash) != 64 or any(c not in '0123456789abcdef' for c in image_hash):
+        return "Error: Invalid image hash", 400
+
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute("SELECT path, thumb_path FROM image_blobs WHERE image_hash = ?", (image_hash,)).fetchone()
 
-            cursor.execute(
-                "INSERT INTO cards (guild_id, card_id, name, description, rarity, img_url, local_img_url) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (guild_id, new_card_id, card['name'], card['description'], card.get('rarity', 'Common'), card.get('img_url', ''), card.get('local_img_url', ''))
-            )
+    if not row:
+        return "Error: Image not found", 404
 
-            # Insert into set_cards table
-            cursor.execute(
-                "INSERT INTO set_cards (set_id, card_id, guild_id) VALUES (?, ?, ?)",
-                (set_id, new_card_id, guild_id)
-            )
+    path = local_image_path(row[1] if request.args.get('thumb') == '1' and row[1] else row[0])
+    if path is None:
+        return "Error: Image not found", 404
+    return send_card_image(path, BLOB_IMAGE_MAX_AGE, immutable=True)
 
-        conn.commit()
 
-    return redirect(url_for('settings', guild_id=guild_id, active_tab='sets'))
+@app.route('/offload_job/<job_id>', methods=['GET'])
+def offload_job_status(job_id):
+    payload = offload_job_payload(job_id)
+    if payload is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(payload)
+
+
+@app.route('/server_metrics', methods=['GET'])
+def server_metrics():
+    if 'access_token' not in session or 'expires_at' not in session or session['expires_at'] < datetime.now().timestamp():
+        return redirect(url_for('login'))
+
+    metrics = {"mode": WEB_SERVER_MODE, "offload": app.executor.stats()}
+
+    bridge_executor = getattr(app, 'bridge_executor', None)
+    if bridge_executor is not None:
+        metrics["wsgi_bridge"] = bridge_executor.stats()
+
+    server = getattr(app, 'waitress_server', None)
+    if server is not None:
+        dispatcher = server.task_dispatcher
+        metrics["waitress"] = {
+            "threads": len(dispatcher.threads),
+            "active_threads": dispatcher.active_count,
+            "queue_depth": len(dispatcher.queue),
+            "open_connections": len(getattr(server, 'active_channels', {})),
+            "connection_limit": WEB_CONNECTION_LIMIT,
+        }
+    return jsonify(metrics)
 
 
 @app.route('/edit_set/<guild_id>', methods=['POST'])
@@ -1820,6 +2358,7 @@ def edit_set(guild_id):
                 query = f"UPDATE card_sets SET {', '.join(updates)} WHERE set_id = ? AND guild_id = ?"
                 conn.execute(query, params)
                 conn.commit()
+                bump_version(guild_id, SETS)
 
         return redirect(url_for('settings', guild_id=guild_id, active_tab='sets'))
 
@@ -1827,6 +2366,365 @@ def edit_set(guild_id):
         logger.error(f"Error editing set: {e}")
         return f"Error: Failed to edit set - {str(e)}", 500
 # ---------------------------------------------------------------------------------------------------------------------
+# Async Server Mode
+# ---------------------------------------------------------------------------------------------------------------------
+# With WEB_SERVER_MODE=async the dashboard is served by aiohttp on the bot's own event loop. The read-heavy JSON
+# endpoints and the OAuth callback are answered natively with a small aiosqlite pool and an aiohttp client session.
+# Every other route is handed to the Flask app through a WSGI bridge, so pages, forms and templates stay as they are.
+
+WSGI_CHUNK_SIZE = 64 * 1024
+ASYNC_MAX_BODY_SIZE = 64 * 1024 * 1024
+
+
+class AsyncDatabasePool:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = max(1, size)
+        self._idle = asyncio.Queue()
+        self._connections = []
+
+    async def open(self):
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(self.path)
+            self._connections.append(conn)
+            self._idle.put_nowait(conn)
+
+    async def close(self):
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+
+    @asynccontextmanager
+    async def acquire(self):
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+async def conditional_async(request, guild_id, scopes, build, extra=()):
+    """Async counterpart of the conditional decorator."""
+    etag = make_etag(guild_id, scopes, *extra)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return web.Response(status=304, headers=headers)
+
+    response = await build()
+    if response.status == 200:
+        response.headers.update(headers)
+    return response
+
+
+class AsyncDashboardServer:
+    def __init__(self, bot, executor):
+        self.bot = bot
+        self.executor = executor
+        self.pool = AsyncDatabasePool(db_path, WEB_DB_POOL_SIZE)
+        self.http = None
+        self.runner = None
+
+    async def start(self, host, port):
+        await self.pool.open()
+        self.http = aiohttp.ClientSession()
+
+        web_app = web.Application(client_max_size=ASYNC_MAX_BODY_SIZE)
+        web_app.router.add_get('/get_card_names', self.get_card_names)
+        web_app.router.add_get('/get_all_cards/{guild_id}', self.get_all_cards)
+        web_app.router.add_get('/get_user_cards/{guild_id}', self.get_user_cards)
+        web_app.router.add_get('/get_users/{guild_id}', self.get_users)
+        web_app.router.add_get('/get_sets/{guild_id}', self.get_sets)
+        web_app.router.add_get('/get_cards_in_set/{guild_id}/{set_id}', self.get_cards_in_set)
+        web_app.router.add_get('/get_presets', self.get_presets)
+        web_app.router.add_get('/auth/callback', self.auth_callback)
+        web_app.router.add_route('*', '/{tail:.*}', self.wsgi_fallback)
+
+        self.runner = web.AppRunner(web_app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logger.info(f"Async dashboard server listening on {host}:{port}")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+        if self.http:
+            await self.http.close()
+            self.http = None
+        await self.pool.close()
+
+    # -----------------------------------------------------------------------------------------------------------------
+    # Native Routes
+    # -----------------------------------------------------------------------------------------------------------------
+    async def fetch_cards(self, guild_id, limit, cursor, q):
+        async with self.pool.acquire() as conn:
+            if limit is not None:
+                return await conn.execute_fetchall(*card_page_query(guild_id, limit, cursor, q))
+            return await conn.execute_fetchall(CARD_NAMES_SQL, (guild_id,))
+
+    async def get_card_names(self, request):
+        guild_id = request.query.get('guild_id')
+        if not guild_id:
+            return web.json_response([])
+
+        try:
+            limit, cursor, q = optional_page_args(request.query)
+        except QueryArgError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        async def build():
+            rows = await self.fetch_cards(guild_id, limit, cursor, q)
+            return web.json_response(build_card_names(rows, limit))
+
+        return await conditional_async(request, guild_id, (CARDS,), build)
+
+    async def get_all_cards(self, request):
+        guild_id = request.match_info['guild_id']
+        try:
+            limit, cursor, q = optional_page_args(request.query)
+        except QueryArgError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        async def build():
+            try:
+                rows = await self.fetch_cards(guild_id, limit, cursor, q)
+                return web.json_response(build_all_cards(rows, limit))
+            except Exception as e:
+                logger.error(f"Error fetching all cards: {e}")
+                return web.json_response({"error": "Failed to fetch cards"}, status=500)
+
+        return await conditional_async(request, guild_id, (CARDS,), build)
+
+    async def get_user_cards(self, request):
+        guild_id = request.match_info['guild_id']
+        user_id = request.query.get('user_id')
+        if not user_id:
+            return web.json_response({"error": "User ID is required"}, status=400)
+        try:
+            limit, cursor, q = optional_page_args(request.query)
+        except QueryArgError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        async def build():
+            try:
+                async with self.pool.acquire() as conn:
+                    if limit is not None:
+                        rows = await conn.execute_fetchall(*user_card_page_query(guild_id, user_id, limit, cursor, q))
+                    else:
+                        rows = await conn.execute_fetchall(USER_CARDS_SQL, (guild_id, user_id))
+                return web.json_response(build_user_cards(rows, limit))
+            except Exception as e:
+                logger.error(f"Error fetching user cards: {e}")
+                return web.json_response({"error": "Failed to fetch user cards"}, status=500)
+
+        return await conditional_async(request, guild_id, (INVENTORY, CARDS), build)
+
+    async def get_users(self, request):
+        guild_id = request.match_info['guild_id']
+        try:
+            guild = self.bot.get_guild(parse_guild_id(guild_id))
+            limit, cursor, q = optional_page_args(request.query, cursor_size=1)
+            start = user_page_start(cursor)
+        except QueryArgError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        if not guild:
+            return web.json_response({"error": "Guild not found"}, status=404)
+
+        async def build():
+            try:
+                if limit is None:
+                    async with self.pool.acquire() as conn:
+                        rows = await conn.execute_fetchall(USER_IDS_SQL, (guild_id,))
+                    return web.json_response(build_users(guild, rows))
+
+                after = start
+                chunk_size = user_chunk_size(limit, q)
+                users = []
+
+                async with self.pool.acquire() as conn:
+                    while len(users) <= limit:
+                        rows = await conn.execute_fetchall(USER_PAGE_QUERY, (guild_id, after, chunk_size))
+                        collect_users(guild, rows, q.lower(), users, limit)
+                        if len(rows) < chunk_size:
+                            break
+                        after = rows[-1][0]
+
+                return web.json_response(build_user_page(users, limit))
+            except Exception as e:
+                logger.error(f"Error fetching users: {e}")
+                return web.json_response({"error": "Failed to fetch users"}, status=500)
+
+        return await conditional_async(request, guild_id, (INVENTORY,), build, extra=(member_name_stamp(),))
+
+    async def get_sets(self, request):
+        guild_id = request.match_info['guild_id']
+
+        async def build():
+            async with self.pool.acquire() as conn:
+                rows = await conn.execute_fetchall(SETS_SQL, (guild_id,))
+            return web.json_response(build_sets(rows))
+
+        return await conditional_async(request, guild_id, (SETS,), build)
+
+    async def get_cards_in_set(self, request):
+        guild_id = request.match_info['guild_id']
+        set_id = request.match_info['set_id']
+
+        async def build():
+            async with self.pool.acquire() as conn:
+                rows = await conn.execute_fetchall(SET_CARDS_SQL, (guild_id, set_id))
+            return web.json_response(build_set_cards(rows))
+
+        return await conditional_async(request, guild_id, (SETS, CARDS), build)
+
+    async def get_presets(self, request):
+        async def build():
+            if not os.path.exists(PRESET_DIR):
+                return web.json_response([])
+            return web.json_response(build_presets(os.listdir(PRESET_DIR)))
+
+        return await conditional_async(request, 0, (), build, extra=(preset_dir_stamp(),))
+
+    async def auth_callback(self, request):
+        code = request.query.get('code')
+        if not code:
+            return web.Response(text="Error: No code provided", status=400)
+
+        data = {
+            'client_id': DISCORD_CLIENT_ID,
+            'client_secret': DISCORD_CLIENT_SECRET,
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': DISCORD_REDIRECT_URL,
+            'scope': 'identify guilds'
+        }
+        async with self.http.post('https://discord.com/api/oauth2/token', data=data) as response:
+            if response.status != 200:
+                logger.error(f"Failed to authenticate with Discord. Status code: {response.status}")
+                return web.Response(text="Error: Failed to authenticate with Discord", status=400)
+            token = await response.json()
+
+        # Write the session cookie exactly as Flask would, so the bridged routes see the login. The cookie attributes
+        # come from the session interface, so the SESSION_COOKIE_* settings apply to both servers.
+        interface = app.session_interface
+        serializer = interface.get_signing_serializer(app)
+        cookie_name = interface.get_cookie_name(app)
+        try:
+            session_data = serializer.loads(request.cookies[cookie_name]) if cookie_name in request.cookies else {}
+        except Exception:
+            session_data = {}
+        flask_session = interface.session_class(session_data)
+        flask_session['access_token'] = token['access_token']
+        flask_session['expires_at'] = datetime.now().timestamp() + token['expires_in']
+
+        response = web.HTTPFound('/dashboard')
+        response.set_cookie(
+            cookie_name, serializer.dumps(dict(flask_session)),
+            domain=interface.get_cookie_domain(app),
+            path=interface.get_cookie_path(app),
+            secure=interface.get_cookie_secure(app),
+            httponly=interface.get_cookie_httponly(app),
+            samesite=interface.get_cookie_samesite(app),
+            max_age=int(app.permanent_session_lifetime.total_seconds()) if flask_session.permanent else None
+        )
+        response.headers['Vary'] = 'Cookie'
+        return response
+
+    # -----------------------------------------------------------------------------------------------------------------
+    # WSGI Bridge
+    # -----------------------------------------------------------------------------------------------------------------
+    @staticmethod
+    def build_environ(request, body):
+        path, _, query = request.raw_path.partition('?')
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(path).decode('latin-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': request.url.host or 'localhost',
+            'SERVER_PORT': str(request.url.port or 80),
+            'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+            'REMOTE_ADDR': request.remote or '',
+            'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': request.scheme,
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in request.headers.items():
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+                continue
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    @staticmethod
+    def call_wsgi(environ):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = status
+            started['headers'] = headers
+
+        result = app(environ, start_response)
+        return started['status'], started['headers'], result
+
+    @staticmethod
+    def read_chunks(iterator):
+        """Pull body chunks on a worker thread until a buffer's worth is ready."""
+        buffer = bytearray()
+        for chunk in iterator:
+            buffer.extend(chunk)
+            if len(buffer) >= WSGI_CHUNK_SIZE:
+                return bytes(buffer), False
+        return bytes(buffer), True
+
+    async def wsgi_fallback(self, request):
+        loop = asyncio.get_running_loop()
+        body = await request.read()
+        environ = self.build_environ(request, body)
+        status, headers, result = await loop.run_in_executor(self.executor, self.call_wsgi, environ)
+
+        code, _, reason = status.partition(' ')
+        response = web.StreamResponse(status=int(code), reason=reason or None)
+        for name, value in headers:
+            response.headers.add(name, value)
+
+        iterator = iter(result)
+        try:
+            await response.prepare(request)
+            done = False
+            while not done:
+                chunk, done = await loop.run_in_executor(self.executor, self.read_chunks, iterator)
+                if chunk:
+                    await response.write(chunk)
+        finally:
+            close = getattr(result, 'close', None)
+            if close:
+                await loop.run_in_executor(self.executor, close)
+
+        await response.write_eof()
+        return response
+
+# ---------------------------------------------------------------------------------------------------------------------
 # Check if Port is Available
 # ---------------------------------------------------------------------------------------------------------------------
 
@@ -1841,16 +2739,36 @@ class WebServerCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         app.bot = bot
-        self.executor = ThreadPoolExecutor()
+        self.executor = TrackedThreadPoolExecutor(WEB_OFFLOAD_WORKERS, WEB_OFFLOAD_QUEUE_LIMIT)
+        app.executor = self.executor
         self.server_thread = None
+        self.async_server = None
+
+    async def cog_unload(self):
+        if self.async_server:
+            await self.async_server.stop()
+            self.async_server = None
+
+    async def start_async_server(self):
+        if is_port_in_use(5007):
+            logger.warning("Port 5007 is already in use. Async dashboard server will not be started.")
+            return
+
+        # Bridged Flask requests get their own pool so they never wait behind (or on) offloaded work
+        app.bridge_executor = TrackedThreadPoolExecutor(WEB_THREADS, WEB_OFFLOAD_QUEUE_LIMIT)
+        self.async_server = AsyncDashboardServer(self.bot, app.bridge_executor)
+        await self.async_server.start('0.0.0.0', 5007)
 
     def start_flask_server(self):
         if is_port_in_use(5007):
             logger.warning("Port 5007 is already in use. Flask server will not be started.")
             return
 
-        logger.info("Starting Flask server on port 5000")
-        serve(app, host='0.0.0.0', port=5007)
+        logger.info(f"Starting Flask server on port 5007 with {WEB_THREADS} threads")
+        server = create_server(app, host='0.0.0.0', port=5007, threads=WEB_THREADS, backlog=WEB_BACKLOG,
+                               channel_timeout=WEB_CHANNEL_TIMEOUT, connection_limit=WEB_CONNECTION_LIMIT)
+        app.waitress_server = server
+        server.run()
 # ---------------------------------------------------------------------------------------------------------------------
 # Setup Function
 # ---------------------------------------------------------------------------------------------------------------------
@@ -1858,7 +2776,10 @@ async def setup(bot):
     try:
         web_server_cog = WebServerCog(bot)
         await bot.add_cog(web_server_cog)
-        if RUN_IN_IDE:
+        if WEB_SERVER_MODE == 'async':
+            # Serve from the bot's event loop instead of a dedicated server thread
+            await web_server_cog.start_async_server()
+        elif RUN_IN_IDE:
             # Start Flask server in a separate thread
             web_server_cog.server_thread = Thread(target=web_server_cog.start_flask_server, daemon=True)
             web_server_cog.server_thread.start()
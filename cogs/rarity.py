@@ -10,6 +10,8 @@ from discord import app_commands
 from discord.ui import View, Select, Button
 
 from core.utils import log_command_usage, check_permissions
+from core.rarities import ADD_RARITY_SQL, UPSERT_RARITY_SQL, add_rarity_key, get_rarities, get_rarity, invalidate_rarities, \
+    rarity_key
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Database Configuration
@@ -47,14 +49,9 @@ class RarityCog(commands.Cog):
 
             for guild_id in guild_ids:
                 for rarity, weight, burn_value in default_rarities:
-                    await conn.execute(
-                        """
-                        INSERT OR IGNORE INTO rarity_weights (guild_id, rarity, weight, burn_value)
-                        VALUES (?, ?, ?, ?)
-                        """,
-                        (guild_id, rarity, weight, burn_value)
-                    )
+                    await conn.execute(ADD_RARITY_SQL, (guild_id, rarity, weight, burn_value))
             await conn.commit()
+        invalidate_rarities()
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
@@ -66,28 +63,20 @@ class RarityCog(commands.Cog):
                 ("Legendary", 0.01, 100)
             ]
             for rarity, weight, burn_value in default_rarities:
-                await conn.execute(
-                    """
-                    INSERT OR IGNORE INTO rarity_weights (guild_id, rarity, weight, burn_value)
-                    VALUES (?, ?, ?, ?)
-                    """,
-                    (guild.id, rarity, weight, burn_value)
-                )
+                await conn.execute(ADD_RARITY_SQL, (guild.id, rarity, weight, burn_value))
             await conn.commit()
+        invalidate_rarities(guild.id)
 
     # ---------------------------------------------------------------------------------------------------------------------
     # Rarity Autocomplete
     # ---------------------------------------------------------------------------------------------------------------------
     async def rarity_autocomplete(self, interaction: discord.Interaction, current: str):
-        async with aiosqlite.connect(db_path) as conn:
-            cursor = await conn.execute("SELECT DISTINCT rarity FROM rarity_weights WHERE guild_id = ?",
-                                        (interaction.guild.id,))
-            rarities = [row[0] for row in await cursor.fetchall()]
+        rarities = await get_rarities(interaction.guild.id)
 
         # Filter based on user input (if they started typing)
         return [
-            app_commands.Choice(name=rarity, value=rarity)
-            for rarity in rarities if current.lower() in rarity.lower()]
+            app_commands.Choice(name=rarity.name, value=rarity.name)
+            for rarity in rarities.values() if current.lower() in rarity.name.lower()][:25]
 
     # ---------------------------------------------------------------------------------------------------------------------
     # Rarity Management Commands
@@ -116,13 +105,13 @@ class RarityCog(commands.Cog):
             return
 
         try:
+            # An existing rarity keeps its spelling whatever case it was typed in
+            existing = await get_rarity(interaction.guild.id, rarity)
+            rarity = existing.name if existing else rarity.strip()
             async with aiosqlite.connect(db_path) as conn:
-                await conn.execute(
-                    "INSERT INTO rarity_weights (guild_id, rarity, weight, burn_value) VALUES (?, ?, ?, ?) "
-                    "ON CONFLICT(guild_id, rarity) DO UPDATE SET weight = excluded.weight, burn_value = excluded.burn_value",
-                    (interaction.guild.id, rarity, weight, burn_value)
-                )
+                await conn.execute(UPSERT_RARITY_SQL, (interaction.guild.id, rarity, weight, burn_value))
                 await conn.commit()
+            invalidate_rarities(interaction.guild.id)
 
             await interaction.response.send_message(
                 f"Rarity weight for `{rarity}` set to `{weight}` and burn value set to `{burn_value}`.", ephemeral=True)
@@ -154,13 +143,13 @@ class RarityCog(commands.Cog):
             return
 
         try:
+            # An existing rarity keeps its spelling whatever case it was typed in
+            existing = await get_rarity(interaction.guild.id, rarity)
+            rarity = existing.name if existing else rarity.strip()
             async with aiosqlite.connect(db_path) as conn:
-                await conn.execute(
-                    "INSERT INTO rarity_weights (guild_id, rarity, weight, burn_value) VALUES (?, ?, ?, ?) "
-                    "ON CONFLICT(guild_id, rarity) DO UPDATE SET weight = excluded.weight, burn_value = excluded.burn_value",
-                    (interaction.guild.id, rarity, weight, burn_value)
-                )
+                await conn.execute(UPSERT_RARITY_SQL, (interaction.guild.id, rarity, weight, burn_value))
                 await conn.commit()
+            invalidate_rarities(interaction.guild.id)
 
             await interaction.response.send_message(
                 f"New rarity type `{rarity}` created with weight `{weight}` and burn value `{burn_value}`.",
@@ -183,18 +172,15 @@ class RarityCog(commands.Cog):
             return
 
         try:
-            async with aiosqlite.connect(db_path) as conn:
-                cursor = await conn.execute("SELECT 1 FROM rarity_weights WHERE guild_id = ? AND rarity = ?",
-                                            (interaction.guild.id, rarity))
-                exists = await cursor.fetchone()
-
-                if not exists:
-                    await interaction.response.send_message(f"Error: Rarity `{rarity}` does not exist.", ephemeral=True)
-                    return
+            if not await get_rarity(interaction.guild.id, rarity):
+                await interaction.response.send_message(f"Error: Rarity `{rarity}` does not exist.", ephemeral=True)
+                return
 
-                await conn.execute("DELETE FROM rarity_weights WHERE guild_id = ? AND rarity = ?",
-                                   (interaction.guild.id, rarity))
+            async with aiosqlite.connect(db_path) as conn:
+                await conn.execute("DELETE FROM rarity_weights WHERE guild_id = ? AND rarity_key = ?",
+                                   (interaction.guild.id, rarity_key(rarity)))
                 await conn.commit()
+            invalidate_rarities(interaction.guild.id)
 
             await interaction.response.send_message(f"Rarity `{rarity}` has been removed.", ephemeral=True)
         except Exception as e:
@@ -206,10 +192,7 @@ class RarityCog(commands.Cog):
     @app_commands.command(description="Admin: List all available rarities")
     async def rarity_list(self, interaction: discord.Interaction):
         try:
-            async with aiosqlite.connect(db_path) as conn:
-                cursor = await conn.execute("SELECT rarity, weight, burn_value FROM rarity_weights WHERE guild_id = ?",
-                                            (interaction.guild.id,))
-                rarities = await cursor.fetchall()
+            rarities = list((await get_rarities(interaction.guild.id)).values())
 
             if not rarities:
                 await interaction.response.send_message("No rarities have been set up for this server yet.",
@@ -244,11 +227,9 @@ class RarityCog(commands.Cog):
             async with aiosqlite.connect(db_path) as conn:
                 await conn.execute("DELETE FROM rarity_weights WHERE guild_id = ?", (interaction.guild.id,))
                 for rarity, weight, burn_value in default_rarities:
-                    await conn.execute(
-                        "INSERT INTO rarity_weights (guild_id, rarity, weight, burn_value) VALUES (?, ?, ?, ?)",
-                        (interaction.guild.id, rarity, weight, burn_value)
-                    )
+                    await conn.execute(ADD_RARITY_SQL, (interaction.guild.id, rarity, weight, burn_value))
                 await conn.commit()
+            invalidate_rarities(interaction.guild.id)
 
             await interaction.response.send_message("All rarities have been reset to their default settings.",
                                                     ephemeral=True)
@@ -285,6 +266,8 @@ async def setup(bot):
             await conn.execute('ALTER TABLE rarity_weights ADD COLUMN burn_value INTEGER')
             logger.info("Added 'burn_value' column to 'rarity_weights' table.")
 
+        await add_rarity_key(conn, 'rarity_weights', unique=True)
+
         # Define default rarities with their correct burn values
         default_rarities = [
             ("Common", 1.0, 10),
@@ -313,11 +296,7 @@ async def setup(bot):
 
         for guild_id in guild_ids:
             for rarity, weight, burn_value in default_rarities:
-                await conn.execute('''
-                    INSERT INTO rarity_weights (guild_id, rarity, weight, burn_value)
-                    VALUES (?, ?, ?, ?)
-                    ON CONFLICT(guild_id, rarity) DO NOTHING
-                ''', (guild_id, rarity, weight, burn_value))
+                await conn.execute(ADD_RARITY_SQL, (guild_id, rarity, weight, burn_value))
 
         await conn.commit()
 
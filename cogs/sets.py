@@ -2,14 +2,20 @@ import discord
 import logging
 import aiosqlite
 import os
-import io
 import json
+import tempfile
 
 from discord.ext import commands
 from discord import app_commands
 from discord.ui import View, Select, Button
 
 from core.utils import log_command_usage, check_permissions, get_embed_colour
+from core.versioning import CARDS, SETS, bump_version
+from core.rarities import ADD_RARITY_SQL, get_rarities, invalidate_rarities, rarity_key
+from core.card_ids import allocate_card_ids, migrate_card_id_column
+from core.joins import SET_CARDS, card_join
+from core.exporter import EXPORT_CARDS_QUERY, SetExportEncoder, aiter_set_export, GzipStream, export_filename, \
+    load_preset_bytes, PresetTooLargeError
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Database Configuration
@@ -260,25 +266,23 @@ class SetCog(commands.Cog):
 
     async def get_cards_in_set(self, set_id, guild_id):
         async with aiosqlite.connect(db_path) as conn:
-            cursor = await conn.execute('''
-                SELECT cards.name, cards.img_url 
-                FROM set_cards 
-                JOIN cards ON set_cards.card_id = cards.card_id 
-                WHERE set_cards.set_id = ? AND set_cards.guild_id = ? AND cards.guild_id = ?
-            ''', (set_id, guild_id, guild_id))  # Ensure guild consistency
+            cursor = await conn.execute(f'''
+                SELECT c.name, c.img_url
+                FROM {SET_CARDS}
+                WHERE sc.set_id = ? AND sc.guild_id = ?
+            ''', (set_id, guild_id))
             rows = await cursor.fetchall()
             return [{'name': row[0], 'img_url': row[1]} for row in rows]
 
 
     async def get_user_cards_in_set(self, user_id, set_id, guild_id):
         async with aiosqlite.connect(db_path) as conn:
-            cursor = await conn.execute('''
-                SELECT cards.name 
-                FROM user_inventory 
-                JOIN set_cards ON user_inventory.card_id = set_cards.card_id AND user_inventory.guild_id = set_cards.guild_id
-                JOIN cards ON cards.card_id = user_inventory.card_id AND cards.guild_id = user_inventory.guild_id
-                WHERE user_inventory.user_id = ? AND set_cards.set_id = ? AND user_inventory.guild_id = ?
-            ''', (user_id, set_id, guild_id))
+            cursor = await conn.execute(f'''
+                SELECT c.name
+                FROM {SET_CARDS}
+                {card_join('user_inventory', 'ui', 'sc')}
+                WHERE sc.set_id = ? AND sc.guild_id = ? AND ui.user_id = ?
+            ''', (set_id, guild_id, user_id))
 
             rows = await cursor.fetchall()
             return [{'name': row[0]} for row in rows]
@@ -326,6 +330,7 @@ class SetCog(commands.Cog):
                 (set_id, card_id, guild_id)
             )
             await conn.commit()
+            bump_version(guild_id, SETS)
             logger.info(f"Card `{card_name}` successfully added to set `{set_name}`.")
             return True
 
@@ -350,6 +355,7 @@ class SetCog(commands.Cog):
                 (set_id, card_id, guild_id)
             )
             await conn.commit()
+            bump_version(guild_id, SETS)
 
             # Check if the card was removed
             if cursor.rowcount > 0:
@@ -364,6 +370,7 @@ class SetCog(commands.Cog):
             await conn.execute("DELETE FROM set_cards WHERE set_id = ? AND guild_id = ?", (set_id, guild_id))
             await conn.execute("DELETE FROM card_sets WHERE set_id = ? AND guild_id = ?", (set_id, guild_id))
             await conn.commit()
+            bump_version(guild_id, SETS)
 
 
 
@@ -402,6 +409,7 @@ class SetCog(commands.Cog):
                 ''', (int(set_id), card_name, int(guild_id)))
 
             await conn.commit()
+            bump_version(guild_id, SETS, CARDS)
 
     async def preset_name_autocomplete(self, interaction: discord.Interaction, current: str):
         """Autocomplete function to suggest preset JSON files in the ./data/presets directory."""
@@ -456,11 +464,10 @@ class SetCog(commands.Cog):
             set_id = set_row[0]
 
             # Fetch cards that are in the selected set
-            cursor = await conn.execute('''
-                SELECT cards.name 
-                FROM set_cards 
-                JOIN cards ON set_cards.card_id = cards.card_id AND set_cards.guild_id = cards.guild_id
-                WHERE set_cards.set_id = ? AND set_cards.guild_id = ? AND cards.name LIKE ?
+            cursor = await conn.execute(f'''
+                SELECT c.name
+                FROM {SET_CARDS}
+                WHERE sc.set_id = ? AND sc.guild_id = ? AND c.name LIKE ?
                 LIMIT 25
             ''', (set_id, interaction.guild.id, f"%{current}%"))
 
@@ -507,6 +514,7 @@ class SetCog(commands.Cog):
                     VALUES (?, ?, ?)
                 ''', (interaction.guild.id, name, description))
                 await conn.commit()
+                bump_version(interaction.guild.id, SETS)
                 await interaction.followup.send(f"Set `{name}` created successfully!", ephemeral=True)
 
         except Exception as e:
@@ -573,6 +581,7 @@ class SetCog(commands.Cog):
                         (set_id, card_id, interaction.guild.id)
                     )
                     await conn.commit()
+                    bump_version(interaction.guild.id, SETS)
 
                     await interaction.response.send_message(
                         f"Card `{card_name}` has been successfully added to the set `{set_name}`.",
@@ -676,6 +685,7 @@ class SetCog(commands.Cog):
 
                     await conn.execute(update_query, params)
                     await conn.commit()
+                    bump_version(interaction.guild.id, SETS)
 
                 # Prepare response message
                 response_parts = []
@@ -782,6 +792,7 @@ class SetCog(commands.Cog):
                                        (set_id, interaction.guild.id))
 
                 await conn.commit()
+                bump_version(interaction.guild.id, SETS)
 
                 await interaction.followup.send(
                     f"Deleted {len(sets)} set(s) with name `{set_name}`.",
@@ -835,10 +846,9 @@ class SetCog(commands.Cog):
 
                 # Get cards in the set
                 cursor = await conn.execute(
-                    '''
-                    SELECT c.name, c.description, c.rarity, c.img_url
-                    FROM set_cards AS sc
-                    JOIN cards AS c ON sc.card_id = c.card_id AND sc.guild_id = c.guild_id
+                    f'''
+                    SELECT c.name, c.description, c.rarity, c.img_url, COALESCE(c.thumb_url, c.img_url)
+                    FROM {SET_CARDS}
                     WHERE sc.set_id = (SELECT set_id FROM card_sets WHERE guild_id = ? AND name = ?)
                     ''',
                     (interaction.guild.id, set_name)
@@ -847,10 +857,10 @@ class SetCog(commands.Cog):
 
                 # Get user's collected cards in the set
                 cursor = await conn.execute(
-                    '''
+                    f'''
                     SELECT COUNT(*)
-                    FROM set_cards AS sc
-                    JOIN user_inventory AS ui ON sc.card_id = ui.card_id AND sc.guild_id = ui.guild_id
+                    FROM set_cards sc
+                    {card_join('user_inventory', 'ui', 'sc')}
                     WHERE sc.set_id = (SELECT set_id FROM card_sets WHERE guild_id = ? AND name = ?)
                     AND ui.user_id = ?
                     ''',
@@ -891,8 +901,10 @@ class SetCog(commands.Cog):
                         title=f"Set Cards for '{set_name}'",
                         color=colour
                     )
-                    if first_card_image:
-                        card_embed.set_thumbnail(url=first_card_image)
+                    # Card list pages show the thumbnail of their first card rather than the full-size image
+                    page_thumb = page_cards[0][4] or first_card_image
+                    if page_thumb:
+                        card_embed.set_thumbnail(url=page_thumb)
 
                     for idx, card in enumerate(page_cards, start=1 + start_index):
                         card_embed.add_field(
@@ -943,15 +955,18 @@ class SetCog(commands.Cog):
         try:
             # Determine the source of the set data
             if file:
-                if not file.filename.endswith('.json'):
+                if not file.filename.endswith(('.json', '.json.gz')):
                     await interaction.followup.send("Please upload a valid JSON file.", ephemeral=True)
                     return
 
                 file_content = await file.read()
                 try:
-                    preset_data = json.loads(file_content)
+                    preset_data = load_preset_bytes(file.filename, file_content)
                     is_preset = 0
-                except json.JSONDecodeError as e:
+                except PresetTooLargeError as e:
+                    await interaction.followup.send(str(e), ephemeral=True)
+                    return
+                except ValueError as e:
                     await interaction.followup.send(f"Failed to decode JSON file: {e}", ephemeral=True)
                     return
 
@@ -991,37 +1006,33 @@ class SetCog(commands.Cog):
                     interaction.guild.id, preset_data['set']['name'], preset_data['set']['description'], is_preset))
                 set_id = cursor.lastrowid
 
-                # Get current max card ID
-                cursor = await conn.execute("SELECT MAX(card_id) FROM cards WHERE guild_id = ?",
-                                            (interaction.guild.id,))
-                max_card_id_row = await cursor.fetchone()
-                max_card_id = int(max_card_id_row[0]) if max_card_id_row and max_card_id_row[0] else 0
+                # Reserve a block of card IDs for the whole preset
+                new_card_id = await allocate_card_ids(conn, interaction.guild.id, len(preset_data['cards'])) - 1
 
-                cursor = await conn.execute(
-                    "SELECT LOWER(rarity) FROM rarity_weights WHERE guild_id = ?", (interaction.guild.id,))
-                existing_rarities = {row[0] for row in await cursor.fetchall()}
+                # Preset cards take the guild's spelling of each rarity
+                existing_rarities = {key: rarity.name for key, rarity in
+                                     (await get_rarities(interaction.guild.id)).items()}
+                added_rarities = False
 
                 # Insert cards and rarities
                 for card in preset_data['cards']:
                     rarity = card['rarity'].strip()
-                    rarity_normalized = rarity.lower()
+                    rarity_normalized = rarity_key(rarity)
 
                     # Insert missing rarity into rarity_weights with default values
                     if rarity_normalized not in existing_rarities:
-                        await conn.execute('''
-                            INSERT INTO rarity_weights (guild_id, rarity, weight, burn_value)
-                            VALUES (?, ?, ?, ?)
-                        ''', (interaction.guild.id, rarity, 1.0, 10))
-                        existing_rarities.add(rarity_normalized)
+                        await conn.execute(ADD_RARITY_SQL, (interaction.guild.id, rarity, 1.0, 10))
+                        existing_rarities[rarity_normalized] = rarity
+                        added_rarities = True
 
-                    max_card_id += 1
-                    new_card_id = f"{max_card_id:08}"
+                    new_card_id += 1
 
                     await conn.execute('''
                         INSERT INTO cards (guild_id, card_id, name, description, rarity, img_url, local_img_url)
                         VALUES (?, ?, ?, ?, ?, ?, ?)
                     ''', (
-                        interaction.guild.id, new_card_id, card['name'], card['description'], card['rarity'],
+                        interaction.guild.id, new_card_id, card['name'], card['description'],
+                        existing_rarities[rarity_normalized],
                         card['img_url'], card['local_img_url']))
 
                     await conn.execute('''
@@ -1030,6 +1041,9 @@ class SetCog(commands.Cog):
                     ''', (set_id, new_card_id, interaction.guild.id))
 
                 await conn.commit()
+                bump_version(interaction.guild.id, SETS, CARDS)
+                if added_rarities:
+                    invalidate_rarities(interaction.guild.id)
 
             source_info = "uploaded JSON file" if file else f"`{set}.json`"
             await interaction.followup.send(
@@ -1085,6 +1099,7 @@ class SetCog(commands.Cog):
                 # No need to delete the cards from the 'cards' table, just disassociate from the set
 
                 await conn.commit()
+                bump_version(interaction.guild.id, SETS)
 
             await interaction.followup.send(f"Set `{set_name}` unloaded successfully!", ephemeral=True)
 
@@ -1097,9 +1112,14 @@ class SetCog(commands.Cog):
     # ---------------------------------------------------------------------------------------------------------------------
 
     @app_commands.command(description="Admin: Export a set to a JSON file")
-    @app_commands.describe(set_name="The name of the set to export")
+    @app_commands.describe(
+        set_name="The name of the set to export",
+        compressed="Optional: gzip the exported file",
+        compact="Optional: write compact JSON without indentation"
+    )
     @app_commands.autocomplete(set_name=set_name_autocomplete)
-    async def set_export(self, interaction: discord.Interaction, set_name: str):
+    async def set_export(self, interaction: discord.Interaction, set_name: str, compressed: bool = False,
+                         compact: bool = False):
         if not await check_permissions(interaction):
             await interaction.response.send_message("You do not have permission to use this command. "
                                                     "An Admin needs to `/authorise` you!",
@@ -1127,43 +1147,23 @@ class SetCog(commands.Cog):
                     await interaction.followup.send(f"Preset sets cannot be exported.", ephemeral=True)
                     return
 
-                # Get the cards associated with the set
-                cursor = await conn.execute(
-                    "SELECT cards.name, cards.description, cards.rarity, cards.img_url, cards.local_img_url "
-                    "FROM set_cards "
-                    "JOIN cards ON set_cards.card_id = cards.card_id AND set_cards.guild_id = cards.guild_id "
-                    "WHERE set_cards.set_id = ? AND set_cards.guild_id = ?",
-                    (set_id, interaction.guild.id)
-                )
-                cards = await cursor.fetchall()
+                # Stream the cards into a spooled temp file rather than building the whole export in memory
+                cursor = await conn.execute(EXPORT_CARDS_QUERY, (set_id, interaction.guild.id))
+                encoder = SetExportEncoder(set_name, set_description, compact=compact)
+                gzip_stream = GzipStream() if compressed else None
 
-                # Structure the data in the same format as the presets
-                preset_data = {
-                    "set": {
-                        "name": set_name,
-                        "description": set_description
-                    },
-                    "cards": [
-                        {
-                            "name": card[0],
-                            "description": card[1],
-                            "rarity": card[2],
-                            "img_url": card[3],
-                            "local_img_url": card[4]
-                        } for card in cards
-                    ]
-                }
-
-                # Convert the preset data to a JSON string
-                json_data = json.dumps(preset_data, indent=4)
-
-                # Use io.StringIO to create a file-like object from the JSON string
-                json_file = io.StringIO(json_data)
-                file = discord.File(fp=json_file, filename=f"{set_name}.json")
-
-                # Send the file in the response
-                await interaction.followup.send(content=f"Set `{set_name}` exported successfully.", file=file,
-                                                ephemeral=True)
+                with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as export_file:
+                    async for chunk in aiter_set_export(encoder, cursor):
+                        export_file.write(gzip_stream.compress(chunk) if gzip_stream else chunk.encode('utf-8'))
+                    if gzip_stream:
+                        export_file.write(gzip_stream.flush())
+                    export_file.seek(0)
+
+                    file = discord.File(fp=export_file, filename=export_filename(set_name, compressed))
+
+                    # Send the file in the response
+                    await interaction.followup.send(content=f"Set `{set_name}` exported successfully.", file=file,
+                                                    ephemeral=True)
 
         except Exception as e:
             logger.error(f"Failed to export set: {e}")
@@ -1189,13 +1189,20 @@ async def setup(bot):
         await conn.execute('''
             CREATE TABLE IF NOT EXISTS set_cards (
                 set_id INTEGER,
-                card_id TEXT,
+                card_id INTEGER,
                 guild_id INTEGER,
                 FOREIGN KEY (set_id) REFERENCES card_sets(set_id),
                 FOREIGN KEY (card_id, guild_id) REFERENCES cards(card_id, guild_id),
                 PRIMARY KEY (set_id, card_id, guild_id)
             )
         ''')
+        # Links written while card_create left card IDs empty point at no card
+        await conn.execute("DELETE FROM set_cards WHERE card_id IS NULL")
+        await migrate_card_id_column(conn, 'set_cards')
+        # The primary key leads with set_id; this serves the other direction, the sets a card belongs to
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_set_cards_card ON set_cards (guild_id, card_id, set_id)
+        ''')
         await conn.commit()
     await bot.add_cog(SetCog(bot))
 
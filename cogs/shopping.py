@@ -3,11 +3,20 @@ import logging
 import aiosqlite
 import os
 
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-from datetime import datetime
+from datetime import datetime, timezone
 
 from core.utils import log_command_usage, check_permissions, get_embed_colour
+from core.card_ids import migrate_card_id_column, parse_card_id
+from core.versioning import INVENTORY, bump_version
+from core.trades import (TradeError, TradeSide, attach_offer_message, check_side, create_offer, deny_offer,
+                         discard_offer, execute_trade, expire_offers, get_pending_offer)
+from core.joins import INVENTORY_CARDS, card_match
+from core.history import TRADE, fetch_history_page, get_price_stats
+from core.market import (MarketError, best_ask_for, get_best_ask, bid_levels, buy_from_book, buyer_bids, cancel_bid,
+                         cancel_listing, fill_quantity, fill_total, place_bid, place_listing, price_levels,
+                         seller_listings)
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Database Configuration
@@ -24,111 +33,163 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------------------------------------------------
 # TradeRequestView Class
 # ---------------------------------------------------------------------------------------------------------------------
+# One persistent view serves every trade request. Its buttons have fixed custom_ids and the offer is looked up by the
+# message they were clicked on, so requests sent before a restart keep working. Expiry is handled by the cog's sweeper.
+
+async def fetch_user(bot, user_id):
+    return bot.get_user(user_id) or await bot.fetch_user(user_id)
+
+
+async def notify_user(user, content):
+    try:
+        await user.send(content)
+    except discord.HTTPException as e:
+        logger.warning(f"Could not message user {user.id} about a trade: {e}")
+
+
+def resolved_trade_embed(embed, title, colour, description):
+    embed = embed.copy() if embed else discord.Embed()
+    embed.title = title
+    embed.color = colour
+    embed.description = description
+    return embed
+
+
 class TradeRequestView(discord.ui.View):
-    def __init__(self, bot, user1, user1_item_id, user1_item_name, user2, user2_item_id, user2_item_name, guild_id):
-        super().__init__(timeout=43200)
+    def __init__(self, bot):
+        super().__init__(timeout=None)
         self.bot = bot
-        self.user1 = user1
-        self.user1_item_id = user1_item_id
-        self.user1_item_name = user1_item_name
-        self.user2 = user2
-        self.user2_item_id = user2_item_id
-        self.user2_item_name = user2_item_name
-        self.guild_id = guild_id
 
-    @discord.ui.button(label="Accept", style=discord.ButtonStyle.success)
+    async def load_offer(self, interaction: discord.Interaction):
+        async with aiosqlite.connect(db_path) as conn:
+            offer = await get_pending_offer(conn, interaction.message.id)
+        if offer is None or offer.is_expired() or offer.user2_id != interaction.user.id:
+            await interaction.response.send_message("This trade offer is no longer available.", ephemeral=True)
+            return None
+        return offer
+
+    @discord.ui.button(label="Accept", style=discord.ButtonStyle.success, custom_id="trade_offer:accept")
     async def accept(self, interaction: discord.Interaction, button: discord.ui.Button):
+        offer = await self.load_offer(interaction)
+        if offer is None:
+            return
+
         async with aiosqlite.connect(db_path) as conn:
             try:
-                await conn.execute('BEGIN')
-
-                await conn.execute(
-                    "UPDATE user_inventory SET quantity = quantity - 1 WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                    (self.user1.id, self.user1_item_id, self.guild_id))
-                await conn.execute(
-                    "UPDATE user_inventory SET quantity = quantity - 1 WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                    (self.user2.id, self.user2_item_id, self.guild_id))
-
-                cursor = await conn.execute(
-                    "SELECT quantity FROM user_inventory WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                    (self.user2.id, self.user1_item_id, self.guild_id))
-                user2_item_exists = await cursor.fetchone()
-
-                if user2_item_exists:
-                    await conn.execute(
-                        "UPDATE user_inventory SET quantity = quantity + 1 WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                        (self.user2.id, self.user1_item_id, self.guild_id))
-                else:
-                    await conn.execute(
-                        "INSERT INTO user_inventory (guild_id, user_id, card_id, quantity) VALUES (?, ?, ?, 1)",
-                        (self.guild_id, self.user2.id, self.user1_item_id))
-
-                cursor = await conn.execute(
-                    "SELECT quantity FROM user_inventory WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                    (self.user1.id, self.user2_item_id, self.guild_id))
-                user1_item_exists = await cursor.fetchone()
-
-                if user1_item_exists:
-                    await conn.execute(
-                        "UPDATE user_inventory SET quantity = quantity + 1 WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                        (self.user1.id, self.user2_item_id, self.guild_id))
-                else:
-                    await conn.execute(
-                        "INSERT INTO user_inventory (guild_id, user_id, card_id, quantity) VALUES (?, ?, ?, 1)",
-                        (self.guild_id, self.user1.id, self.user2_item_id))
-
-                await conn.execute(
-                    "DELETE FROM user_inventory WHERE quantity <= 0")
-
-                await conn.execute(
-                    "INSERT INTO trade_history (guild_id, user1_id, user2_id, user1_item, user2_item) VALUES (?, ?, ?, ?, ?)",
-                    (self.guild_id, self.user1.id, self.user2.id, self.user1_item_name, self.user2_item_name))
-
-                await conn.commit()
+                await execute_trade(conn, offer.guild_id, offer.offered, offer.requested, offer.trade_id)
+                bump_version(offer.guild_id, INVENTORY)
 
                 await interaction.response.send_message("Trade accepted successfully.", ephemeral=True)
-                await self.user1.send(f"`{self.user2.display_name}` accepted your trade offer.")
+                user1 = await fetch_user(self.bot, offer.user1_id)
+                await notify_user(user1, f"`{interaction.user.display_name}` accepted your trade offer.")
 
                 # Edit the original trade request message to reflect the success
-                embed = self.message.embeds[0]  # Get the original embed
-                embed.title = "Trade Successful"
-                embed.color = discord.Color.green()
-                embed.description = (f"`{self.user2.display_name}` accepted the trade offer from "
-                                     f"{self.user1.display_name}.\n\n"
-                                     f"**{self.user1.display_name}** traded `{self.user1_item_name}`.\n"
-                                     f"**{self.user2.display_name}** traded `{self.user2_item_name}`.")
-                await self.message.edit(embed=embed, view=None)  # Remove the view after trade is accepted
-
-                self.stop()
+                embed = resolved_trade_embed(
+                    interaction.message.embeds[0] if interaction.message.embeds else None,
+                    "Trade Successful", discord.Color.green(),
+                    f"`{interaction.user.display_name}` accepted the trade offer from {user1.display_name}.\n\n"
+                    f"**{user1.display_name}** traded `{offer.offered.describe()}`.\n"
+                    f"**{interaction.user.display_name}** traded `{offer.requested.describe()}`."
+                )
+                await interaction.message.edit(embed=embed, view=None)  # Remove the buttons after the trade
 
+            except TradeError as e:
+                await interaction.response.send_message(str(e), ephemeral=True)
             except Exception as e:
                 logger.error(f"Error during trade: {e}")
-                await conn.execute('ROLLBACK')
-                await interaction.response.send_message("An error occurred during the trade.", ephemeral=True)
+                if not interaction.response.is_done():
+                    await interaction.response.send_message("An error occurred during the trade.", ephemeral=True)
 
-    @discord.ui.button(label="Deny", style=discord.ButtonStyle.danger)
+    @discord.ui.button(label="Deny", style=discord.ButtonStyle.danger, custom_id="trade_offer:deny")
     async def deny(self, interaction: discord.Interaction, button: discord.ui.Button):
+        offer = await self.load_offer(interaction)
+        if offer is None:
+            return
+
+        async with aiosqlite.connect(db_path) as conn:
+            denied = await deny_offer(conn, offer.trade_id)
+        if not denied:
+            await interaction.response.send_message("This trade offer is no longer available.", ephemeral=True)
+            return
+
         await interaction.response.send_message("You have denied the trade.", ephemeral=True)
-        await self.user1.send(f"`{self.user2.display_name}` denied your trade offer.")
+        user1 = await fetch_user(self.bot, offer.user1_id)
+        await notify_user(user1, f"`{interaction.user.display_name}` denied your trade offer.")
+
+        embed = resolved_trade_embed(
+            interaction.message.embeds[0] if interaction.message.embeds else None,
+            "Trade Denied", discord.Color.red(),
+            f"`{interaction.user.display_name}` denied the trade offer from `{user1.display_name}`."
+        )
+        await interaction.message.edit(embed=embed, view=None)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Transaction History View
+# ---------------------------------------------------------------------------------------------------------------------
+HISTORY_PAGE_SIZE = 10
 
 
-        embed = self.message.embeds[0]
-        embed.title = "Trade Denied"
-        embed.color = discord.Color.red()
-        embed.description = (f"`{self.user2.display_name}` denied the trade offer from "
-                             f"`{self.user1.display_name}`.")
-        await self.message.edit(embed=embed, view=None)
+def format_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%d/%m/%Y at %H:%M")
 
-        self.stop()
 
-    async def on_timeout(self):
-        await self.user1.send(f"Your trade offer to `{self.user2.display_name}` has expired.")
-        embed = self.message.embeds[0]
-        embed.title = "Trade Expired"
-        embed.color = discord.Color.orange()
-        embed.description = "This trade offer has expired due to inactivity."
-        await self.message.edit(embed=embed, view=None)
-        self.stop()
+class TransactionHistoryView(discord.ui.View):
+    """Pages through a member's trades and purchases, newest first, one keyset query per page."""
+
+    def __init__(self, bot, user_id, guild_id, colour):
+        super().__init__(timeout=180)
+        self.bot = bot
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.colour = colour
+        self.cursors = [None]   # tx_id each visited page starts before; None is the newest page
+        self.rows = []
+        self.has_next = False
+
+    async def load_page(self):
+        async with aiosqlite.connect(db_path) as conn:
+            # Read one extra row to learn whether an older page exists
+            rows = await fetch_history_page(conn, self.guild_id, self.user_id, HISTORY_PAGE_SIZE + 1,
+                                            self.cursors[-1])
+        self.rows, self.has_next = rows[:HISTORY_PAGE_SIZE], len(rows) > HISTORY_PAGE_SIZE
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = not self.has_next
+        return self.build_embed()
+
+    def build_embed(self):
+        entries = []
+        for row in self.rows:
+            other_id = row.user2_id if row.user1_id == self.user_id else row.user1_id
+            given, received = ((row.user1_item, row.user2_item) if row.user1_id == self.user_id
+                               else (row.user2_item, row.user1_item))
+            kind = "Trade" if row.kind == TRADE else "Purchase"
+            entries.append(
+                f"**{kind} with:** <@{other_id}>\n"
+                f"**You:** *{given}*\n"
+                f"**Them:** *{received}*\n"
+                f"**When:** *{format_timestamp(row.created_at)}*\n"
+            )
+
+        embed = discord.Embed(title="Trade History", description="\n\n".join(entries), color=self.colour)
+        embed.set_thumbnail(url=self.bot.user.display_avatar.url)
+        embed.set_footer(text=f"Page {len(self.cursors)}")
+        embed.timestamp = discord.utils.utcnow()
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        return interaction.user.id == self.user_id
+
+    @discord.ui.button(label="Newer", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await interaction.response.edit_message(embed=await self.load_page(), view=self)
+
+    @discord.ui.button(label="Older", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.has_next:
+            self.cursors.append(self.rows[-1].tx_id)
+        await interaction.response.edit_message(embed=await self.load_page(), view=self)
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Shopping Class
@@ -137,75 +198,127 @@ class ShoppingCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        # Registers the buttons of every pending trade request, including ones sent before a restart
+        self.bot.add_view(TradeRequestView(self.bot))
+        self.expire_trade_offers.start()
+
+    async def cog_unload(self):
+        self.expire_trade_offers.cancel()
+
+    @tasks.loop(minutes=5)
+    async def expire_trade_offers(self):
+        try:
+            async with aiosqlite.connect(db_path) as conn:
+                expired = await expire_offers(conn)
+        except Exception as e:
+            logger.error(f"Trade offer expiry sweep failed: {e}")
+            return
+
+        for offer in expired:
+            try:
+                user1 = await fetch_user(self.bot, offer.user1_id)
+                await notify_user(user1, "Your trade offer has expired.")
+                if not offer.message_id:
+                    continue
+                message = self.bot.get_partial_messageable(offer.channel_id).get_partial_message(offer.message_id)
+                embed = discord.Embed(title="Trade Expired", color=discord.Color.orange(),
+                                      description="This trade offer has expired due to inactivity.")
+                await message.edit(embed=embed, view=None)
+            except discord.HTTPException as e:
+                logger.warning(f"Could not update expired trade offer {offer.trade_id}: {e}")
+
+    @expire_trade_offers.before_loop
+    async def before_expire_trade_offers(self):
+        await self.bot.wait_until_ready()
+
     async def buy_autocomplete(self, interaction: discord.Interaction, current: str):
         async with aiosqlite.connect(db_path) as conn:
+            # One entry per listed card; the price shown is its best ask, served from the in-memory cache
             cursor = await conn.execute(
-                """
-                SELECT sl.guild_id, sl.user_id, sl.card_id, c.name, c.rarity, sl.value
-                FROM sale_listings sl
-                JOIN cards c ON sl.card_id = c.card_id AND sl.guild_id = c.guild_id
-                WHERE sl.user_id != ?
+                f"""
+                SELECT c.card_id, c.name, c.rarity
+                FROM cards c
+                WHERE c.guild_id = ?
                   AND c.name LIKE ?
-                  AND sl.guild_id = ?
+                  AND EXISTS (SELECT 1 FROM market_listings ml
+                              WHERE {card_match('ml', 'c')} AND ml.seller_id != ?)
+                ORDER BY c.name
                 LIMIT 25
                 """,
-                (interaction.user.id, f"%{current}%", interaction.guild_id)
+                (interaction.guild_id, f"%{current}%", interaction.user.id)
             )
             cards = await cursor.fetchall()
+            asks = [await best_ask_for(conn, interaction.guild_id, card[0], interaction.user.id) for card in cards]
 
-        if not cards:
-            return [discord.app_commands.Choice(name="No listings available", value="0")]
+        choices = [
+            discord.app_commands.Choice(
+                name=f"{card[1]} ({card[2].capitalize()}) - from {ask.price} pts",
+                value=str(card[0])
+            )
+            for card, ask in zip(cards, asks) if ask
+        ]
+        return choices or [discord.app_commands.Choice(name="No listings available", value="0")]
+
+    async def remove_sale_autocomplete(self, interaction: discord.Interaction, current: str):
+        async with aiosqlite.connect(db_path) as conn:
+            listings = await seller_listings(conn, interaction.guild_id, interaction.user.id, current)
+
+        if not listings:
+            return [discord.app_commands.Choice(name="No sales to remove", value="0")]
 
         return [
             discord.app_commands.Choice(
-                name=f"{card[3]} ({card[4].capitalize()}) - {card[5]} pts",
-                value=f"{card[0]}|{card[1]}|{card[2]}"
+                name=f"{listing[1]} ({listing[2].capitalize()}) - {listing[4]}x at {listing[3]} pts",
+                value=str(listing[0])  # listing_id
             )
-            for card in cards
+            for listing in listings
         ]
 
-    async def remove_sale_autocomplete(self, interaction: discord.Interaction, current: str):
+    async def market_card_autocomplete(self, interaction: discord.Interaction, current: str):
         async with aiosqlite.connect(db_path) as conn:
             cursor = await conn.execute(
-                """
-                SELECT sl.guild_id, sl.user_id, sl.card_id, c.name, c.rarity, sl.value
-                FROM sale_listings sl
-                JOIN cards c ON sl.card_id = c.card_id AND sl.guild_id = c.guild_id
-                WHERE sl.user_id = ?
-                  AND c.name LIKE ?
-                  AND sl.guild_id = ?
-                LIMIT 25
-                """,
-                (interaction.user.id, f"%{current}%", interaction.guild_id)
+                "SELECT card_id, name, rarity FROM cards WHERE guild_id = ? AND name LIKE ? ORDER BY name LIMIT 25",
+                (interaction.guild_id, f"%{current}%")
             )
             cards = await cursor.fetchall()
 
         if not cards:
-            return [discord.app_commands.Choice(name="No sales to remove", value="0")]
+            return [discord.app_commands.Choice(name="No cards available", value="0")]
+
+        return [
+            discord.app_commands.Choice(name=f"{card[1]} ({card[2].capitalize()})", value=str(card[0]))
+            for card in cards
+        ]
+
+    async def cancel_bid_autocomplete(self, interaction: discord.Interaction, current: str):
+        async with aiosqlite.connect(db_path) as conn:
+            bids = await buyer_bids(conn, interaction.guild_id, interaction.user.id, current)
+
+        if not bids:
+            return [discord.app_commands.Choice(name="No buy orders to cancel", value="0")]
 
         return [
             discord.app_commands.Choice(
-                name=f"{card[3]} ({card[4].capitalize()}) - {card[5]} pts",
-                value=f"{card[0]}|{card[1]}|{card[2]}"  # guild_id|user_id|card_id
+                name=f"{bid[1]} ({bid[2].capitalize()}) - {bid[4]}x at {bid[3]} pts",
+                value=str(bid[0])  # bid_id
             )
-            for card in cards
+            for bid in bids
         ]
 
     async def card_autocomplete(self, interaction: discord.Interaction, current: str):
         async with aiosqlite.connect(db_path) as conn:
             cursor = await conn.execute(
-                """
+                f"""
                 SELECT DISTINCT c.card_id, c.name, c.rarity
-                FROM cards AS c
-                JOIN user_inventory AS ui ON c.card_id = ui.card_id AND c.guild_id = ui.guild_id
-                WHERE ui.user_id = ?
-                  AND ui.guild_id = ?
-                  AND c.guild_id = ?
+                FROM {INVENTORY_CARDS}
+                WHERE ui.guild_id = ?
+                  AND ui.user_id = ?
                   AND c.name LIKE ?
                 ORDER BY c.name
                 LIMIT 25
                 """,
-                (interaction.user.id, interaction.guild.id, interaction.guild.id, f"%{current}%")
+                (interaction.guild.id, interaction.user.id, f"%{current}%")
             )
             cards = await cursor.fetchall()
 
@@ -224,18 +337,16 @@ class ShoppingCog(commands.Cog):
         other_player = interaction.namespace.other_player
         async with aiosqlite.connect(db_path) as conn:
             cursor = await conn.execute(
-                """
+                f"""
                 SELECT DISTINCT c.card_id, c.name, c.rarity
-                FROM cards AS c
-                JOIN user_inventory AS ui ON c.card_id = ui.card_id AND c.guild_id = ui.guild_id
-                WHERE ui.user_id = ?
-                  AND ui.guild_id = ?
-                  AND c.guild_id = ?
+                FROM {INVENTORY_CARDS}
+                WHERE ui.guild_id = ?
+                  AND ui.user_id = ?
                   AND c.name LIKE ?
                 ORDER BY c.name
                 LIMIT 25
                 """,
-                (other_player.id, interaction.guild.id, interaction.guild.id, f"%{current}%")
+                (interaction.guild.id, other_player.id, f"%{current}%")
             )
             cards = await cursor.fetchall()
 
@@ -255,147 +366,67 @@ class ShoppingCog(commands.Cog):
     # Shopping Commands
     # ---------------------------------------------------------------------------------------------------------------------
     @app_commands.command(description="User: Buy a card from available listings")
-    @app_commands.describe(card="The card you want to buy")
+    @app_commands.describe(card="The card you want to buy", quantity="How many copies to buy",
+                           max_price="The most you are willing to pay per copy")
     @app_commands.autocomplete(card=buy_autocomplete)
-    async def buy(self, interaction: discord.Interaction, card: str):
+    async def buy(self, interaction: discord.Interaction, card: str, quantity: int = 1, max_price: int = None):
         try:
-            guild_id, seller_id, card_id = card.split('|')
-
+            card_id = parse_card_id(card)
             async with aiosqlite.connect(db_path) as conn:
-                cursor = await conn.execute(
-                    """
-                    SELECT value
-                    FROM sale_listings
-                    WHERE guild_id = ? AND user_id = ? AND card_id = ?
-                    """,
-                    (guild_id, seller_id, card_id)
-                )
-                sale_info = await cursor.fetchone()
-
-                if not sale_info:
+                ask = await best_ask_for(conn, interaction.guild_id, card_id, interaction.user.id) \
+                    if card_id is not None else None
+                if not ask:
                     await interaction.response.send_message("This card is no longer available.", ephemeral=True)
                     return
 
-                price = sale_info[0]
-                if int(seller_id) == interaction.user.id:
-                    await interaction.response.send_message("You cannot buy your own listing.", ephemeral=True)
-                    return
+                fills = await buy_from_book(conn, interaction.guild_id, interaction.user.id, card_id, quantity,
+                                            max_price)
+            bump_version(interaction.guild_id, INVENTORY)
 
-                cursor = await conn.execute(
-                    """
-                    SELECT balance
-                    FROM economy
-                    WHERE user_id = ? AND guild_id = ?
-                    """,
-                    (interaction.user.id, interaction.guild_id)
-                )
-                buyer_info = await cursor.fetchone()
-
-                if buyer_info and buyer_info[0] >= price:
-                    await conn.execute(
-                        "UPDATE economy SET balance = balance - ? WHERE user_id = ? AND guild_id = ?",
-                        (price, interaction.user.id, interaction.guild_id)
-                    )
-                    await conn.execute(
-                        "UPDATE economy SET balance = balance + ? WHERE user_id = ? AND guild_id = ?",
-                        (price, seller_id, interaction.guild_id)
-                    )
-
-                    cursor = await conn.execute(
-                        """
-                        SELECT quantity
-                        FROM user_inventory
-                        WHERE user_id = ? AND card_id = ? AND guild_id = ?
-                        """,
-                        (interaction.user.id, card_id, interaction.guild_id)
-                    )
-                    inventory_info = await cursor.fetchone()
-
-                    if inventory_info:
-                        await conn.execute(
-                            """
-                            UPDATE user_inventory
-                            SET quantity = quantity + 1
-                            WHERE user_id = ? AND card_id = ? AND guild_id = ?
-                            """,
-                            (interaction.user.id, card_id, interaction.guild_id)
-                        )
-                    else:
-                        await conn.execute(
-                            """
-                            INSERT INTO user_inventory (guild_id, user_id, card_id, quantity)
-                            VALUES (?, ?, ?, 1)
-                            """,
-                            (interaction.guild_id, interaction.user.id, card_id)
-                        )
-
-                    await conn.execute(
-                        """
-                        DELETE FROM sale_listings
-                        WHERE guild_id = ? AND user_id = ? AND card_id = ?
-                        """,
-                        (guild_id, seller_id, card_id)
-                    )
-                    await conn.commit()
-
-                    await interaction.response.send_message(
-                        f"You have successfully purchased the card for {price} points.",
-                        ephemeral=True
-                    )
-                else:
-                    await interaction.response.send_message(
-                        "You do not have enough points to buy this card.",
-                        ephemeral=True
-                    )
+            bought = fill_quantity(fills)
+            spent = fill_total(fills)
+            message = f"You have successfully purchased {bought} card(s) for {spent} points."
+            if bought < quantity:
+                message += f" Only {bought} of the {quantity} copies you asked for were available at that price."
+            await interaction.response.send_message(message, ephemeral=True)
+
+        except MarketError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
         except Exception as e:
             logger.error(f"Error handling buy command: {e}")
             await interaction.response.send_message("An error occurred while processing your request.", ephemeral=True)
+        finally:
+            await log_command_usage(self.bot, interaction)
+
     # ---------------------------------------------------------------------------------------------------------------------
 
     @app_commands.command(description="User: Sell a card from your inventory")
-    @app_commands.describe(card="The card you want to sell", price="Price in points for the card")
+    @app_commands.describe(card="The card you want to sell", price="Price in points for each copy",
+                           quantity="How many copies to list")
     @app_commands.autocomplete(card=card_autocomplete)
-    async def sell(self, interaction: discord.Interaction, card: str, price: int):
+    async def sell(self, interaction: discord.Interaction, card: str, price: int, quantity: int = 1):
         try:
-            async with aiosqlite.connect(db_path) as conn:
-                # Log the input data
-                logging.info(
-                    f"User ID: {interaction.user.id}, Guild ID: {interaction.guild_id}, Card: {card}, Price: {price}")
-
-                # Split the card input to get the card_id
-                card_id, card_name = card.split('|')
-                logging.info(f"Card ID: {card_id}, Card Name: {card_name}")
-
-                # Fetch the card from the user's inventory
-                cursor = await conn.execute(
-                    "SELECT quantity FROM user_inventory WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                    (interaction.user.id, card_id, interaction.guild_id))
-                result = await cursor.fetchone()
-
-                logging.info(f"Result from DB: {result}")
-
-                if result and result[0] > 0:
-                    new_quantity = result[0] - 1
-                    await conn.execute(
-                        "INSERT INTO sale_listings (guild_id, user_id, card_id, value) VALUES (?, ?, ?, ?)",
-                        (interaction.guild_id, interaction.user.id, card_id, price))
-
-                    if new_quantity > 0:
-                        await conn.execute(
-                            "UPDATE user_inventory SET quantity = ? WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                            (new_quantity, interaction.user.id, card_id, interaction.guild_id))
-                    else:
-                        await conn.execute(
-                            "DELETE FROM user_inventory WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                            (interaction.user.id, card_id, interaction.guild_id))
-
-                    await conn.commit()
-                    await interaction.response.send_message(f"Card `{card_name}` listed for sale at `{price}` points.",
-                                                            ephemeral=True)
-                else:
-                    await interaction.response.send_message("You do not own this card or have insufficient quantity.",
-                                                            ephemeral=True)
+            # Split the card input to get the card_id
+            card_id, card_name = card.split('|')
+            card_id = parse_card_id(card_id)
 
+            async with aiosqlite.connect(db_path) as conn:
+                fills, listing_id = await place_listing(conn, interaction.guild_id, interaction.user.id, card_id,
+                                                        price, quantity)
+            bump_version(interaction.guild_id, INVENTORY)
+
+            # Standing buy orders at or above the asking price are filled straight away
+            messages = []
+            if fills:
+                messages.append(f"Sold {fill_quantity(fills)}x `{card_name}` to buy orders for "
+                                f"`{fill_total(fills)}` points.")
+            if listing_id:
+                messages.append(f"{quantity - fill_quantity(fills)}x `{card_name}` listed for sale at `{price}` "
+                                f"points each.")
+            await interaction.response.send_message("\n".join(messages), ephemeral=True)
+
+        except MarketError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
         except Exception as e:
             logger.error(f"Error handling sell command: {e}")
             await interaction.response.send_message("An error occurred while processing your request.", ephemeral=True)
@@ -406,66 +437,25 @@ class ShoppingCog(commands.Cog):
     # ---------------------------------------------------------------------------------------------------------------------
 
     @app_commands.command(description="User: Remove a card from your sale listings")
-    @app_commands.describe(card="The card you want to remove from sale")
+    @app_commands.describe(card="The listing you want to remove from sale",
+                           quantity="How many copies to take back (all by default)")
     @app_commands.autocomplete(card=remove_sale_autocomplete)
-    async def remove_sale(self, interaction: discord.Interaction, card: str):
+    async def remove_sale(self, interaction: discord.Interaction, card: str, quantity: int = None):
         try:
-            # Parse the composite key
-            guild_id, user_id, card_id = card.split('|')
-
             async with aiosqlite.connect(db_path) as conn:
-                # Ensure the sale listing exists
-                cursor = await conn.execute(
-                    """
-                    SELECT card_id
-                    FROM sale_listings
-                    WHERE guild_id = ? AND user_id = ? AND card_id = ?
-                    """,
-                    (guild_id, user_id, card_id)
-                )
-                result = await cursor.fetchone()
-
-                if result:
-                    # Remove the sale listing
-                    await conn.execute(
-                        """
-                        DELETE FROM sale_listings
-                        WHERE guild_id = ? AND user_id = ? AND card_id = ?
-                        """,
-                        (guild_id, user_id, card_id)
-                    )
-
-                    # Update the user's inventory
-                    update_cursor = await conn.execute(
-                        """
-                        UPDATE user_inventory
-                        SET quantity = quantity + 1
-                        WHERE user_id = ? AND card_id = ? AND guild_id = ?
-                        """,
-                        (interaction.user.id, card_id, guild_id)
-                    )
-
-                    # If no row was updated, insert the item into the inventory
-                    if update_cursor.rowcount == 0:
-                        await conn.execute(
-                            """
-                            INSERT INTO user_inventory (guild_id, user_id, card_id, quantity)
-                            VALUES (?, ?, ?, 1)
-                            """,
-                            (guild_id, interaction.user.id, card_id)
-                        )
-
-                    await conn.commit()
-                    await interaction.response.send_message(
-                        "The sale listing has been removed and the card has been returned to your inventory.",
-                        ephemeral=True
-                    )
-                else:
-                    await interaction.response.send_message(
-                        "No such sale listing found for your account.",
-                        ephemeral=True
-                    )
+                _, returned = await cancel_listing(conn, interaction.guild_id, interaction.user.id, int(card),
+                                                   quantity)
+            bump_version(interaction.guild_id, INVENTORY)
+
+            await interaction.response.send_message(
+                f"{returned} card(s) have been taken off sale and returned to your inventory.",
+                ephemeral=True
+            )
 
+        except MarketError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+        except ValueError:
+            await interaction.response.send_message("No such sale listing found for your account.", ephemeral=True)
         except Exception as e:
             logger.error(f"Error handling remove_sale command: {e}")
             await interaction.response.send_message(
@@ -477,61 +467,183 @@ class ShoppingCog(commands.Cog):
 
     # ---------------------------------------------------------------------------------------------------------------------
 
+    @app_commands.command(description="User: Place a standing order to buy a card")
+    @app_commands.describe(card="The card you want to buy", price="The most you will pay per copy",
+                           quantity="How many copies you want")
+    @app_commands.autocomplete(card=market_card_autocomplete)
+    async def buy_order(self, interaction: discord.Interaction, card: str, price: int, quantity: int = 1):
+        try:
+            card_id = parse_card_id(card)
+            async with aiosqlite.connect(db_path) as conn:
+                cursor = await conn.execute("SELECT name FROM cards WHERE guild_id = ? AND card_id = ?",
+                                            (interaction.guild_id, card_id))
+                card_row = await cursor.fetchone()
+                if not card_row:
+                    await interaction.response.send_message("Card not found.", ephemeral=True)
+                    return
+
+                fills, bid_id = await place_bid(conn, interaction.guild_id, interaction.user.id, card_id, price,
+                                                quantity)
+            if fills:
+                bump_version(interaction.guild_id, INVENTORY)
+
+            # Listings at or below the order price are bought straight away; the rest waits for sellers
+            messages = []
+            if fills:
+                messages.append(f"Bought {fill_quantity(fills)}x `{card_row[0]}` from listings for "
+                                f"`{fill_total(fills)}` points.")
+            if bid_id:
+                messages.append(f"Buy order placed for {quantity - fill_quantity(fills)}x `{card_row[0]}` at "
+                                f"`{price}` points each. The points are held until the order fills or is "
+                                f"cancelled.")
+            await interaction.response.send_message("\n".join(messages), ephemeral=True)
+
+        except MarketError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+        except Exception as e:
+            logger.error(f"Error handling buy_order command: {e}")
+            await interaction.response.send_message("An error occurred while processing your request.", ephemeral=True)
+        finally:
+            await log_command_usage(self.bot, interaction)
+
+    # ---------------------------------------------------------------------------------------------------------------------
+
+    @app_commands.command(description="User: Cancel one of your buy orders")
+    @app_commands.describe(order="The buy order you want to cancel")
+    @app_commands.autocomplete(order=cancel_bid_autocomplete)
+    async def cancel_buy_order(self, interaction: discord.Interaction, order: str):
+        try:
+            async with aiosqlite.connect(db_path) as conn:
+                _, refunded = await cancel_bid(conn, interaction.guild_id, interaction.user.id, int(order))
+
+            await interaction.response.send_message(
+                f"Your buy order has been cancelled and `{refunded}` points have been returned.", ephemeral=True)
+
+        except MarketError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+        except ValueError:
+            await interaction.response.send_message("No such buy order found for your account.", ephemeral=True)
+        except Exception as e:
+            logger.error(f"Error handling cancel_buy_order command: {e}")
+            await interaction.response.send_message("An error occurred while processing your request.", ephemeral=True)
+        finally:
+            await log_command_usage(self.bot, interaction)
+
+    # ---------------------------------------------------------------------------------------------------------------------
+
+    @app_commands.command(description="User: See the cheapest listings for a card")
+    @app_commands.describe(card="The card whose listings you want to see")
+    @app_commands.autocomplete(card=market_card_autocomplete)
+    async def listings(self, interaction: discord.Interaction, card: str):
+        await interaction.response.defer(ephemeral=True)
+        try:
+            card_id = parse_card_id(card)
+            async with aiosqlite.connect(db_path) as conn:
+                cursor = await conn.execute("SELECT name FROM cards WHERE guild_id = ? AND card_id = ?",
+                                            (interaction.guild_id, card_id))
+                card_row = await cursor.fetchone()
+                levels = await price_levels(conn, interaction.guild_id, card_id)
+                bids = await bid_levels(conn, interaction.guild_id, card_id)
+
+            if not card_row or not (levels or bids):
+                await interaction.followup.send("There are no listings for this card.", ephemeral=True)
+                return
+
+            embed = discord.Embed(
+                title=f"Listings for {card_row[0]}",
+                color=await get_embed_colour(interaction.guild_id)
+            )
+            embed.add_field(name="For Sale", inline=True, value="\n".join(
+                f"**{price} pts** - {copies} cop{'y' if copies == 1 else 'ies'}"
+                f" from {count} listing{'' if count == 1 else 's'}"
+                for price, copies, count in levels) or "Nothing listed")
+            embed.add_field(name="Buy Orders", inline=True, value="\n".join(
+                f"**{price} pts** - {copies} cop{'y' if copies == 1 else 'ies'}"
+                f" from {count} order{'' if count == 1 else 's'}"
+                for price, copies, count in bids) or "No buy orders")
+            embed.set_footer(text="Cheapest listings are bought first")
+            embed.timestamp = discord.utils.utcnow()
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
+        except Exception as e:
+            logger.error(f"Error fetching listings: {e}")
+            await interaction.followup.send("An error occurred while fetching listings.", ephemeral=True)
+        finally:
+            await log_command_usage(self.bot, interaction)
+
+    # ---------------------------------------------------------------------------------------------------------------------
+
     @app_commands.command(description="User: Trade items with another player")
     @app_commands.describe(other_player="The player you want to trade with", your_item="The item you're offering",
-                           their_item="The item you want")
-    @app_commands.autocomplete(your_item=card_autocomplete, their_item=other_player_card_autocomplete)
-    async def trade(self, interaction: discord.Interaction, other_player: discord.Member, your_item: str,
-                    their_item: str):
+                           their_item="The item you want", your_item_2="Another item you're offering",
+                           your_item_3="Another item you're offering", their_item_2="Another item you want",
+                           their_item_3="Another item you want", your_points="Points you're adding to the offer",
+                           their_points="Points you want from them")
+    @app_commands.autocomplete(your_item=card_autocomplete, your_item_2=card_autocomplete,
+                               your_item_3=card_autocomplete, their_item=other_player_card_autocomplete,
+                               their_item_2=other_player_card_autocomplete,
+                               their_item_3=other_player_card_autocomplete)
+    async def trade(self, interaction: discord.Interaction, other_player: discord.Member, your_item: str = None,
+                    their_item: str = None, your_item_2: str = None, your_item_3: str = None,
+                    their_item_2: str = None, their_item_3: str = None, your_points: int = 0,
+                    their_points: int = 0):
         await interaction.response.defer(ephemeral=True)
         try:
             if other_player.id == interaction.user.id:
                 await interaction.followup.send("You cannot trade with yourself.", ephemeral=True)
                 return
 
-            your_item_id, your_item_name = your_item.split('|')
-            their_item_id, their_item_name = their_item.split('|')
+            # Picking the same card in several slots trades that many copies of it
+            offered = TradeSide(interaction.user.id, your_points)
+            for item in (your_item, your_item_2, your_item_3):
+                if item and item != "0":
+                    card_id, card_name = item.split('|')
+                    offered.add_card(parse_card_id(card_id), card_name)
+            requested = TradeSide(other_player.id, their_points)
+            for item in (their_item, their_item_2, their_item_3):
+                if item and item != "0":
+                    card_id, card_name = item.split('|')
+                    requested.add_card(parse_card_id(card_id), card_name)
+
+            if offered.is_empty() and requested.is_empty():
+                await interaction.followup.send("Add at least one card or some points to the trade.", ephemeral=True)
+                return
 
             async with aiosqlite.connect(db_path) as conn:
-                # Check if the user owns the item they want to trade
-                cursor = await conn.execute(
-                    "SELECT quantity FROM user_inventory WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                    (interaction.user.id, your_item_id, interaction.guild_id))
-                user_item = await cursor.fetchone()
-
-                if not user_item or user_item[0] < 1:
-                    await interaction.followup.send("You do not own the item you're trying to trade.", ephemeral=True)
+                # Check both sides hold what is being traded before bothering the other player
+                problem = await check_side(conn, interaction.guild_id, offered)
+                if problem:
+                    await interaction.followup.send(f"You cannot make this offer: {problem}.",
+                                                    ephemeral=True)
                     return
-
-                # Check if the other player owns the item they are supposed to trade
-                cursor = await conn.execute(
-                    "SELECT quantity FROM user_inventory WHERE user_id = ? AND card_id = ? AND guild_id = ?",
-                    (other_player.id, their_item_id, interaction.guild_id))
-                other_item = await cursor.fetchone()
-
-                if not other_item or other_item[0] < 1:
-                    await interaction.followup.send(f"{other_player.display_name} does not own the item you want.",
+                problem = await check_side(conn, interaction.guild_id, requested)
+                if problem:
+                    await interaction.followup.send(f"{other_player.display_name} cannot give this: {problem}.",
                                                     ephemeral=True)
                     return
 
-                # Send trade request to the other player
-                guild_name = interaction.guild.name
-                trade_request_embed = discord.Embed(
-                    title="Trade Request",
-                    description=f"{interaction.user.display_name} from **{guild_name}** wants to trade their "
-                                f"`{your_item_name}` for your `{their_item_name}`.",
-                    color=await get_embed_colour(interaction.guild.id)
-                )
-
-                # Create the view and send it to the other player
-                view = TradeRequestView(self.bot, interaction.user, your_item_id, your_item_name, other_player,
-                                        their_item_id, their_item_name, interaction.guild.id)
-                message = await other_player.send(embed=trade_request_embed, view=view)
+            # Send trade request to the other player
+            guild_name = interaction.guild.name
+            trade_request_embed = discord.Embed(
+                title="Trade Request",
+                description=f"{interaction.user.display_name} from **{guild_name}** wants to trade their "
+                            f"`{offered.describe()}` for your `{requested.describe()}`.",
+                color=await get_embed_colour(interaction.guild.id)
+            )
 
-                # Save the message object to the view for later use in the timeout handler
-                view.message = message
+            # Store the offer first, then send it to the other player with the shared persistent buttons
+            async with aiosqlite.connect(db_path) as conn:
+                trade_id = await create_offer(conn, interaction.guild.id, offered, requested)
+                try:
+                    message = await other_player.send(embed=trade_request_embed, view=TradeRequestView(self.bot))
+                except discord.HTTPException:
+                    await discard_offer(conn, trade_id)
+                    await interaction.followup.send(f"Could not send a direct message to {other_player.display_name}.",
+                                                    ephemeral=True)
+                    return
+                await attach_offer_message(conn, trade_id, message.channel.id, message.id)
 
-                await interaction.followup.send(f"Trade request sent to {other_player.display_name}.", ephemeral=True)
+            await interaction.followup.send(f"Trade request sent to {other_player.display_name}.", ephemeral=True)
 
         except Exception as e:
             logger.error(f"Error handling trade command: {e}")
@@ -539,55 +651,19 @@ class ShoppingCog(commands.Cog):
         finally:
             await log_command_usage(self.bot, interaction)
 
-    @staticmethod
-    def format_timestamp(timestamp_str):
-        timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-        return timestamp.strftime("%d/%m/%Y at %H:%M")
-
-    @app_commands.command(description="User: View your trade history")
+    @app_commands.command(description="User: View your trade and purchase history")
     async def trade_history(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         try:
-            async with aiosqlite.connect(db_path) as conn:
-                cursor = await conn.execute(
-                    "SELECT user1_id, user2_id, user1_item, user2_item, timestamp FROM trade_history WHERE (user1_id = ? OR user2_id = ?) AND guild_id = ? ORDER BY timestamp DESC LIMIT 10",
-                    (interaction.user.id, interaction.user.id, interaction.guild_id))
-                trades = await cursor.fetchall()
-
-                if not trades:
-                    await interaction.followup.send("You have no trade history.", ephemeral=True)
-                    return
+            view = TransactionHistoryView(self.bot, interaction.user.id, interaction.guild_id,
+                                          await get_embed_colour(interaction.guild_id))
+            embed = await view.load_page()
 
-                trade_list = []
-                for trade in trades:
-                    user1_id, user2_id, user1_item, user2_item, timestamp_str = trade
-                    formatted_timestamp = self.format_timestamp(timestamp_str)
-
-                    if interaction.user.id == user1_id:
-                        trade_list.append(
-                            f"**User:** <@{user2_id}>\n"
-                            f"**You:** *{user1_item}*\n"
-                            f"**Them:** *{user2_item}*\n"
-                            f"**When:** *{formatted_timestamp}*\n"
-                        )
-                    else:
-                        trade_list.append(
-                            f"**User:** <@{user1_id}>\n"
-                            f"**You:** *{user2_item}*\n"
-                            f"**Them:** *{user1_item}*\n"
-                            f"**When:** *{formatted_timestamp}*\n"
-                        )
-
-                trade_history_embed = discord.Embed(
-                    title="Trade History",
-                    description="\n\n".join(trade_list),
-                    color=await get_embed_colour(interaction.guild_id)
-                )
-                trade_history_embed.set_thumbnail(url=self.bot.user.display_avatar.url)
-                trade_history_embed.set_footer(text=f"Trade History for {interaction.user.name}")
-                trade_history_embed.timestamp = discord.utils.utcnow()
+            if not view.rows:
+                await interaction.followup.send("You have no trade history.", ephemeral=True)
+                return
 
-                await interaction.followup.send(embed=trade_history_embed, ephemeral=True)
+            await interaction.followup.send(embed=embed, view=view, ephemeral=True)
 
         except Exception as e:
             logger.error(f"Error fetching trade history: {e}")
@@ -595,67 +671,219 @@ class ShoppingCog(commands.Cog):
         finally:
             await log_command_usage(self.bot, interaction)
 
+    # ---------------------------------------------------------------------------------------------------------------------
+
+    @app_commands.command(description="User: View recent prices and volume for a card")
+    @app_commands.describe(card="The card you want market statistics for")
+    @app_commands.autocomplete(card=market_card_autocomplete)
+    async def market_stats(self, interaction: discord.Interaction, card: str):
+        await interaction.response.defer(ephemeral=True)
+        try:
+            card_id = parse_card_id(card)
+            async with aiosqlite.connect(db_path) as conn:
+                cursor = await conn.execute("SELECT name FROM cards WHERE guild_id = ? AND card_id = ?",
+                                            (interaction.guild_id, card_id))
+                card_row = await cursor.fetchone()
+                stats = await get_price_stats(conn, interaction.guild_id, card_id) if card_row else None
+                ask = await get_best_ask(conn, interaction.guild_id, card_id) if card_row else None
+
+            if not card_row:
+                await interaction.followup.send("Card not found.", ephemeral=True)
+                return
+            if not stats:
+                await interaction.followup.send(f"`{card_row[0]}` has not been sold on the market yet.",
+                                                ephemeral=True)
+                return
+
+            (last_price, last_traded_at, copies, turnover), windows = stats
+            embed = discord.Embed(
+                title=f"Market Stats for {card_row[0]}",
+                description=(f"**Last Price:** {last_price} pts (<t:{last_traded_at}:R>)\n"
+                             f"**Cheapest Listing:** {f'{ask.price} pts' if ask else 'None'}\n"
+                             f"**All Time:** {copies} sold for {turnover} pts"),
+                color=await get_embed_colour(interaction.guild_id)
+            )
+            for label, window in windows.items():
+                value = (f"**Sold:** {window.copies}\n**Median:** {window.median} pts\n"
+                         f"**Range:** {window.low}-{window.high} pts\n**Volume:** {window.turnover} pts"
+                         if window.copies else "No sales")
+                embed.add_field(name=label, value=value, inline=True)
+            embed.timestamp = discord.utils.utcnow()
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
+        except Exception as e:
+            logger.error(f"Error fetching market stats: {e}")
+            await interaction.followup.send("An error occurred while fetching market statistics.", ephemeral=True)
+        finally:
+            await log_command_usage(self.bot, interaction)
+
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Setup Function
 # ---------------------------------------------------------------------------------------------------------------------
 async def setup(bot):
     async with aiosqlite.connect(db_path) as conn:
-        # Check if the `sale_listings` table exists
+        # Order book: one row per (seller, card, price) with the number of copies listed
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS market_listings (
+                listing_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                seller_id INTEGER NOT NULL,
+                card_id INTEGER NOT NULL,
+                price INTEGER NOT NULL CHECK (price > 0),
+                quantity INTEGER NOT NULL CHECK (quantity >= 0),
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        await migrate_card_id_column(conn, 'market_listings')
+        # Each card's book in price order, so the best ask is the first entry of an index range
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_market_listings_ask
+            ON market_listings (guild_id, card_id, price, listing_id)
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_market_listings_seller
+            ON market_listings (guild_id, seller_id, card_id, price)
+        """)
+
+        # Standing buy orders; price x quantity of every open order is held in escrow
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS market_bids (
+                bid_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                buyer_id INTEGER NOT NULL,
+                card_id INTEGER NOT NULL,
+                price INTEGER NOT NULL CHECK (price > 0),
+                quantity INTEGER NOT NULL CHECK (quantity >= 0),
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        await migrate_card_id_column(conn, 'market_bids')
+        # Highest bid first, oldest first within a price, so an incoming listing matches from the front of the range
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_market_bids_match
+            ON market_bids (guild_id, card_id, price DESC, bid_id)
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_market_bids_buyer
+            ON market_bids (guild_id, buyer_id, card_id)
+        """)
+
+        # Move listings from the old flat `sale_listings` table, one row per copy, into the order book
         cursor = await conn.execute(
             "SELECT name FROM sqlite_master WHERE type='table' AND name='sale_listings';"
         )
-        table_exists = await cursor.fetchone()
-
-        # If the table exists, check for `listing_id` and migrate if necessary
-        if table_exists:
-            cursor = await conn.execute("PRAGMA table_info(sale_listings);")
-            columns = await cursor.fetchall()
-
-            # Check if `listing_id` exists in the table schema
-            if any(column[1] == "listing_id" for column in columns):
-                # Migrate the table to remove `listing_id`
-                await conn.execute("""
-                    CREATE TABLE IF NOT EXISTS sale_listings_new (
-                        guild_id INTEGER NOT NULL,
-                        user_id INTEGER NOT NULL,
-                        card_id TEXT NOT NULL,
-                        value INTEGER NOT NULL,
-                        FOREIGN KEY (guild_id, user_id, card_id) REFERENCES user_inventory(guild_id, user_id, card_id)
-                    );
-                """)
-                await conn.execute("""
-                    INSERT INTO sale_listings_new (guild_id, user_id, card_id, value)
-                    SELECT guild_id, user_id, card_id, value FROM sale_listings;
-                """)
-                await conn.execute("DROP TABLE sale_listings;")
-                await conn.execute("ALTER TABLE sale_listings_new RENAME TO sale_listings;")
-                await conn.commit()
-                print("Migrated sale_listings table: removed listing_id column.")
-
-        # Create the `sale_listings` table if it doesn't exist
+        if await cursor.fetchone():
+            await conn.execute("""
+                INSERT INTO market_listings (guild_id, seller_id, card_id, price, quantity)
+                SELECT guild_id, user_id, card_id, value, COUNT(*) FROM sale_listings
+                WHERE value > 0
+                GROUP BY guild_id, user_id, card_id, value
+            """)
+            # Listings without a valid price cannot be matched, so their copies go back to the seller
+            await conn.execute("""
+                INSERT INTO user_inventory (guild_id, user_id, card_id, quantity)
+                SELECT guild_id, user_id, card_id, COUNT(*) FROM sale_listings
+                WHERE value <= 0
+                GROUP BY guild_id, user_id, card_id
+                ON CONFLICT(guild_id, user_id, card_id) DO UPDATE SET quantity = quantity + excluded.quantity
+            """)
+            await conn.execute("DROP TABLE sale_listings;")
+            await conn.commit()
+            logger.info("Migrated sale_listings into market_listings.")
+
+        # Unified history of trades and marketplace purchases
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS market_transactions (
+                tx_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                user1_id INTEGER NOT NULL,
+                user2_id INTEGER NOT NULL,
+                user1_item TEXT NOT NULL,
+                user2_item TEXT NOT NULL,
+                card_id INTEGER,
+                quantity INTEGER,
+                price INTEGER,
+                created_at INTEGER NOT NULL
+            );
+        """)
+        # One row per participant, so a member's history is one index range in tx_id order
         await conn.execute("""
-            CREATE TABLE IF NOT EXISTS sale_listings (
+            CREATE TABLE IF NOT EXISTS transaction_participants (
                 guild_id INTEGER NOT NULL,
                 user_id INTEGER NOT NULL,
-                card_id TEXT NOT NULL,
-                value INTEGER NOT NULL,
-                FOREIGN KEY (guild_id, user_id, card_id) REFERENCES user_inventory(guild_id, user_id, card_id)
+                tx_id INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, user_id, tx_id)
+            ) WITHOUT ROWID;
+        """)
+
+        # Price aggregates maintained on every purchase
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS card_price_stats (
+                guild_id INTEGER NOT NULL,
+                card_id INTEGER NOT NULL,
+                last_price INTEGER NOT NULL,
+                last_traded_at INTEGER NOT NULL,
+                copies INTEGER NOT NULL DEFAULT 0,
+                turnover INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (guild_id, card_id)
             );
         """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS card_price_buckets (
+                guild_id INTEGER NOT NULL,
+                card_id INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                price INTEGER NOT NULL,
+                copies INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, card_id, day, price)
+            ) WITHOUT ROWID;
+        """)
+        for table in ('market_transactions', 'card_price_stats', 'card_price_buckets'):
+            await migrate_card_id_column(conn, table)
 
-        # Create the `trade_history` table if it doesn't exist
+        # Move the old `trade_history` rows into the unified history, keeping their IDs and order
+        cursor = await conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='trade_history';"
+        )
+        if await cursor.fetchone():
+            await conn.execute("""
+                INSERT OR IGNORE INTO market_transactions
+                    (tx_id, guild_id, kind, user1_id, user2_id, user1_item, user2_item, created_at)
+                SELECT id, guild_id, 'trade', user1_id, user2_id, user1_item, user2_item,
+                       COALESCE(CAST(strftime('%s', timestamp) AS INTEGER), 0)
+                FROM trade_history
+            """)
+            await conn.execute("""
+                INSERT OR IGNORE INTO transaction_participants (guild_id, user_id, tx_id)
+                SELECT guild_id, user1_id, id FROM trade_history
+                UNION ALL
+                SELECT guild_id, user2_id, id FROM trade_history
+            """)
+            await conn.execute("DROP TABLE trade_history;")
+            await conn.commit()
+            logger.info("Migrated trade_history into market_transactions.")
+
+        # Trade requests waiting for an answer; the DM message carrying the buttons identifies the offer
         await conn.execute("""
-            CREATE TABLE IF NOT EXISTS trade_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS trade_offers (
+                trade_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 guild_id INTEGER NOT NULL,
                 user1_id INTEGER NOT NULL,
                 user2_id INTEGER NOT NULL,
-                user1_item TEXT NOT NULL,
-                user2_item TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                offered TEXT NOT NULL,
+                requested TEXT NOT NULL,
+                channel_id INTEGER,
+                message_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                expires_at INTEGER NOT NULL,
+                resolved_at INTEGER
             );
         """)
+        await conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_trade_offers_message ON trade_offers (message_id)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_trade_offers_status ON trade_offers (status, expires_at)")
 
         await conn.commit()
     await bot.add_cog(ShoppingCog(bot))
@@ -8,7 +8,10 @@ from discord import app_commands
 from discord.ui import View, Button, Select
 
 from core.utils import log_command_usage, check_permissions, get_embed_colour
-from core.pagination import InventoryPaginationView
+from core.pagination import InventoryPaginationView, InventoryViewModel
+from core.inventory import find_inventory_item
+from core.joins import INVENTORY_CARDS
+from core.versioning import INVENTORY, bump_version
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Database Configuration
@@ -27,13 +30,13 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------------------------------------------------
 async def inventory_autocomplete(interaction: discord.Interaction, current: str):
     async with aiosqlite.connect(db_path) as conn:
-        cursor = await conn.execute('''
+        cursor = await conn.execute(f'''
             SELECT c.name
-            FROM user_inventory ui
-            JOIN cards c ON ui.card_id = c.card_id AND ui.guild_id = c.guild_id
-            WHERE ui.user_id = ? AND ui.guild_id = ? AND ui.quantity > 0 AND c.name LIKE ?
+            FROM {INVENTORY_CARDS}
+            WHERE ui.guild_id = ? AND ui.user_id = ? AND ui.quantity > 0 AND c.name LIKE ?
+            ORDER BY c.name
             LIMIT 25
-        ''', (interaction.user.id, interaction.guild.id, f'%{current}%'))
+        ''', (interaction.guild.id, interaction.user.id, f'%{current}%'))
         items = await cursor.fetchall()
 
     return [app_commands.Choice(name=item[0], value=item[0]) for item in items]
@@ -50,7 +53,7 @@ class GiftSelectView(View):
         self.items = items
 
         options = [discord.SelectOption(label=f"{item[1]} (Quantity: {item[2]})", description=f"Rarity: {item[3]}",
-                                        value=item[0])
+                                        value=str(item[0]))
                    for item in items]
         self.select = Select(options=options, placeholder="Choose an item to gift...", min_values=1, max_values=1)
         self.select.callback = self.confirm_gift
@@ -59,7 +62,7 @@ class GiftSelectView(View):
     async def confirm_gift(self, interaction: discord.Interaction):
         selected_card_id = self.select.values[0]
         for item in self.items:
-            if item[0] == selected_card_id:
+            if str(item[0]) == selected_card_id:
                 selected_card = item
                 break
 
@@ -115,6 +118,7 @@ class GiftSelectView(View):
                     ''', (interaction.guild.id, self.receiver.id, card_id))
 
                 await conn.commit()
+                bump_version(interaction.guild.id, INVENTORY)
                 transaction_started = False
 
                 if not interaction.response.is_done():
@@ -151,61 +155,16 @@ class UserCog(commands.Cog):
     async def inventory(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         try:
-            async with aiosqlite.connect(db_path) as conn:
-                cursor = await conn.execute('''
-                    SELECT balance FROM economy WHERE user_id = ? AND guild_id = ?
-                ''', (interaction.user.id, interaction.guild.id))
-                balance_row = await cursor.fetchone()
-                balance = balance_row[0] if balance_row else 0
-
-                # Fetch inventory items based on user_inventory table
-                cursor = await conn.execute('''
-                    SELECT ui.guild_id, ui.card_id, ui.quantity, c.name, c.description, c.rarity, c.img_url
-                    FROM user_inventory ui
-                    JOIN cards c ON ui.card_id = c.card_id AND ui.guild_id = c.guild_id
-                    WHERE ui.user_id = ? AND ui.guild_id = ? AND ui.quantity > 0
-                ''', (interaction.user.id, interaction.guild.id))
-                inventory_items = await cursor.fetchall()
-
-                if inventory_items:
-                    colour = await get_embed_colour(interaction.guild.id)
-                    embeds = []
-                    items_per_page = 5
-                    page_count = (len(inventory_items) + items_per_page - 1) // items_per_page
-
-                    for page in range(page_count):
-                        start_index = page * items_per_page
-                        end_index = start_index + items_per_page
-                        page_items = inventory_items[start_index:end_index]
+            model = await InventoryViewModel.load(interaction.guild.id, interaction.user)
 
-                        embed = discord.Embed(title="Your Inventory", color=colour)
-                        embed.set_thumbnail(url=interaction.user.display_avatar.url)
+            if model.total:
+                # Pages are rendered on demand by the view model; send the first one
+                view = InventoryPaginationView(model, self.bot, interaction.user.id,
+                                               show_descriptions=self.show_descriptions)
+                await interaction.followup.send(embed=await view.current_embed(), view=view, ephemeral=True)
 
-                        embed_description = ""
-                        for index, item in enumerate(page_items, start=1):
-                            # Get the description if available, otherwise provide a fallback
-                            description = item[4] if item[4] else "No description available"
-
-                            # If descriptions are to be shown, add the real description
-                            if self.show_descriptions:
-                                embed_description += f"{index + start_index}. **{item[3]}** (x{item[2]})\n*{description}*\n\n"
-                            else:
-                                # If descriptions are hidden, just show a placeholder message or leave it blank
-                                embed_description += f"{index + start_index}. **{item[3]}** (x{item[2]})\nNo description available\n\n"
-
-                        # Set the final description of the embed
-                        embed.description = embed_description.strip()
-
-                        embed.set_footer(text=f"Points Balance: {balance}")
-                        embed.timestamp = discord.utils.utcnow()
-                        embeds.append(embed)
-
-                    # Create pagination view and send the first embed
-                    view = InventoryPaginationView(embeds, self.bot, interaction.user.id, show_descriptions=self.show_descriptions)
-                    await interaction.followup.send(embed=embeds[0], view=view, ephemeral=True)
-
-                else:
-                    await interaction.followup.send("Your inventory is empty.", ephemeral=True)
+            else:
+                await interaction.followup.send("Your inventory is empty.", ephemeral=True)
 
         except Exception as e:
             logger.error(f"Failed to fetch inventory or process command: {e}")
@@ -224,18 +183,13 @@ class UserCog(commands.Cog):
         return
         try:
             async with aiosqlite.connect(db_path) as conn:
-                cursor = await conn.execute('''
-                    SELECT cards.card_id, cards.name, user_inventory.quantity, cards.rarity
-                    FROM user_inventory
-                    JOIN cards ON user_inventory.card_id = cards.card_id
-                    WHERE user_inventory.user_id = ? AND user_inventory.guild_id = ? AND cards.name = ?
-                ''', (interaction.user.id, interaction.guild.id, item_name))
-                inventory_item = await cursor.fetchone()
+                inventory_item = await find_inventory_item(conn, interaction.guild.id, interaction.user.id, item_name)
 
             if inventory_item:
                 # Directly process the gift
-                view = GiftSelectView([inventory_item], self.bot, interaction.user, member)
-                await view.perform_gift(interaction, inventory_item[0])
+                view = GiftSelectView([(inventory_item.card_id, inventory_item.name, inventory_item.quantity,
+                                        inventory_item.rarity)], self.bot, interaction.user, member)
+                await view.perform_gift(interaction, inventory_item.card_id)
             else:
                 await interaction.followup.send("The selected item is not available in your inventory.", ephemeral=True)
         except Exception as e:
@@ -19,6 +19,25 @@ DISCORD_REDIRECT_URL = os.getenv('DISCORD_REDIRECT_URL')
 DISCORD_AUTH_URL = os.getenv('DISCORD_AUTH_URL')
 
 OPENAI_MODERATION_KEY = os.getenv('OPENAI_MODERATION_KEY')
+# "openai" for production, "local" for an offline stand-in that approves every image (tests and development)
+MODERATION_BACKEND = os.getenv('MODERATION_BACKEND', 'openai').lower()
+# Worker processes that resize and thumbnail card uploads (requires Pillow)
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', '2'))
+# Threads for card image disk I/O, hashing and encoding, and how many uploads may be processed at once
+IMAGE_IO_WORKERS = int(os.getenv('IMAGE_IO_WORKERS', '4'))
+IMAGE_UPLOAD_CONCURRENCY = int(os.getenv('IMAGE_UPLOAD_CONCURRENCY', '4'))
+
+# Dashboard web server: "waitress" (threaded WSGI) or "async" (aiohttp on the bot's event loop)
+WEB_SERVER_MODE = os.getenv('WEB_SERVER_MODE', 'waitress').lower()
+WEB_DB_POOL_SIZE = int(os.getenv('WEB_DB_POOL_SIZE', '4'))
+
+# Waitress sizing (threaded mode) and the pool that slow dashboard work is offloaded to
+WEB_THREADS = int(os.getenv('WEB_THREADS', '8'))
+WEB_BACKLOG = int(os.getenv('WEB_BACKLOG', '1024'))
+WEB_CHANNEL_TIMEOUT = int(os.getenv('WEB_CHANNEL_TIMEOUT', '120'))
+WEB_CONNECTION_LIMIT = int(os.getenv('WEB_CONNECTION_LIMIT', '100'))
+WEB_OFFLOAD_WORKERS = int(os.getenv('WEB_OFFLOAD_WORKERS', '4'))
+WEB_OFFLOAD_QUEUE_LIMIT = int(os.getenv('WEB_OFFLOAD_QUEUE_LIMIT', '16'))
 
 # Discord
 DISCORD_PREFIX = "%"
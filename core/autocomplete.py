@@ -5,6 +5,9 @@ import aiosqlite
 
 from discord import app_commands
 
+from core.joins import card_join
+from core.rarities import get_rarities
+
 
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -24,15 +27,12 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------------------------------------------------
 
 async def rarity_autocomplete(interaction: discord.Interaction, current: str):
-    async with aiosqlite.connect(db_path) as conn:
-        cursor = await conn.execute("SELECT DISTINCT rarity FROM rarity_weights WHERE guild_id = ?",
-                                    (interaction.guild.id,))
-        rarities = [row[0] for row in await cursor.fetchall()]
+    rarities = await get_rarities(interaction.guild.id)
 
     # Filter based on user input (if they started typing)
     return [
-        app_commands.Choice(name=rarity, value=rarity)
-        for rarity in rarities if current.lower() in rarity.lower()]
+        app_commands.Choice(name=rarity.name, value=rarity.name)
+        for rarity in rarities.values() if current.lower() in rarity.name.lower()][:25]
 
 async def card_name_autocomplete(interaction: discord.Interaction, current: str):
     async with aiosqlite.connect(db_path) as conn:
@@ -58,10 +58,10 @@ async def set_name_autocomplete(interaction: discord.Interaction, current: str):
 async def non_preset_card_name_autocomplete(interaction: discord.Interaction, current: str):
     async with aiosqlite.connect(db_path) as conn:
         # Fetch cards that are NOT part of any preset set
-        cursor = await conn.execute('''
+        cursor = await conn.execute(f'''
             SELECT c.name 
             FROM cards AS c
-            LEFT JOIN set_cards AS sc ON c.card_id = sc.card_id AND c.guild_id = sc.guild_id
+            {card_join('set_cards', 'sc', 'c', 'LEFT JOIN')}
             LEFT JOIN card_sets AS cs ON sc.set_id = cs.set_id AND cs.is_preset = 1
             WHERE c.guild_id = ? AND c.name LIKE ? AND cs.is_preset IS NULL
             GROUP BY c.name
@@ -0,0 +1,130 @@
+import io
+import csv
+import json
+import zipfile
+import posixpath
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Bulk Card Archives
+# ---------------------------------------------------------------------------------------------------------------------
+# A bulk upload is a zip holding card images and one manifest, either manifest.csv (header row: name, description,
+# rarity, image, set) or manifest.json (a list of objects with the same keys, or {"cards": [...]}). `image` is the
+# path of the image inside the archive; `description` and `set` are optional.
+
+MANIFEST_NAMES = ('manifest.csv', 'manifest.json')
+MAX_BULK_CARDS = 200
+MAX_ARCHIVE_BYTES = 200 * 1024 * 1024
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+MAX_MANIFEST_BYTES = 1024 * 1024
+MAX_DESCRIPTION_LENGTH = 180
+
+
+class BulkArchiveError(ValueError):
+    pass
+
+
+class BulkCardItem:
+    def __init__(self, index, name, description, rarity, image, set_name):
+        self.index = index
+        self.name = name
+        self.description = description
+        self.rarity = rarity
+        self.image = image
+        self.set_name = set_name
+        self.error = None
+
+    def result(self, status, message):
+        return {"row": self.index, "name": self.name, "status": status, "message": message}
+
+
+def _read_manifest(archive):
+    names = {posixpath.basename(info.filename).lower(): info for info in archive.infolist() if not info.is_dir()}
+    for manifest_name in MANIFEST_NAMES:
+        info = names.get(manifest_name)
+        if info is None:
+            continue
+        # Like the images, the manifest is read with a cap in case the archive's directory lies about its size
+        too_large = f"The manifest is larger than {MAX_MANIFEST_BYTES // 1024} KB."
+        if info.file_size > MAX_MANIFEST_BYTES:
+            raise BulkArchiveError(too_large)
+        with archive.open(info) as f:
+            raw = f.read(MAX_MANIFEST_BYTES + 1)
+        if len(raw) > MAX_MANIFEST_BYTES:
+            raise BulkArchiveError(too_large)
+        text = raw.decode('utf-8-sig')
+        if manifest_name.endswith('.csv'):
+            return list(csv.DictReader(io.StringIO(text)))
+        rows = json.loads(text)
+        return rows.get('cards', []) if isinstance(rows, dict) else rows
+    raise BulkArchiveError("The archive must contain a manifest.csv or manifest.json file.")
+
+
+def read_bulk_archive(data):
+    """Parse a bulk upload. Returns (items, images) where images maps archive paths to bytes.
+
+    Items that fail validation keep their `error` set and are reported rather than raising; only problems with the
+    archive as a whole raise BulkArchiveError. Runs synchronously, so callers should use an executor.
+    """
+    if len(data) > MAX_ARCHIVE_BYTES:
+        raise BulkArchiveError(f"The archive is larger than {MAX_ARCHIVE_BYTES // (1024 * 1024)} MB.")
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise BulkArchiveError("The file is not a valid zip archive.")
+
+    with archive:
+        try:
+            rows = _read_manifest(archive)
+        except (UnicodeDecodeError, json.JSONDecodeError, csv.Error) as e:
+            raise BulkArchiveError(f"The manifest could not be read: {e}")
+        if not isinstance(rows, list) or not rows:
+            raise BulkArchiveError("The manifest does not list any cards.")
+        if len(rows) > MAX_BULK_CARDS:
+            raise BulkArchiveError(f"A bulk upload can create at most {MAX_BULK_CARDS} cards.")
+
+        members = {info.filename: info for info in archive.infolist() if not info.is_dir()}
+        items, images, seen_names = [], {}, set()
+        for index, row in enumerate(rows, start=1):
+            row = row if isinstance(row, dict) else {}
+            item = BulkCardItem(
+                index,
+                str(row.get('name') or '').strip(),
+                str(row.get('description') or '').strip() or None,
+                str(row.get('rarity') or '').strip().lower(),
+                str(row.get('image') or '').strip().lstrip('/'),
+                str(row.get('set') or '').strip() or None
+            )
+            items.append(item)
+
+            info = members.get(item.image)
+            if not item.name or not item.rarity or not item.image:
+                item.error = "Each card needs a name, rarity and image."
+            elif item.name.lower() in seen_names:
+                item.error = "Duplicate card name in the manifest."
+            elif item.description and len(item.description) > MAX_DESCRIPTION_LENGTH:
+                item.error = f"Description is longer than {MAX_DESCRIPTION_LENGTH} characters."
+            elif info is None:
+                item.error = f"Image `{item.image}` is not in the archive."
+            elif info.file_size > MAX_IMAGE_BYTES:
+                item.error = f"Image is larger than {MAX_IMAGE_BYTES // (1024 * 1024)} MB."
+            seen_names.add(item.name.lower())
+
+            if item.error is None and item.image not in images:
+                # Sizes come from the archive's directory, so read with a cap in case they lie
+                with archive.open(info) as f:
+                    image_data = f.read(MAX_IMAGE_BYTES + 1)
+                if len(image_data) > MAX_IMAGE_BYTES:
+                    item.error = f"Image is larger than {MAX_IMAGE_BYTES // (1024 * 1024)} MB."
+                else:
+                    images[item.image] = image_data
+
+    return items, images
+
+
+def results_csv(results):
+    """Render per-item results as CSV text for the command's report attachment."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=["row", "name", "status", "message"])
+    writer.writeheader()
+    writer.writerows(results)
+    return buffer.getvalue()
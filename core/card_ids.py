@@ -0,0 +1,109 @@
+import re
+import logging
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Card IDs
+# ---------------------------------------------------------------------------------------------------------------------
+# Card IDs are integers numbered per guild. They are stored as INTEGER everywhere, so keys and joins compare integers
+# instead of strings. The zero-padded form players see is only produced for display.
+#
+# New IDs come from card_id_sequence, which holds the last ID handed out in each guild. Bumping it is a single
+# primary-key upsert rather than a MAX() scan over cards. Because it runs inside the transaction that inserts the
+# cards, two writers can never be given the same ID.
+
+CARD_ID_WIDTH = 8
+
+# Reserves `count` IDs for a guild: parameters (guild_id, count). Read the new last_id with LAST_CARD_ID_SQL.
+ALLOCATE_CARD_IDS_SQL = '''
+    INSERT INTO card_id_sequence (guild_id, last_id) VALUES (?, ?)
+    ON CONFLICT(guild_id) DO UPDATE SET last_id = last_id + excluded.last_id
+'''
+LAST_CARD_ID_SQL = "SELECT last_id FROM card_id_sequence WHERE guild_id = ?"
+
+# Moves every guild's sequence past the highest ID already in use. Safe to run at any time.
+SYNC_CARD_ID_SEQUENCE_SQL = '''
+    INSERT INTO card_id_sequence (guild_id, last_id)
+    SELECT guild_id, MAX(card_id) FROM cards WHERE card_id IS NOT NULL GROUP BY guild_id
+    ON CONFLICT(guild_id) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)
+'''
+
+
+def format_card_id(card_id):
+    """Return the zero-padded display form of a card ID."""
+    return f"{int(card_id):0{CARD_ID_WIDTH}d}"
+
+
+def parse_card_id(value):
+    """Return the integer card ID in a display ID or choice value, or None if it is not one."""
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+async def allocate_card_ids(conn, guild_id, count=1):
+    """Reserve `count` consecutive card IDs in a guild and return the first. Call inside the inserting transaction."""
+    await conn.execute(ALLOCATE_CARD_IDS_SQL, (guild_id, count))
+    cursor = await conn.execute(LAST_CARD_ID_SQL, (guild_id,))
+    return (await cursor.fetchone())[0] - count + 1
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Integer Card ID Migration
+# ---------------------------------------------------------------------------------------------------------------------
+# Databases created before card IDs were integers hold them as zero-padded TEXT. SQLite cannot change a column's
+# type in place, so each table that still declares `card_id TEXT` is rebuilt from its own stored definition, with
+# only that column's type changed, and its rows are copied across through CAST. Columns added by later migrations
+# come along unchanged. Indexes and triggers are dropped with the old table; the owning cog recreates them after
+# calling this.
+
+_TEXT_CARD_ID = re.compile(r'\bcard_id\s+TEXT\b', re.IGNORECASE)
+_TABLE_NAME = re.compile(r'^(CREATE\s+TABLE\s+)(?:IF\s+NOT\s+EXISTS\s+)?("?)(\w+)\2', re.IGNORECASE)
+
+
+async def migrate_card_id_column(conn, table):
+    """Rebuild `table` with an INTEGER card_id if it still stores TEXT IDs. Returns True if it was rebuilt."""
+    cursor = await conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    row = await cursor.fetchone()
+    if not row or not _TEXT_CARD_ID.search(row[0]):
+        return False
+
+    cursor = await conn.execute(f"PRAGMA table_info({table})")
+    columns = [column[1] for column in await cursor.fetchall()]
+    values = ', '.join('CAST(card_id AS INTEGER)' if name == 'card_id' else name for name in columns)
+    create = _TABLE_NAME.sub(rf'\g<1>{table}_new', _TEXT_CARD_ID.sub('card_id INTEGER', row[0]), count=1)
+
+    await conn.commit()
+    await conn.execute('BEGIN IMMEDIATE')
+    try:
+        await conn.execute(f"DROP TABLE IF EXISTS {table}_new")
+        await conn.execute(create)
+        await conn.execute(f"INSERT INTO {table}_new ({', '.join(columns)}) SELECT {values} FROM {table}")
+        await conn.execute(f"DROP TABLE {table}")
+        await conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        await conn.commit()
+    except Exception as e:
+        await conn.rollback()
+        logger.error(f"Failed to migrate '{table}' to integer card IDs: {e}")
+        raise
+    logger.info(f"Migrated '{table}' to integer card IDs.")
+    return True
+
+
+async def number_missing_card_ids(conn):
+    """Give cards stored without an ID the next IDs in their guild. Returns how many were numbered."""
+    cursor = await conn.execute("SELECT rowid, guild_id FROM cards WHERE card_id IS NULL ORDER BY rowid")
+    missing = await cursor.fetchall()
+    if missing:
+        cursor = await conn.execute("SELECT guild_id, MAX(CAST(card_id AS INTEGER)) FROM cards GROUP BY guild_id")
+        last_ids = {guild_id: last_id or 0 for guild_id, last_id in await cursor.fetchall()}
+        for rowid, guild_id in missing:
+            last_ids[guild_id] += 1
+            await conn.execute("UPDATE cards SET card_id = ? WHERE rowid = ?", (last_ids[guild_id], rowid))
+        logger.info(f"Numbered {len(missing)} card(s) that had no card ID.")
+    return len(missing)
@@ -0,0 +1,178 @@
+import time
+import asyncio
+import logging
+import discord
+
+from urllib.parse import urlsplit, parse_qs
+from discord.http import Route
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# CDN Refresh Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+# Discord attachment links are signed and stop working once the hex timestamp in their `ex` parameter passes. The
+# expiry is parsed into cards.img_expires_at and image_blobs.cdn_expires_at (0 = the link carries no expiry, NULL = not
+# parsed yet) so a background job can renew links shortly before they lapse: first in bulk through the refresh-urls
+# endpoint, then by re-uploading the local copy for anything Discord will not re-sign.
+
+NO_EXPIRY = 0
+REFRESH_AHEAD_SECONDS = 6 * 60 * 60
+REFRESH_BATCH_SIZE = 50           # Discord accepts at most 50 links per refresh-urls request
+REFRESH_BATCH_DELAY = 1.0         # Seconds between refresh-urls requests
+REUPLOAD_DELAY = 2.0              # Seconds between fallback re-uploads
+REFRESH_ROW_LIMIT = 500           # Rows renewed per run; the rest wait for the next run
+BACKFILL_ROW_LIMIT = 2000
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Expiry Helpers
+# ---------------------------------------------------------------------------------------------------------------------
+def url_expiry(url):
+    """Return when a Discord attachment link expires (unix time), NO_EXPIRY if it never does, or None without a link."""
+    if not url:
+        return None
+    expires = parse_qs(urlsplit(url).query).get('ex')
+    if not expires:
+        return NO_EXPIRY
+    try:
+        return int(expires[0], 16)
+    except ValueError:
+        return NO_EXPIRY
+
+
+def is_expiring(url, ahead=REFRESH_AHEAD_SECONDS):
+    expiry = url_expiry(url)
+    return bool(expiry) and expiry < time.time() + ahead
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Refresh Job
+# ---------------------------------------------------------------------------------------------------------------------
+async def backfill_expiry(conn):
+    """Parse the expiry of links written without one (presets, dashboard edits, rows from before tracking).
+
+    Empty links are skipped: they have no expiry to parse and would otherwise be picked again on every run, holding
+    up the rows behind them.
+    """
+    cursor = await conn.execute(
+        "SELECT guild_id, card_id, img_url FROM cards "
+        "WHERE img_expires_at IS NULL AND img_url IS NOT NULL AND img_url != '' LIMIT ?",
+        (BACKFILL_ROW_LIMIT,)
+    )
+    cards = await cursor.fetchall()
+    await conn.executemany(
+        "UPDATE cards SET img_expires_at = ? WHERE guild_id = ? AND card_id = ?",
+        [(url_expiry(url), guild_id, card_id) for guild_id, card_id, url in cards]
+    )
+
+    cursor = await conn.execute(
+        "SELECT image_hash, cdn_url FROM image_blobs "
+        "WHERE cdn_expires_at IS NULL AND cdn_url IS NOT NULL AND cdn_url != '' LIMIT ?",
+        (BACKFILL_ROW_LIMIT,)
+    )
+    blobs = await cursor.fetchall()
+    await conn.executemany(
+        "UPDATE image_blobs SET cdn_expires_at = ? WHERE image_hash = ?",
+        [(url_expiry(url), digest) for digest, url in blobs]
+    )
+    await conn.commit()
+
+
+async def refresh_urls(http, urls):
+    """Ask Discord to re-sign links in batches. Returns {original: refreshed} for the links it renewed."""
+    refreshed = {}
+    for start in range(0, len(urls), REFRESH_BATCH_SIZE):
+        if start:
+            await asyncio.sleep(REFRESH_BATCH_DELAY)
+        batch = urls[start:start + REFRESH_BATCH_SIZE]
+        try:
+            data = await http.request(Route('POST', '/attachments/refresh-urls'), json={'attachment_urls': batch})
+        except discord.HTTPException as e:
+            logger.error(f"Failed to refresh {len(batch)} attachment links: {e}")
+            continue
+        for item in data.get('refreshed_urls', []):
+            if item.get('refreshed'):
+                refreshed[item['original']] = item['refreshed']
+    return refreshed
+
+
+async def refresh_expiring(conn, http, upload, ahead=REFRESH_AHEAD_SECONDS):
+    """Renew card and blob links expiring within `ahead` seconds, plus cards that lost their link entirely.
+
+    `upload` is an async callable taking a local path and returning a new link (or None); it is only used for links
+    Discord would not refresh. Returns the guild IDs whose cards changed.
+    """
+    await backfill_expiry(conn)
+    deadline = int(time.time() + ahead)
+
+    cursor = await conn.execute('''
+        SELECT guild_id, card_id, img_url, thumb_url, local_img_url FROM cards
+        WHERE (img_expires_at > 0 AND img_expires_at < ?)
+           OR (COALESCE(img_url, '') = '' AND local_img_url IS NOT NULL AND local_img_url != '')
+        ORDER BY img_expires_at
+        LIMIT ?
+    ''', (deadline, REFRESH_ROW_LIMIT))
+    cards = await cursor.fetchall()
+
+    cursor = await conn.execute('''
+        SELECT image_hash, cdn_url, thumb_url, path FROM image_blobs
+        WHERE cdn_expires_at > 0 AND cdn_expires_at < ?
+        ORDER BY cdn_expires_at
+        LIMIT ?
+    ''', (deadline, REFRESH_ROW_LIMIT))
+    blobs = await cursor.fetchall()
+
+    if not cards and not blobs:
+        return set()
+
+    # Cards in different guilds share blobs and therefore links, so every distinct link is refreshed once
+    urls = {url for row in cards for url in row[2:4] if url}
+    urls.update(url for row in blobs for url in row[1:3] if url)
+    refreshed = await refresh_urls(http, sorted(urls))
+
+    reuploaded = {}
+
+    async def renew(url, path):
+        if url in refreshed:
+            return refreshed[url]
+        if not path:
+            return None
+        if path not in reuploaded:
+            if reuploaded:
+                await asyncio.sleep(REUPLOAD_DELAY)
+            reuploaded[path] = await upload(path)
+        return reuploaded[path]
+
+    card_updates = []
+    for guild_id, card_id, img_url, thumb_url, local_img_url in cards:
+        new_img_url = await renew(img_url, local_img_url)
+        if not new_img_url:
+            logger.warning(f"Could not renew the image link for card {card_id} in guild {guild_id}")
+            continue
+        # Views fall back to the full image when the thumbnail link could not be renewed
+        card_updates.append((new_img_url, refreshed.get(thumb_url), url_expiry(new_img_url), guild_id, card_id))
+
+    blob_updates = []
+    for digest, cdn_url, thumb_url, path in blobs:
+        new_cdn_url = await renew(cdn_url, path)
+        if not new_cdn_url:
+            logger.warning(f"Could not renew the link for image {digest}")
+            continue
+        blob_updates.append((new_cdn_url, refreshed.get(thumb_url), url_expiry(new_cdn_url), digest))
+
+    await conn.executemany(
+        "UPDATE cards SET img_url = ?, thumb_url = ?, img_expires_at = ? WHERE guild_id = ? AND card_id = ?",
+        card_updates
+    )
+    await conn.executemany(
+        "UPDATE image_blobs SET cdn_url = ?, thumb_url = ?, cdn_expires_at = ? WHERE image_hash = ?",
+        blob_updates
+    )
+    await conn.commit()
+
+    logger.info(f"Renewed {len(card_updates)} card links and {len(blob_updates)} image links "
+                f"({len(refreshed)} refreshed, {len(reuploaded)} re-uploaded)")
+    return {update[3] for update in card_updates}
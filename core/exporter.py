@@ -0,0 +1,148 @@
+import json
+import zlib
+import textwrap
+
+from core.joins import SET_CARDS
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Set Export Streaming
+# ---------------------------------------------------------------------------------------------------------------------
+# Set exports are written one card at a time straight from the database cursor so memory use does not grow with the
+# size of the set. The pretty form is byte-for-byte what json.dumps(preset, indent=4) used to produce, so exported
+# files still diff cleanly against the presets in ./data/presets.
+
+EXPORT_CARD_COLUMNS = "c.name, c.description, c.rarity, c.img_url, c.local_img_url"
+EXPORT_CARDS_QUERY = (
+    f"SELECT {EXPORT_CARD_COLUMNS} "
+    f"FROM {SET_CARDS} "
+    "WHERE sc.set_id = ? AND sc.guild_id = ?"
+)
+
+FETCH_BATCH_SIZE = 500
+GZIP_LEVEL = 6
+MAX_PRESET_BYTES = 32 * 1024 * 1024  # Largest preset accepted for import, after decompression
+
+
+class SetExportEncoder:
+    def __init__(self, name, description, compact=False):
+        self.name = name
+        self.description = description
+        self.compact = compact
+        self.count = 0
+
+    def _dumps(self, value):
+        if self.compact:
+            return json.dumps(value, separators=(',', ':'))
+        return json.dumps(value, indent=4)
+
+    def header(self):
+        head = self._dumps({"set": {"name": self.name, "description": self.description}})
+        # Drop the closing brace so the cards array can be appended after the set block
+        head = head[:-2] if not self.compact else head[:-1]
+        return head + (',"cards":[' if self.compact else ',\n    "cards": [')
+
+    def card(self, row):
+        card = {
+            "name": row[0],
+            "description": row[1],
+            "rarity": row[2],
+            "img_url": row[3],
+            "local_img_url": row[4]
+        }
+        separator = ',' if self.count else ''
+        self.count += 1
+        if self.compact:
+            return separator + self._dumps(card)
+        return separator + '\n' + textwrap.indent(self._dumps(card), ' ' * 8)
+
+    def footer(self):
+        if self.compact:
+            return ']}'
+        return '\n    ]\n}' if self.count else ']\n}'
+
+
+def iter_set_export(encoder, cursor):
+    """Yield the export as text chunks from a sqlite3 cursor positioned on EXPORT_CARDS_QUERY."""
+    yield encoder.header()
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not rows:
+            break
+        yield ''.join(encoder.card(row) for row in rows)
+    yield encoder.footer()
+
+
+async def aiter_set_export(encoder, cursor):
+    """Async counterpart of iter_set_export for aiosqlite cursors."""
+    yield encoder.header()
+    while True:
+        rows = await cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not rows:
+            break
+        yield ''.join(encoder.card(row) for row in rows)
+    yield encoder.footer()
+
+
+class GzipStream:
+    """Incremental gzip framing, so compressed exports can be streamed without buffering the whole file."""
+
+    def __init__(self, level=GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, text):
+        return self._compressor.compress(text.encode('utf-8'))
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+def encode_chunks(chunks, compress=False):
+    """Turn text chunks into bytes, optionally gzip-compressed."""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    stream = GzipStream()
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.flush()
+
+
+def export_filename(set_name, compress=False):
+    return f"{set_name}.json.gz" if compress else f"{set_name}.json"
+
+
+class PresetTooLargeError(ValueError):
+    pass
+
+
+def load_preset_bytes(filename, data, limit=MAX_PRESET_BYTES):
+    """Decode an uploaded preset, accepting the gzip-compressed exports as well as plain JSON.
+
+    Decompression stops as soon as the output passes `limit`, so a small upload cannot expand to fill memory.
+    """
+    if filename.endswith('.gz'):
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)  # gzip framing
+        try:
+            data = decompressor.decompress(data, limit + 1)
+        except zlib.error as e:
+            raise ValueError(f"Failed to decompress preset file: {e}")
+        if len(data) <= limit and not decompressor.eof:
+            raise ValueError("Failed to decompress preset file: the file is truncated.")
+    if len(data) > limit:
+        raise PresetTooLargeError(f"Preset files may be at most {limit // (1024 * 1024)} MB uncompressed.")
+    preset = json.loads(data)
+    check_preset(preset)
+    return preset
+
+
+def check_preset(preset):
+    """Raise ValueError unless `preset` has the shape importers read: a named set and a list of named cards."""
+    if not isinstance(preset, dict) or not isinstance(preset.get('set'), dict) or not preset['set'].get('name'):
+        raise ValueError("The preset has no set name.")
+    cards = preset.get('cards')
+    if not isinstance(cards, list) or not all(isinstance(card, dict) and card.get('name') for card in cards):
+        raise ValueError("Every card in the preset needs a name.")
@@ -0,0 +1,165 @@
+import time
+import logging
+
+from typing import NamedTuple, Optional
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Transaction History
+# ---------------------------------------------------------------------------------------------------------------------
+# Trades and marketplace purchases are written to one market_transactions table. Each transaction also gets one row
+# per participant in transaction_participants, keyed (guild_id, user_id, tx_id). A member's history is then a single
+# index range read newest-first, and pages continue from the last tx_id shown.
+#
+# Every purchase also updates per-card price aggregates in the same transaction:
+# - card_price_stats holds the running totals and the last price.
+# - card_price_buckets counts copies sold per (day, price).
+# Window figures (volume, turnover, median, low, high) are computed from at most a month of bucket rows, never from
+# the history itself.
+
+TRADE = 'trade'
+PURCHASE = 'purchase'
+
+DAY_SECONDS = 24 * 60 * 60
+STAT_WINDOWS = (("Today", 1), ("7 days", 7), ("30 days", 30))  # Whole UTC days, the bucket granularity
+
+HISTORY_COLUMNS = "t.tx_id, t.kind, t.user1_id, t.user2_id, t.user1_item, t.user2_item, t.price, t.created_at"
+
+
+class Transaction(NamedTuple):
+    tx_id: int
+    kind: str
+    user1_id: int        # Trade proposer, or the buyer of a purchase
+    user2_id: int        # Trade accepter, or the seller of a purchase
+    user1_item: str      # What user1 gave
+    user2_item: str      # What user2 gave
+    price: Optional[int]
+    created_at: int
+
+
+class WindowStats(NamedTuple):
+    copies: int
+    turnover: int
+    median: Optional[int]
+    low: Optional[int]
+    high: Optional[int]
+
+
+async def _record(conn, guild_id, kind, user1_id, user2_id, user1_item, user2_item, card_id=None, quantity=None,
+                  price=None, now=None):
+    cursor = await conn.execute(
+        "INSERT INTO market_transactions (guild_id, kind, user1_id, user2_id, user1_item, user2_item, card_id, "
+        "quantity, price, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (guild_id, kind, user1_id, user2_id, user1_item, user2_item, card_id, quantity, price,
+         int(now or time.time()))
+    )
+    await conn.executemany(
+        "INSERT OR IGNORE INTO transaction_participants (guild_id, user_id, tx_id) VALUES (?, ?, ?)",
+        [(guild_id, user1_id, cursor.lastrowid), (guild_id, user2_id, cursor.lastrowid)]
+    )
+    return cursor.lastrowid
+
+
+async def record_trade(conn, guild_id, side1, side2):
+    """Record a completed trade between two TradeSides. Call inside the trade's transaction."""
+    return await _record(conn, guild_id, TRADE, side1.user_id, side2.user_id, side1.describe(), side2.describe())
+
+
+async def record_purchase(conn, guild_id, buyer_id, seller_id, card_id, price, quantity, now=None):
+    """Record copies changing hands at `price` each and fold them into the card's price aggregates.
+
+    Call inside the transaction that moved the cards and points.
+    """
+    now = int(now or time.time())
+    cursor = await conn.execute("SELECT name FROM cards WHERE guild_id = ? AND card_id = ?", (guild_id, card_id))
+    card = await cursor.fetchone()
+    card_name = card[0] if card else card_id
+
+    tx_id = await _record(conn, guild_id, PURCHASE, buyer_id, seller_id, f"{price * quantity} points",
+                          f"{card_name} x{quantity}" if quantity > 1 else card_name, card_id, quantity, price, now)
+
+    await conn.execute('''
+        INSERT INTO card_price_stats (guild_id, card_id, last_price, last_traded_at, copies, turnover)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(guild_id, card_id) DO UPDATE SET
+            last_price = excluded.last_price,
+            last_traded_at = excluded.last_traded_at,
+            copies = copies + excluded.copies,
+            turnover = turnover + excluded.turnover
+    ''', (guild_id, card_id, price, now, quantity, price * quantity))
+    await conn.execute('''
+        INSERT INTO card_price_buckets (guild_id, card_id, day, price, copies) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(guild_id, card_id, day, price) DO UPDATE SET copies = copies + excluded.copies
+    ''', (guild_id, card_id, now // DAY_SECONDS, price, quantity))
+    return tx_id
+
+# ---------------------------------------------------------------------------------------------------------------------
+# History Queries
+# ---------------------------------------------------------------------------------------------------------------------
+async def fetch_history_page(conn, guild_id, user_id, limit, before=None):
+    """Return up to `limit` of a member's transactions, newest first, older than tx_id `before` if given."""
+    query = f'''
+        SELECT {HISTORY_COLUMNS}
+        FROM transaction_participants p
+        JOIN market_transactions t ON t.tx_id = p.tx_id
+        WHERE p.guild_id = ? AND p.user_id = ?
+    '''
+    params = [guild_id, user_id]
+    if before is not None:
+        query += " AND p.tx_id < ?"
+        params.append(before)
+    query += " ORDER BY p.tx_id DESC LIMIT ?"
+    params.append(limit)
+    cursor = await conn.execute(query, params)
+    return [Transaction(*row) for row in await cursor.fetchall()]
+
+
+def _window_stats(levels):
+    """Aggregate (price, copies) pairs sorted by price."""
+    copies = sum(count for _, count in levels)
+    if not copies:
+        return WindowStats(0, 0, None, None, None)
+    # Median of the copies sold, walking the price levels in order
+    middle, seen, median = (copies + 1) // 2, 0, None
+    for price, count in levels:
+        seen += count
+        if seen >= middle:
+            median = price
+            break
+    return WindowStats(copies, sum(price * count for price, count in levels), median, levels[0][0], levels[-1][0])
+
+
+async def get_price_stats(conn, guild_id, card_id, now=None):
+    """Return (totals, windows) for a card, or None if it has never sold.
+
+    totals is (last_price, last_traded_at, copies, turnover) and windows maps each STAT_WINDOWS label to WindowStats.
+    """
+    cursor = await conn.execute(
+        "SELECT last_price, last_traded_at, copies, turnover FROM card_price_stats WHERE guild_id = ? AND card_id = ?",
+        (guild_id, card_id)
+    )
+    totals = await cursor.fetchone()
+    if not totals:
+        return None
+
+    today = int(now or time.time()) // DAY_SECONDS
+    longest = max(days for _, days in STAT_WINDOWS)
+    cursor = await conn.execute(
+        "SELECT day, price, copies FROM card_price_buckets WHERE guild_id = ? AND card_id = ? AND day > ?",
+        (guild_id, card_id, today - longest)
+    )
+    buckets = await cursor.fetchall()
+
+    windows = {}
+    for label, days in STAT_WINDOWS:
+        levels = {}
+        for day, price, copies in buckets:
+            if day > today - days:
+                levels[price] = levels.get(price, 0) + copies
+        windows[label] = _window_stats(sorted(levels.items()))
+    return totals, windows
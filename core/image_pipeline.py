@@ -0,0 +1,131 @@
+import io
+import asyncio
+import logging
+import multiprocessing
+
+from typing import NamedTuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it uploads are stored exactly as received
+    Image = None
+    ImageOps = None
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Pipeline Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+# Uploads are decoded, re-oriented, capped to MAX_DIMENSION and re-encoded without metadata before they are moderated
+# and sent to Discord. A THUMB_DIMENSION variant is produced alongside for list views. The work is CPU bound, so it
+# runs in a process pool rather than on the event loop.
+
+MAX_DIMENSION = 1600
+THUMB_DIMENSION = 320
+JPEG_QUALITY = 85
+THUMB_QUALITY = 80
+
+
+class ProcessedImage(NamedTuple):
+    data: bytes
+    ext: str
+    thumb_data: Optional[bytes]
+    thumb_ext: Optional[str]
+
+
+class InvalidImageError(ValueError):
+    pass
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Worker Functions
+# ---------------------------------------------------------------------------------------------------------------------
+def _has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+def _encode(img, keep_alpha, quality):
+    buffer = io.BytesIO()
+    if keep_alpha:
+        img.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), 'png'
+    img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue(), 'jpg'
+
+
+def process_image(data, ext):
+    """Normalize an upload and build its thumbnail. Runs in a worker process, so it only deals in bytes."""
+    if Image is None:
+        return ProcessedImage(data, ext, None, None)
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if getattr(img, 'is_animated', False):
+                # Re-encoding would drop the animation, so keep the original and thumbnail the first frame
+                frame = img.convert('RGBA')
+                processed = (data, ext)
+                keep_alpha = True
+            else:
+                keep_alpha = _has_alpha(img)
+                frame = ImageOps.exif_transpose(img).convert('RGBA' if keep_alpha else 'RGB')
+                frame.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+                processed = _encode(frame, keep_alpha, JPEG_QUALITY)
+
+            frame.thumbnail((THUMB_DIMENSION, THUMB_DIMENSION), Image.LANCZOS)
+            thumb = _encode(frame, keep_alpha, THUMB_QUALITY)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(f"Could not decode image: {e}")
+
+    return ProcessedImage(processed[0], processed[1], thumb[0], thumb[1])
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Process Pool
+# ---------------------------------------------------------------------------------------------------------------------
+# The pool is started from cog_load, when the dashboard and aiosqlite threads may already be running, so workers are
+# never forked from the bot itself: a forked child could inherit a lock another thread was holding. They come from a
+# fork server, a separate single-threaded process that imports bot.py once (its __main__ guard keeps the bot from
+# starting there). A worker that dies breaks the whole executor, so a broken pool is replaced and the image retried.
+
+def _pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class ImagePool:
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.executor = None
+
+    async def start(self):
+        """Start the workers without blocking the event loop. Without Pillow there is nothing to offload."""
+        if Image is None:
+            logger.warning("Pillow is not installed; card images will be stored without resizing or thumbnails.")
+            return
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_pool_context())
+        await asyncio.get_running_loop().run_in_executor(self.executor, int)
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def process(self, data, ext):
+        """Run process_image in a worker, replacing the pool once if a crashed worker has broken it."""
+        executor = self.executor
+        if executor is None:
+            return process_image(data, ext)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, process_image, data, ext)
+        except BrokenProcessPool as e:
+            logger.error(f"Image worker pool broke ({e}); starting a new one")
+            # Concurrent uploads see the same broken pool; only the first replaces it
+            if self.executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_pool_context())
+            return await loop.run_in_executor(self.executor, process_image, data, ext)
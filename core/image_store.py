@@ -0,0 +1,141 @@
+import os
+import hashlib
+import logging
+
+from core.cdn_refresh import url_expiry
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Image Store Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+# Card images are stored once per distinct content, keyed by the SHA-256 of the uploaded bytes and sharded two levels
+# deep (ab/cd/abcd...). Identical uploads in different guilds share one file, one moderation pass and one CDN upload.
+# image_blobs.ref_count tracks how many card rows point at each blob; unreferenced blobs are swept after a grace period.
+# The stored file is the normalized output of core.image_pipeline, with its thumbnail kept next to it, but the key stays
+# the hash of the bytes as uploaded so a repeat upload is recognised before any decoding work is done.
+
+IMAGE_STORE_DIR = './data/card_images/objects'
+GC_GRACE_HOURS = 24
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+os.makedirs(IMAGE_STORE_DIR, exist_ok=True)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Shared SQL
+# ---------------------------------------------------------------------------------------------------------------------
+# Plain statements so the bot (aiosqlite) and the dashboard (sqlite3) maintain reference counts the same way.
+
+ACQUIRE_IMAGE_SQL = "UPDATE image_blobs SET ref_count = ref_count + 1, released_at = NULL WHERE image_hash = ?"
+
+RELEASE_IMAGE_SQL = (
+    "UPDATE image_blobs SET ref_count = MAX(ref_count - 1, 0), released_at = CURRENT_TIMESTAMP "
+    "WHERE image_hash = ?"
+)
+
+RELEASE_CARD_IMAGE_SQL = (
+    "UPDATE image_blobs SET ref_count = MAX(ref_count - 1, 0), released_at = CURRENT_TIMESTAMP "
+    "WHERE image_hash = (SELECT image_hash FROM cards WHERE card_id = ? AND guild_id = ?)"
+)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Blob Helpers
+# ---------------------------------------------------------------------------------------------------------------------
+def image_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def image_extension(filename):
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return ext if ext in ALLOWED_EXTENSIONS else 'png'
+
+
+def blob_path(digest, ext):
+    return f"{IMAGE_STORE_DIR}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def thumb_path(digest, ext):
+    return f"{IMAGE_STORE_DIR}/{digest[:2]}/{digest[2:4]}/{digest}.thumb.{ext}"
+
+
+def write_blob(path, data):
+    """Write a blob atomically; content addressing means an existing file is already correct."""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def remove_blob(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Blob Records
+# ---------------------------------------------------------------------------------------------------------------------
+async def get_blob(conn, digest):
+    """Return (path, cdn_url, thumb_url) for a known blob, or None if this content has never been accepted."""
+    cursor = await conn.execute("SELECT path, cdn_url, thumb_url FROM image_blobs WHERE image_hash = ?", (digest,))
+    row = await cursor.fetchone()
+    await cursor.close()
+    return row
+
+
+async def register_blob(conn, digest, path, size, cdn_url, thumb=None, thumb_url=None):
+    await conn.execute('''
+        INSERT INTO image_blobs (image_hash, path, size, cdn_url, cdn_expires_at, thumb_path, thumb_url, ref_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+        ON CONFLICT(image_hash) DO UPDATE SET
+            path = excluded.path,
+            size = excluded.size,
+            cdn_url = excluded.cdn_url,
+            cdn_expires_at = excluded.cdn_expires_at,
+            thumb_path = COALESCE(excluded.thumb_path, thumb_path),
+            thumb_url = COALESCE(excluded.thumb_url, thumb_url)
+    ''', (digest, path, size, cdn_url, url_expiry(cdn_url), thumb, thumb_url))
+
+
+async def collect_garbage(conn, grace_hours=GC_GRACE_HOURS):
+    """Delete blobs no card has referenced for the grace period. Returns the number removed.
+
+    The rows are claimed in one write transaction, so no card can re-acquire a blob between it being picked and
+    deleted, and files are only unlinked once the deletions are committed.
+    """
+    await conn.commit()
+    await conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor = await conn.execute('''
+            SELECT b.image_hash, b.path, b.thumb_path FROM image_blobs b
+            WHERE b.ref_count <= 0
+              AND COALESCE(b.released_at, b.created_at) < datetime('now', ?)
+              AND NOT EXISTS (SELECT 1 FROM cards c WHERE c.image_hash = b.image_hash)
+        ''', (f'-{grace_hours} hours',))
+        rows = await cursor.fetchall()
+        await cursor.close()
+
+        claimed = []
+        for digest, path, thumb in rows:
+            cursor = await conn.execute(
+                "DELETE FROM image_blobs WHERE image_hash = ? AND ref_count <= 0", (digest,)
+            )
+            if cursor.rowcount == 1:
+                claimed.append((path, thumb))
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+
+    for path, thumb in claimed:
+        remove_blob(path)
+        if thumb:
+            remove_blob(thumb)
+    return len(claimed)
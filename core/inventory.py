@@ -0,0 +1,205 @@
+import os
+import logging
+import aiosqlite
+
+from typing import NamedTuple, Optional
+
+from core.rarities import rarity_key
+from core.joins import INVENTORY_CARDS, card_join, card_match
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Database Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+os.makedirs('./data/databases', exist_ok=True)
+db_path = './data/databases/tcg.db'
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Inventory Queries
+# ---------------------------------------------------------------------------------------------------------------------
+# Inventories are read one page at a time with keyset pagination: each page continues after (or before) the sort key
+# of a row already shown, so the cost of a page does not grow with the size of the collection or how far in it is.
+# Every sort is a tuple of ascending expressions ending in card_id, which keeps keys unique and lets row-value
+# comparisons walk the order in either direction.
+
+# Lower drop weight means rarer; cards whose rarity has no weight sort last
+WEIGHT_EXPR = '''COALESCE((SELECT MIN(rw.weight) FROM rarity_weights rw
+                           WHERE rw.guild_id = c.guild_id AND rw.rarity_key = c.rarity_key), 1e308)'''
+
+SORT_KEYS = {
+    'name': ("Name", ('c.name', 'c.card_id')),
+    'quantity': ("Quantity", ('-ui.quantity', 'c.name', 'c.card_id')),
+    'rarity': ("Rarity", (WEIGHT_EXPR, 'c.name', 'c.card_id')),
+    'card_id': ("Card ID", ('c.card_id',)),
+}
+
+INVENTORY_COLUMNS = f'''
+    SELECT c.card_id, ui.quantity, c.name, c.description, c.rarity, COALESCE(c.thumb_url, c.img_url), {WEIGHT_EXPR}
+    FROM {INVENTORY_CARDS}
+'''
+
+
+class InventoryRow(NamedTuple):
+    card_id: int
+    quantity: int
+    name: str
+    description: Optional[str]
+    rarity: Optional[str]
+    image_url: Optional[str]
+    weight: float
+
+    def sort_key(self, sort):
+        return {
+            'name': (self.name, self.card_id),
+            'quantity': (-self.quantity, self.name, self.card_id),
+            'rarity': (self.weight, self.name, self.card_id),
+            'card_id': (self.card_id,),
+        }[sort]
+
+
+def _filters(guild_id, user_id, rarity=None, set_name=None):
+    clauses = ["ui.user_id = ?", "ui.guild_id = ?", "ui.quantity > 0"]
+    params = [user_id, guild_id]
+    if rarity:
+        clauses.append("c.rarity_key = ?")
+        params.append(rarity_key(rarity))
+    if set_name:
+        clauses.append(f'''EXISTS (SELECT 1 FROM set_cards sc
+                                   JOIN card_sets cs ON cs.set_id = sc.set_id AND cs.guild_id = sc.guild_id
+                                   WHERE {card_match('sc', 'c')} AND cs.name = ?)''')
+        params.append(set_name)
+    return clauses, params
+
+
+async def fetch_inventory_page(conn, guild_id, user_id, limit, sort='name', after=None, before=None,
+                               from_end=False, rarity=None, set_name=None):
+    """Return up to `limit` rows in sort order.
+
+    Rows start after the sort key `after`, or end just before the key `before`, or with `from_end` are the last
+    `limit` rows of the inventory. Without either key the page starts at the beginning.
+    """
+    columns = SORT_KEYS[sort][1]
+    placeholders = ', '.join('?' * len(columns))
+    clauses, params = _filters(guild_id, user_id, rarity, set_name)
+    if after is not None:
+        clauses.append(f"({', '.join(columns)}) > ({placeholders})")
+        params.extend(after)
+    elif before is not None:
+        clauses.append(f"({', '.join(columns)}) < ({placeholders})")
+        params.extend(before)
+
+    # Pages that end at a key are read backwards from it and flipped afterwards
+    backwards = before is not None or from_end
+    order = ', '.join(f"{column}{' DESC' if backwards else ''}" for column in columns)
+    cursor = await conn.execute(f"{INVENTORY_COLUMNS} WHERE {' AND '.join(clauses)} ORDER BY {order} LIMIT ?",
+                                (*params, limit))
+    rows = [InventoryRow(*row) for row in await cursor.fetchall()]
+    return rows[::-1] if backwards else rows
+
+
+async def count_inventory(conn, guild_id, user_id, rarity=None, set_name=None):
+    clauses, params = _filters(guild_id, user_id, rarity, set_name)
+    cursor = await conn.execute(f'''
+        SELECT COUNT(*) FROM {INVENTORY_CARDS}
+        WHERE {' AND '.join(clauses)}
+    ''', params)
+    return (await cursor.fetchone())[0]
+
+
+async def inventory_rarities(conn, guild_id, user_id):
+    cursor = await conn.execute(f'''
+        SELECT DISTINCT c.rarity FROM {INVENTORY_CARDS}
+        WHERE ui.user_id = ? AND ui.guild_id = ? AND ui.quantity > 0 AND c.rarity IS NOT NULL
+    ''', (user_id, guild_id))
+    return sorted({row[0] for row in await cursor.fetchall()}, key=str.lower)
+
+
+async def inventory_set_names(conn, guild_id, user_id):
+    cursor = await conn.execute(f'''
+        SELECT DISTINCT cs.name FROM user_inventory ui
+        {card_join('set_cards', 'sc', 'ui')}
+        JOIN card_sets cs ON cs.set_id = sc.set_id AND cs.guild_id = sc.guild_id
+        WHERE ui.user_id = ? AND ui.guild_id = ? AND ui.quantity > 0
+    ''', (user_id, guild_id))
+    return sorted((row[0] for row in await cursor.fetchall()), key=str.lower)
+
+
+async def find_inventory_item(conn, guild_id, user_id, name):
+    cursor = await conn.execute(f"{INVENTORY_COLUMNS} WHERE ui.user_id = ? AND ui.guild_id = ? AND ui.quantity > 0 "
+                                f"AND c.name = ?", (user_id, guild_id, name))
+    row = await cursor.fetchone()
+    return InventoryRow(*row) if row else None
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Inventory Pager
+# ---------------------------------------------------------------------------------------------------------------------
+class InventoryPager:
+    """Fixed-size pages over one member's inventory, fetched on demand and kept for the lifetime of a view.
+
+    Pages are reached from a neighbour that is already loaded: forwards from the previous page's last key, backwards
+    from the next page's first key, or backwards from the end for the last page. Only a jump to an arbitrary page in
+    the middle walks forward through the pages before it.
+    """
+
+    def __init__(self, guild_id, user_id, page_size, sort='name', rarity=None, set_name=None):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.page_size = page_size
+        self.sort = sort
+        self.rarity = rarity
+        self.set_name = set_name
+        self.total = 0
+        self._pages = {}
+
+    @property
+    def page_count(self):
+        return max((self.total + self.page_size - 1) // self.page_size, 1)
+
+    async def reset(self, sort=None, rarity=..., set_name=...):
+        """Change the sort order and filters (`...` leaves a filter as it is, None clears it) and recount."""
+        if sort is not None:
+            self.sort = sort
+        if rarity is not ...:
+            self.rarity = rarity
+        if set_name is not ...:
+            self.set_name = set_name
+        self._pages.clear()
+        async with aiosqlite.connect(db_path) as conn:
+            self.total = await count_inventory(conn, self.guild_id, self.user_id, self.rarity, self.set_name)
+
+    async def fetch(self, page):
+        page = min(max(page, 0), self.page_count - 1)
+        if page in self._pages:
+            return self._pages[page]
+
+        async with aiosqlite.connect(db_path) as conn:
+            if page + 1 in self._pages and self._pages[page + 1]:
+                rows = await self._read(conn, self.page_size, before=self._pages[page + 1][0].sort_key(self.sort))
+            elif page > 0 and page == self.page_count - 1 and page - 1 not in self._pages:
+                # The last page holds whatever is left over, so it is read backwards from the very end
+                rows = await self._read(conn, self.total - page * self.page_size, from_end=True)
+            else:
+                start = max((known for known in self._pages if known < page), default=None)
+                if start is None:
+                    start, rows = 0, await self._read(conn, self.page_size)
+                    self._pages[0] = rows
+                for current in range(start + 1, page + 1):
+                    previous = self._pages[current - 1]
+                    if not previous:
+                        break
+                    rows = await self._read(conn, self.page_size, after=previous[-1].sort_key(self.sort))
+                    self._pages[current] = rows
+                rows = self._pages.get(page, [])
+
+        self._pages[page] = rows
+        return rows
+
+    async def _read(self, conn, limit, after=None, before=None, from_end=False):
+        return await fetch_inventory_page(conn, self.guild_id, self.user_id, limit, self.sort, after=after,
+                                          before=before, from_end=from_end, rarity=self.rarity,
+                                          set_name=self.set_name)
@@ -0,0 +1,27 @@
+# ---------------------------------------------------------------------------------------------------------------------
+# Guild-Scoped Joins
+# ---------------------------------------------------------------------------------------------------------------------
+# Card IDs are numbered per guild, so the same card_id exists once in every guild that has that many cards. A join
+# on card_id alone pairs each row with the matching card of every guild and multiplies the result. Every join
+# between card-keyed tables therefore matches (guild_id, card_id), the leading columns of their keys and indexes.
+# Queries take their FROM clauses, and the correlation of their EXISTS subqueries, from here instead of spelling
+# the condition out each time.
+#
+# Aliases are fixed: ui = user_inventory, sc = set_cards, c = cards.
+
+
+def card_match(alias, other):
+    """Return the condition matching the row aliased `alias` to the row aliased `other` on (guild_id, card_id)."""
+    return f"{alias}.guild_id = {other}.guild_id AND {alias}.card_id = {other}.card_id"
+
+
+def card_join(table, alias, other, kind='JOIN'):
+    """Return `<kind> <table> <alias>` joined to the row aliased `other` on (guild_id, card_id)."""
+    return f"{kind} {table} {alias} ON {card_match(alias, other)}"
+
+
+# A member's inventory rows with their cards
+INVENTORY_CARDS = f"user_inventory ui {card_join('cards', 'c', 'ui')}"
+
+# A set's membership rows with their cards
+SET_CARDS = f"set_cards sc {card_join('cards', 'c', 'sc')}"
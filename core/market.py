@@ -0,0 +1,422 @@
+import logging
+
+from collections import OrderedDict
+from typing import NamedTuple
+from core.history import record_purchase
+from core.joins import card_join
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Order Book
+# ---------------------------------------------------------------------------------------------------------------------
+# Sell listings live in market_listings, one row per (seller, card, price) with a quantity. Listed copies are held
+# out of the seller's inventory until they sell or the listing is removed. idx_market_listings_ask orders each card's
+# book by (price, listing_id), so the cheapest listing is the first entry of an index range and a buy walks the book
+# from there, filling listings oldest-first within a price and only partly consuming the last one it touches.
+#
+# Standing buy orders live in market_bids and hold their points in escrow (price x quantity is taken from the
+# buyer's balance when the order is placed). idx_market_bids_match orders them by (price DESC, bid_id). An incoming
+# order is matched against the other side of the book before anything rests: a new listing sells into the highest
+# bids at the bid price, and a new buy order takes the cheapest listings at the listing price, with the unused part
+# of its escrow refunded.
+
+ASK_COLUMNS = "listing_id, seller_id, price, quantity"
+BID_COLUMNS = "bid_id, buyer_id, price, quantity"
+
+
+class Listing(NamedTuple):
+    listing_id: int
+    seller_id: int
+    price: int
+    quantity: int
+
+
+class Fill(NamedTuple):
+    order_id: int         # The listing or buy order on the other side of the match
+    counterparty_id: int
+    price: int
+    quantity: int
+
+
+def fill_total(fills):
+    return sum(fill.price * fill.quantity for fill in fills)
+
+
+def fill_quantity(fills):
+    return sum(fill.quantity for fill in fills)
+
+
+class MarketError(Exception):
+    pass
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Best Ask Cache
+# ---------------------------------------------------------------------------------------------------------------------
+# The cheapest listing per (guild, card) is kept in memory so autocomplete and price lookups, which run on every
+# keystroke, do not go back to the database. Every write to a card's book drops its entry after committing and bumps
+# the card's generation. A lookup only stores what it read if no write landed while it was reading, otherwise a
+# listing made in the meantime could be hidden behind a stale entry. Entries, including "nobody is selling", are
+# kept least recently used first and the oldest are dropped beyond BEST_ASK_CACHE_SIZE.
+
+BEST_ASK_CACHE_SIZE = 4096
+
+_MISSING = object()
+_best_asks = OrderedDict()
+_generations = {}
+
+
+def invalidate_best_ask(guild_id, card_id):
+    key = (int(guild_id), int(card_id))
+    _best_asks.pop(key, None)
+    _generations[key] = _generations.get(key, 0) + 1
+
+
+async def get_best_ask(conn, guild_id, card_id):
+    """Return the cheapest Listing for a card, or None when nobody is selling it."""
+    key = (int(guild_id), int(card_id))
+    best = _best_asks.get(key, _MISSING)
+    if best is not _MISSING:
+        _best_asks.move_to_end(key)
+        return best
+
+    generation = _generations.get(key, 0)
+    cursor = await conn.execute(
+        f"SELECT {ASK_COLUMNS} FROM market_listings WHERE guild_id = ? AND card_id = ? "
+        f"ORDER BY price, listing_id LIMIT 1",
+        key
+    )
+    row = await cursor.fetchone()
+    best = Listing(*row) if row else None
+    if _generations.get(key, 0) == generation:
+        _best_asks[key] = best
+        if len(_best_asks) > BEST_ASK_CACHE_SIZE:
+            _best_asks.popitem(last=False)
+    return best
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Book Queries
+# ---------------------------------------------------------------------------------------------------------------------
+async def best_ask_for(conn, guild_id, card_id, buyer_id):
+    """Cheapest listing the buyer could take, skipping their own listings."""
+    best = await get_best_ask(conn, guild_id, card_id)
+    if best is None or best.seller_id != buyer_id:
+        return best
+    cursor = await conn.execute(
+        f"SELECT {ASK_COLUMNS} FROM market_listings WHERE guild_id = ? AND card_id = ? AND seller_id != ? "
+        f"ORDER BY price, listing_id LIMIT 1",
+        (guild_id, card_id, buyer_id)
+    )
+    row = await cursor.fetchone()
+    return Listing(*row) if row else None
+
+
+async def price_levels(conn, guild_id, card_id, limit=10):
+    """Aggregate the cheapest price levels of a card's book as (price, copies, listings)."""
+    cursor = await conn.execute('''
+        SELECT price, SUM(quantity), COUNT(*) FROM market_listings
+        WHERE guild_id = ? AND card_id = ?
+        GROUP BY price ORDER BY price LIMIT ?
+    ''', (guild_id, card_id, limit))
+    return await cursor.fetchall()
+
+
+async def bid_levels(conn, guild_id, card_id, limit=10):
+    """Aggregate the highest price levels of a card's buy orders as (price, copies, orders)."""
+    cursor = await conn.execute('''
+        SELECT price, SUM(quantity), COUNT(*) FROM market_bids
+        WHERE guild_id = ? AND card_id = ?
+        GROUP BY price ORDER BY price DESC LIMIT ?
+    ''', (guild_id, card_id, limit))
+    return await cursor.fetchall()
+
+
+async def buyer_bids(conn, guild_id, buyer_id, name_filter='', limit=25):
+    cursor = await conn.execute(f'''
+        SELECT mb.bid_id, c.name, c.rarity, mb.price, mb.quantity
+        FROM market_bids mb
+        {card_join('cards', 'c', 'mb')}
+        WHERE mb.guild_id = ? AND mb.buyer_id = ? AND c.name LIKE ?
+        ORDER BY c.name, mb.price DESC
+        LIMIT ?
+    ''', (guild_id, buyer_id, f"%{name_filter}%", limit))
+    return await cursor.fetchall()
+
+
+async def seller_listings(conn, guild_id, seller_id, name_filter='', limit=25):
+    cursor = await conn.execute(f'''
+        SELECT ml.listing_id, c.name, c.rarity, ml.price, ml.quantity
+        FROM market_listings ml
+        {card_join('cards', 'c', 'ml')}
+        WHERE ml.guild_id = ? AND ml.seller_id = ? AND c.name LIKE ?
+        ORDER BY c.name, ml.price
+        LIMIT ?
+    ''', (guild_id, seller_id, f"%{name_filter}%", limit))
+    return await cursor.fetchall()
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Inventory and Balance Helpers
+# ---------------------------------------------------------------------------------------------------------------------
+async def take_cards(conn, guild_id, user_id, card_id, quantity):
+    """Remove copies from an inventory, raising MarketError if the user holds fewer than `quantity`."""
+    cursor = await conn.execute(
+        "UPDATE user_inventory SET quantity = quantity - ? "
+        "WHERE guild_id = ? AND user_id = ? AND card_id = ? AND quantity >= ?",
+        (quantity, guild_id, user_id, card_id, quantity)
+    )
+    if cursor.rowcount == 0:
+        raise MarketError("You do not own enough copies of this card.")
+    await conn.execute(
+        "DELETE FROM user_inventory WHERE guild_id = ? AND user_id = ? AND card_id = ? AND quantity <= 0",
+        (guild_id, user_id, card_id)
+    )
+
+
+async def give_cards(conn, guild_id, user_id, card_id, quantity):
+    await conn.execute(
+        "INSERT INTO user_inventory (guild_id, user_id, card_id, quantity) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(guild_id, user_id, card_id) DO UPDATE SET quantity = quantity + excluded.quantity",
+        (guild_id, user_id, card_id, quantity)
+    )
+
+
+async def credit(conn, guild_id, user_id, amount):
+    await conn.execute(
+        "INSERT INTO economy (guild_id, user_id, balance) VALUES (?, ?, ?) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE SET balance = balance + excluded.balance",
+        (guild_id, user_id, amount)
+    )
+
+
+async def debit(conn, guild_id, user_id, amount):
+    cursor = await conn.execute(
+        "UPDATE economy SET balance = balance - ? WHERE guild_id = ? AND user_id = ? AND balance >= ?",
+        (amount, guild_id, user_id, amount)
+    )
+    if cursor.rowcount == 0:
+        raise MarketError("You do not have enough points for this purchase.")
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Order Book Writes
+# ---------------------------------------------------------------------------------------------------------------------
+# Each write runs in its own BEGIN IMMEDIATE transaction, so the balance and quantity checks it makes still hold when
+# it commits, and rolls back on any error. Callers get MarketError for anything the user should be told about.
+
+async def _run(conn, guild_id, card_id, operation):
+    await conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = await operation()
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+    finally:
+        invalidate_best_ask(guild_id, card_id)
+    return result
+
+
+async def _match_asks(conn, guild_id, buyer_id, card_id, quantity, max_price=None):
+    """Take up to `quantity` copies from the cheapest listings and deliver them. The buyer is not charged here."""
+    query = f"SELECT {ASK_COLUMNS} FROM market_listings WHERE guild_id = ? AND card_id = ? AND seller_id != ?"
+    params = [guild_id, card_id, buyer_id]
+    if max_price is not None:
+        query += " AND price <= ?"
+        params.append(max_price)
+    # No more listings than copies wanted can be touched, so the walk is bounded by the order size
+    cursor = await conn.execute(f"{query} ORDER BY price, listing_id LIMIT ?", (*params, quantity))
+
+    fills, remaining = [], quantity
+    for listing in map(Listing._make, await cursor.fetchall()):
+        take = min(listing.quantity, remaining)
+        fills.append(Fill(listing.listing_id, listing.seller_id, listing.price, take))
+        remaining -= take
+        if not remaining:
+            break
+    if not fills:
+        return fills
+
+    await conn.executemany(
+        "UPDATE market_listings SET quantity = quantity - ? WHERE listing_id = ?",
+        [(fill.quantity, fill.order_id) for fill in fills]
+    )
+    await conn.executemany(
+        "DELETE FROM market_listings WHERE listing_id = ? AND quantity <= 0",
+        [(fill.order_id,) for fill in fills]
+    )
+    for fill in fills:
+        await credit(conn, guild_id, fill.counterparty_id, fill.price * fill.quantity)
+        await record_purchase(conn, guild_id, buyer_id, fill.counterparty_id, card_id, fill.price, fill.quantity)
+    await give_cards(conn, guild_id, buyer_id, card_id, fill_quantity(fills))
+    return fills
+
+
+async def _match_bids(conn, guild_id, seller_id, card_id, quantity, min_price):
+    """Sell up to `quantity` copies into the highest buy orders at or above `min_price`, paying from escrow.
+
+    The seller's copies must already have been taken from their inventory.
+    """
+    cursor = await conn.execute(
+        f"SELECT {BID_COLUMNS} FROM market_bids WHERE guild_id = ? AND card_id = ? AND buyer_id != ? AND price >= ? "
+        f"ORDER BY price DESC, bid_id LIMIT ?",
+        (guild_id, card_id, seller_id, min_price, quantity)
+    )
+    fills, remaining = [], quantity
+    for bid_id, buyer_id, price, bid_quantity in await cursor.fetchall():
+        take = min(bid_quantity, remaining)
+        fills.append(Fill(bid_id, buyer_id, price, take))
+        remaining -= take
+        if not remaining:
+            break
+    if not fills:
+        return fills
+
+    await conn.executemany(
+        "UPDATE market_bids SET quantity = quantity - ? WHERE bid_id = ?",
+        [(fill.quantity, fill.order_id) for fill in fills]
+    )
+    await conn.executemany(
+        "DELETE FROM market_bids WHERE bid_id = ? AND quantity <= 0",
+        [(fill.order_id,) for fill in fills]
+    )
+    for fill in fills:
+        await give_cards(conn, guild_id, fill.counterparty_id, card_id, fill.quantity)
+        await record_purchase(conn, guild_id, fill.counterparty_id, seller_id, card_id, fill.price, fill.quantity)
+    await credit(conn, guild_id, seller_id, fill_total(fills))
+    return fills
+
+
+async def place_listing(conn, guild_id, seller_id, card_id, price, quantity=1):
+    """List copies for sale at `price` each, first selling into any buy orders at or above that price.
+
+    Whatever is not matched rests in the book, merged into the seller's existing listing at the same price. Returns
+    (fills, listing_id); listing_id is None when every copy sold immediately.
+    """
+    if price <= 0 or quantity <= 0:
+        raise MarketError("Price and quantity must be positive.")
+
+    async def operation():
+        await take_cards(conn, guild_id, seller_id, card_id, quantity)
+        fills = await _match_bids(conn, guild_id, seller_id, card_id, quantity, price)
+        remaining = quantity - fill_quantity(fills)
+        if not remaining:
+            return fills, None
+
+        cursor = await conn.execute(
+            "UPDATE market_listings SET quantity = quantity + ? "
+            "WHERE guild_id = ? AND seller_id = ? AND card_id = ? AND price = ?",
+            (remaining, guild_id, seller_id, card_id, price)
+        )
+        if cursor.rowcount:
+            cursor = await conn.execute(
+                "SELECT listing_id FROM market_listings WHERE guild_id = ? AND seller_id = ? AND card_id = ? "
+                "AND price = ?",
+                (guild_id, seller_id, card_id, price)
+            )
+            return fills, (await cursor.fetchone())[0]
+        cursor = await conn.execute(
+            "INSERT INTO market_listings (guild_id, seller_id, card_id, price, quantity) VALUES (?, ?, ?, ?, ?)",
+            (guild_id, seller_id, card_id, price, remaining)
+        )
+        return fills, cursor.lastrowid
+
+    return await _run(conn, guild_id, card_id, operation)
+
+
+async def cancel_listing(conn, guild_id, seller_id, listing_id, quantity=None):
+    """Return listed copies (all of them by default) to the seller. Returns (card_id, copies returned)."""
+    cursor = await conn.execute(
+        "SELECT card_id, quantity FROM market_listings WHERE listing_id = ? AND guild_id = ? AND seller_id = ?",
+        (listing_id, guild_id, seller_id)
+    )
+    row = await cursor.fetchone()
+    if not row:
+        raise MarketError("No such sale listing found for your account.")
+    card_id, listed = row
+    quantity = listed if quantity is None else min(quantity, listed)
+    if quantity <= 0:
+        raise MarketError("Quantity must be positive.")
+
+    async def operation():
+        cursor = await conn.execute(
+            "UPDATE market_listings SET quantity = quantity - ? WHERE listing_id = ? AND quantity >= ?",
+            (quantity, listing_id, quantity)
+        )
+        if cursor.rowcount == 0:
+            raise MarketError("This listing changed while it was being removed. Please try again.")
+        await conn.execute("DELETE FROM market_listings WHERE listing_id = ? AND quantity <= 0", (listing_id,))
+        await give_cards(conn, guild_id, seller_id, card_id, quantity)
+        return card_id, quantity
+
+    return await _run(conn, guild_id, card_id, operation)
+
+
+async def buy_from_book(conn, guild_id, buyer_id, card_id, quantity=1, max_price=None):
+    """Buy up to `quantity` copies from the cheapest listings, optionally capped at `max_price` per copy.
+
+    Listings are consumed in (price, listing_id) order and the last one may be partly filled. Fills stop early when
+    the book runs out; the buyer must be able to pay for everything that was matched. Returns the list of Fills.
+    """
+    if quantity <= 0:
+        raise MarketError("Quantity must be positive.")
+
+    async def operation():
+        fills = await _match_asks(conn, guild_id, buyer_id, card_id, quantity, max_price)
+        if not fills:
+            raise MarketError("There are no listings for this card at that price.")
+        await debit(conn, guild_id, buyer_id, fill_total(fills))
+        return fills
+
+    return await _run(conn, guild_id, card_id, operation)
+
+
+async def place_bid(conn, guild_id, buyer_id, card_id, price, quantity=1):
+    """Post a buy order for up to `quantity` copies at `price` each, first buying from listings at or below it.
+
+    The buyer pays listing prices for what matches now and the rest of the order is escrowed at `price` per copy.
+    Returns (fills, bid_id); bid_id is None when the whole order was filled immediately.
+    """
+    if price <= 0 or quantity <= 0:
+        raise MarketError("Price and quantity must be positive.")
+
+    async def operation():
+        fills = await _match_asks(conn, guild_id, buyer_id, card_id, quantity, price)
+        remaining = quantity - fill_quantity(fills)
+        # One guarded debit covers both the copies bought now and the escrow for the rest
+        await debit(conn, guild_id, buyer_id, fill_total(fills) + remaining * price)
+        if not remaining:
+            return fills, None
+
+        cursor = await conn.execute(
+            "INSERT INTO market_bids (guild_id, buyer_id, card_id, price, quantity) VALUES (?, ?, ?, ?, ?)",
+            (guild_id, buyer_id, card_id, price, remaining)
+        )
+        return fills, cursor.lastrowid
+
+    return await _run(conn, guild_id, card_id, operation)
+
+
+async def cancel_bid(conn, guild_id, buyer_id, bid_id):
+    """Withdraw a buy order and refund its escrow. Returns (card_id, points refunded)."""
+
+    cursor = await conn.execute(
+        "SELECT card_id FROM market_bids WHERE bid_id = ? AND guild_id = ? AND buyer_id = ?",
+        (bid_id, guild_id, buyer_id)
+    )
+    row = await cursor.fetchone()
+    if not row:
+        raise MarketError("No such buy order found for your account.")
+
+    async def operation():
+        cursor = await conn.execute("SELECT price * quantity FROM market_bids WHERE bid_id = ?", (bid_id,))
+        escrow = await cursor.fetchone()
+        if not escrow:
+            raise MarketError("This buy order has already been filled.")
+        await conn.execute("DELETE FROM market_bids WHERE bid_id = ?", (bid_id,))
+        await credit(conn, guild_id, buyer_id, escrow[0])
+        return row[0], escrow[0]
+
+    return await _run(conn, guild_id, row[0], operation)
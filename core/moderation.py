@@ -0,0 +1,117 @@
+import json
+import base64
+import asyncio
+import logging
+
+from openai import AsyncOpenAI
+
+from core.image_store import image_hash
+from core.utils import StageTimer
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Moderation Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+OPENAI_MODERATION_MODEL = "omni-moderation-latest"
+
+# Categories that cause an upload to be rejected
+BLOCKED_CATEGORIES = ('sexual_minors',)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Moderation Backends
+# ---------------------------------------------------------------------------------------------------------------------
+def image_data_url(data, ext):
+    return f"data:image/{ext};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+class OpenAIModerationBackend:
+    model = OPENAI_MODERATION_MODEL
+
+    def __init__(self, api_key, executor=None):
+        self.client = AsyncOpenAI(api_key=api_key)
+        # Base64 of a large image takes long enough to stall the event loop, so it runs on this executor
+        self.executor = executor
+
+    async def encode(self, data, ext):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, image_data_url, data, ext)
+
+    async def classify(self, data_url):
+        logger.debug(f"Moderating image, data_url length = {len(data_url)}")
+
+        resp = await self.client.moderations.create(
+            model=self.model,
+            input=[{
+                "type": "image_url",
+                "image_url": {"url": data_url}
+            }]
+        )
+        return {name: bool(value) for name, value in resp.results[0].categories.model_dump().items()}
+
+
+class LocalModerationBackend:
+    """Offline stand-in for tests and development: approves everything except hashes it was told to flag."""
+    model = "local"
+
+    def __init__(self, flagged_hashes=None):
+        self.flagged_hashes = set(flagged_hashes or ())
+
+    async def encode(self, data, ext):
+        return data
+
+    async def classify(self, data):
+        flagged = image_hash(data) in self.flagged_hashes
+        return {category: flagged for category in BLOCKED_CATEGORIES}
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Verdict Cache
+# ---------------------------------------------------------------------------------------------------------------------
+def is_blocked(categories):
+    return any(categories.get(category) for category in BLOCKED_CATEGORIES)
+
+
+async def get_cached_verdict(conn, digest, model):
+    cursor = await conn.execute(
+        "SELECT categories FROM moderation_verdicts WHERE image_hash = ? AND model = ?",
+        (digest, model)
+    )
+    row = await cursor.fetchone()
+    await cursor.close()
+    return json.loads(row[0]) if row else None
+
+
+async def save_verdict(conn, digest, model, categories):
+    await conn.execute('''
+        INSERT INTO moderation_verdicts (image_hash, model, flagged, categories, checked_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(image_hash, model) DO UPDATE SET
+            flagged = excluded.flagged,
+            categories = excluded.categories,
+            checked_at = excluded.checked_at
+    ''', (digest, model, int(is_blocked(categories)), json.dumps(categories)))
+
+
+async def moderate_image(conn, backend, digest, data, ext, timer=None):
+    """Return the category verdict for an image, calling the backend only for hashes it has not judged before.
+
+    The backend's request encoding is timed as "encode" and everything else as "moderate".
+    """
+    timer = timer or StageTimer("moderate_image")
+    with timer.stage("moderate"):
+        categories = await get_cached_verdict(conn, digest, backend.model)
+    if categories is not None:
+        logger.debug(f"Moderation cache hit for {digest}")
+        return categories
+
+    with timer.stage("encode"):
+        payload = await backend.encode(data, ext)
+    with timer.stage("moderate"):
+        categories = await backend.classify(payload)
+        await save_verdict(conn, digest, backend.model, categories)
+        await conn.commit()
+    return categories
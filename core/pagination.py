@@ -3,8 +3,9 @@ import os
 import logging
 import aiosqlite
 
-from discord.ui import View, Button
+from discord.ui import View, Button, Select
 from core.utils import get_embed_colour
+from core.inventory import SORT_KEYS, InventoryPager, inventory_rarities, inventory_set_names
 
 # ---------------------------------------------------------------------------------------------------------------------
 # Database Configuration
@@ -19,15 +20,120 @@ logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
 
+# ---------------------------------------------------------------------------------------------------------------------
+# Inventory View Model
+# ---------------------------------------------------------------------------------------------------------------------
+# Rows come from the database one page at a time through core.inventory's keyset pager, so a collection of thousands
+# of cards costs no more to open than a small one. Pages are rendered when someone looks at them and cached per
+# (page, descriptions, visibility) for the lifetime of the view; sorting and filtering start a fresh walk in SQL.
+
+class InventoryViewModel:
+    items_per_page = 5
+
+    def __init__(self, pager, owner, colour, balance=0, rarities=(), set_names=()):
+        self.pager = pager
+        self.owner = owner
+        self.colour = colour
+        self.balance = balance
+        self.rarities = list(rarities)
+        self.set_names = list(set_names)
+        self._pages = {}
+
+    @classmethod
+    async def load(cls, guild_id, owner):
+        async with aiosqlite.connect(db_path) as conn:
+            cursor = await conn.execute('SELECT balance FROM economy WHERE user_id = ? AND guild_id = ?',
+                                        (owner.id, guild_id))
+            balance_row = await cursor.fetchone()
+            rarities = await inventory_rarities(conn, guild_id, owner.id)
+            set_names = await inventory_set_names(conn, guild_id, owner.id)
+        pager = InventoryPager(guild_id, owner.id, cls.items_per_page)
+        await pager.reset()
+        colour = await get_embed_colour(guild_id)
+        return cls(pager, owner, colour, balance_row[0] if balance_row else 0, rarities, set_names)
+
+    @property
+    def total(self):
+        return self.pager.total
+
+    @property
+    def page_count(self):
+        return self.pager.page_count
+
+    @property
+    def sort(self):
+        return self.pager.sort
+
+    @property
+    def rarity(self):
+        return self.pager.rarity
+
+    @property
+    def set_name(self):
+        return self.pager.set_name
+
+    async def apply(self, sort=None, rarity=..., set_name=...):
+        """Change the sort order and filters; `...` leaves a filter as it is and None clears it."""
+        await self.pager.reset(sort, rarity, set_name)
+        self._pages.clear()
+
+    async def page_embed(self, page, show_descriptions=True, public=False):
+        key = (page, show_descriptions, public)
+        if key not in self._pages:
+            rows = await self.pager.fetch(page)
+            self._pages[key] = self.build_embed(page, rows, show_descriptions, public)
+        return self._pages[key]
+
+    def filter_label(self):
+        labels = [label for label in (self.rarity, self.set_name) if label]
+        return f" | {', '.join(labels)}" if labels else ""
+
+    def build_embed(self, page, rows, show_descriptions, public):
+        embed = discord.Embed(color=self.colour)
+        embed.title = f"{self.owner.display_name}'s Inventory" if public else "Your Inventory"
+        # Show the first card on the page, falling back to the owner's avatar for cards without art
+        embed.set_thumbnail(url=(rows[0].image_url if rows else None) or self.owner.display_avatar.url)
+
+        lines = []
+        for index, row in enumerate(rows, start=page * self.items_per_page + 1):
+            if show_descriptions:
+                lines.append(f"{index}. **{row.name}** (x{row.quantity})\n"
+                             f"*{row.description or 'No description available'}*")
+            else:
+                lines.append(f"{index}. **{row.name}** (x{row.quantity})")
+        embed.description = "\n\n".join(lines) if lines else "No cards match these filters."
+
+        embed.set_footer(text=f"Points Balance: {self.balance} | Page {page + 1}/{self.page_count}{self.filter_label()}")
+        embed.timestamp = discord.utils.utcnow()
+        return embed
+
+
+class InspectInventoryViewModel(InventoryViewModel):
+    """Admin view of another member's inventory: denser pages, no balance."""
+    items_per_page = 10
+
+    def build_embed(self, page, rows, show_descriptions, public):
+        embed = discord.Embed(title=f"{self.owner.display_name}'s Inventory", color=self.colour)
+        for row in rows:
+            embed.add_field(name=row.name, value=f"Quantity: {row.quantity}", inline=False)
+        if not rows:
+            embed.description = "No cards match these filters."
+        embed.set_footer(text=f"Page {page + 1} of {self.page_count} | Inventory for {self.owner.display_name}"
+                              f"{self.filter_label()}")
+        embed.timestamp = discord.utils.utcnow()
+        return embed
+
 # ---------------------------------------------------------------------------------------------------------------------
 # Inventory Pagination View
 # ---------------------------------------------------------------------------------------------------------------------
+ALL_OPTION = '__all__'
+
 
 class InventoryPaginationView(View):
-    def __init__(self, embeds, bot, user_id, show_descriptions=True, is_ephemeral=True):
+    def __init__(self, model, bot, user_id, show_descriptions=True, is_ephemeral=True):
         super().__init__(timeout=180)
         self.bot = bot
-        self.embeds = embeds
+        self.model = model
         self.current_page = 0
         self.user_id = user_id
         self.show_descriptions = show_descriptions
@@ -37,7 +143,7 @@ class InventoryPaginationView(View):
         # Pagination buttons
         self.previous_button = Button(style=discord.ButtonStyle.secondary, label="Prev", disabled=True)
         self.home_button = Button(style=discord.ButtonStyle.primary, label="Home")
-        self.next_button = Button(style=discord.ButtonStyle.secondary, label="Next", disabled=(len(embeds) <= 1))
+        self.next_button = Button(style=discord.ButtonStyle.secondary, label="Next")
 
         # New buttons
         self.show_hide_button = Button(
@@ -51,12 +157,31 @@ class InventoryPaginationView(View):
             row=1
         )
 
+        # Sorting and filtering are applied in SQL; the model restarts its page walk on every change
+        self.sort_select = Select(placeholder="Sort by...", row=2, options=[
+            discord.SelectOption(label=f"Sort: {label}", value=key) for key, (label, _) in SORT_KEYS.items()
+        ])
+        rarities = model.rarities[:24]
+        self.rarity_select = Select(placeholder="Filter by rarity...", row=3, options=[
+            discord.SelectOption(label="All rarities", value=ALL_OPTION)
+        ] + [discord.SelectOption(label=rarity.capitalize(), value=rarity) for rarity in rarities])
+        # Set names can outgrow the 100 character option limit, so options carry their index in model.set_names
+        set_names = model.set_names[:24]
+        self.set_select = Select(placeholder="Filter by set...", row=4, options=[
+            discord.SelectOption(label="All sets", value=ALL_OPTION)
+        ] + [discord.SelectOption(label=name[:100], value=str(index)) for index, name in enumerate(set_names)])
+
         # Add buttons to the view
         self.add_item(self.previous_button)
         self.add_item(self.home_button)
         self.add_item(self.next_button)
         self.add_item(self.show_hide_button)
         self.add_item(self.toggle_descriptions_button)
+        self.add_item(self.sort_select)
+        if len(rarities) > 1:
+            self.add_item(self.rarity_select)
+        if set_names:
+            self.add_item(self.set_select)
 
         # Assign callbacks to buttons
         self.previous_button.callback = self.previous_page
@@ -64,58 +189,82 @@ class InventoryPaginationView(View):
         self.next_button.callback = self.next_page
         self.show_hide_button.callback = self.toggle_visibility
         self.toggle_descriptions_button.callback = self.toggle_descriptions
-
-    async def previous_page(self, interaction: discord.Interaction):
+        self.sort_select.callback = self.change_sort
+        self.rarity_select.callback = self.change_rarity
+        self.set_select.callback = self.change_set
+
+        self.sync_controls()
+
+    async def current_embed(self):
+        return await self.model.page_embed(self.current_page, self.show_descriptions, not self.is_ephemeral)
+
+    def sync_controls(self):
+        self.previous_button.disabled = self.current_page == 0
+        self.next_button.disabled = self.current_page >= self.model.page_count - 1
+        # Keep the active choices selected, since edits otherwise reset selects to their placeholders
+        for option in self.sort_select.options:
+            option.default = option.value == self.model.sort
+        for option in self.rarity_select.options:
+            option.default = option.value == (self.model.rarity or ALL_OPTION)
+        for option in self.set_select.options:
+            option.default = option.value == self.set_option_value(self.model.set_name)
+
+    def set_option_value(self, set_name):
+        if set_name is None or set_name not in self.model.set_names:
+            return ALL_OPTION
+        return str(self.model.set_names.index(set_name))
+
+    async def check_user(self, interaction: discord.Interaction):
         if interaction.user.id != self.user_id:
             await interaction.response.send_message("You cannot interact with this inventory.", ephemeral=True)
-            return
+            return False
+        return True
 
-        self.current_page -= 1
-        if self.current_page == 0:
-            self.previous_button.disabled = True
-        self.next_button.disabled = False
-        await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
+    async def show_page(self, interaction: discord.Interaction, page):
+        self.current_page = min(max(page, 0), self.model.page_count - 1)
+        self.sync_controls()
+        await interaction.response.edit_message(embed=await self.current_embed(), view=self)
 
-    async def go_home(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("You cannot interact with this inventory.", ephemeral=True)
-            return
+    async def previous_page(self, interaction: discord.Interaction):
+        if await self.check_user(interaction):
+            await self.show_page(interaction, self.current_page - 1)
 
-        self.current_page = 0
-        self.previous_button.disabled = True
-        self.next_button.disabled = (len(self.embeds) <= 1)
-        await interaction.response.edit_message(embed=self.embeds[0], view=self)
+    async def go_home(self, interaction: discord.Interaction):
+        if await self.check_user(interaction):
+            await self.show_page(interaction, 0)
 
     async def next_page(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("You cannot interact with this inventory.", ephemeral=True)
-            return
-
-        self.current_page += 1
-        if self.current_page == len(self.embeds) - 1:
-            self.next_button.disabled = True
-        self.previous_button.disabled = False
-        await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
+        if await self.check_user(interaction):
+            await self.show_page(interaction, self.current_page + 1)
+
+    async def change_sort(self, interaction: discord.Interaction):
+        if await self.check_user(interaction):
+            await self.model.apply(sort=self.sort_select.values[0])
+            await self.show_page(interaction, 0)
+
+    async def change_rarity(self, interaction: discord.Interaction):
+        if await self.check_user(interaction):
+            value = self.rarity_select.values[0]
+            await self.model.apply(rarity=None if value == ALL_OPTION else value)
+            await self.show_page(interaction, 0)
+
+    async def change_set(self, interaction: discord.Interaction):
+        if await self.check_user(interaction):
+            value = self.set_select.values[0]
+            await self.model.apply(set_name=None if value == ALL_OPTION else self.model.set_names[int(value)])
+            await self.show_page(interaction, 0)
 
     async def toggle_visibility(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("You cannot interact with this inventory.", ephemeral=True)
+        if not await self.check_user(interaction):
             return
 
         # Acknowledge the interaction early to prevent timeout
         await interaction.response.defer()
 
-        # Toggle ephemeral state
+        # Toggle ephemeral state; the page is re-rendered with the matching title
         self.is_ephemeral = not self.is_ephemeral
         self.show_hide_button.label = "Hide" if not self.is_ephemeral else "Show"
 
-        # Update the embed title
-        for embed in self.embeds:
-            if not self.is_ephemeral:
-                embed.title = f"{interaction.user.display_name}'s Inventory"
-            else:
-                embed.title = "Your Inventory"
-
         # If making the inventory public
         if not self.is_ephemeral:
             # Delete the ephemeral message (if any)
@@ -126,7 +275,7 @@ class InventoryPaginationView(View):
                 pass
 
             # Send the inventory as a public message
-            self.public_message = await interaction.channel.send(embed=self.embeds[self.current_page], view=self)
+            self.public_message = await interaction.channel.send(embed=await self.current_embed(), view=self)
         else:
             # If hiding the inventory, delete the public message and resend as ephemeral
             if self.public_message:
@@ -134,77 +283,13 @@ class InventoryPaginationView(View):
                 self.public_message = None
 
             # Resend the inventory as an ephemeral message
-            await interaction.followup.send(embed=self.embeds[self.current_page], view=self, ephemeral=True)
+            await interaction.followup.send(embed=await self.current_embed(), view=self, ephemeral=True)
 
     async def toggle_descriptions(self, interaction: discord.Interaction):
-        if interaction.user.id != self.user_id:
-            await interaction.response.send_message("You cannot interact with this inventory.", ephemeral=True)
+        if not await self.check_user(interaction):
             return
 
-        # Toggle descriptions visibility
+        # Toggle descriptions visibility; pages for either mode are built once and cached by the model
         self.show_descriptions = not self.show_descriptions
         self.toggle_descriptions_button.label = "Hide Descriptions" if self.show_descriptions else "Show Descriptions"
-
-        # Rebuild the embeds with or without card descriptions
-        new_embeds = []
-        async with aiosqlite.connect(db_path) as conn:
-            # Fetch balance
-            cursor = await conn.execute('''
-                SELECT balance FROM economy WHERE user_id = ? AND guild_id = ?
-            ''', (interaction.user.id, interaction.guild.id))
-            balance_row = await cursor.fetchone()
-            balance = balance_row[0] if balance_row else 0
-
-            # Fetch inventory items
-            cursor = await conn.execute('''
-                SELECT ui.guild_id, ui.card_id, ui.quantity, c.name, c.description, c.rarity, c.img_url
-                FROM user_inventory ui
-                JOIN cards c ON ui.card_id = c.card_id AND ui.guild_id = c.guild_id
-                WHERE ui.user_id = ? AND ui.guild_id = ? AND ui.quantity > 0
-            ''', (interaction.user.id, interaction.guild.id))
-            inventory_items = await cursor.fetchall()
-
-            if inventory_items:
-                colour = await get_embed_colour(interaction.guild.id)
-                items_per_page = 5
-                page_count = (len(inventory_items) + items_per_page - 1) // items_per_page
-
-                for page in range(page_count):
-                    start_index = page * items_per_page
-                    end_index = start_index + items_per_page
-                    page_items = inventory_items[start_index:end_index]
-
-                    embed = discord.Embed(color=colour)
-                    embed.set_thumbnail(url=interaction.user.display_avatar.url)
-
-                    # Update the title based on whether the message is public or not
-                    if not self.is_ephemeral:
-                        embed.title = f"{interaction.user.display_name}'s Inventory"
-                    else:
-                        embed.title = "Your Inventory"
-
-                    embed_description = ""
-                    for index, item in enumerate(page_items, start=1):
-                        # Get the description if available, otherwise provide a fallback
-                        description = item[4] if item[4] else None
-
-                        # If descriptions are to be shown, add the real description
-                        if self.show_descriptions and description:
-                            embed_description += f"{index + start_index}. **{item[3]}** (x{item[2]})\n*{description}*\n\n"
-                        elif not self.show_descriptions:
-                            # If descriptions are hidden, leave it blank
-                            embed_description += f"{index + start_index}. **{item[3]}** (x{item[2]})\n\n"
-
-                    # Set the final description of the embed
-                    embed.description = embed_description.strip()
-                    embed.set_footer(text=f"Points Balance: {balance}")
-                    embed.timestamp = discord.utils.utcnow()
-                    new_embeds.append(embed)
-
-                # Update the embeds with the new description visibility
-                self.embeds = new_embeds
-
-                # Edit the existing ephemeral message instead of sending a new one
-                await interaction.response.edit_message(embed=self.embeds[self.current_page], view=self)
-            else:
-                await interaction.response.send_message("Your inventory is empty.", ephemeral=True)
+        await self.show_page(interaction, self.current_page)
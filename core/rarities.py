@@ -0,0 +1,146 @@
+import os
+import logging
+import threading
+import aiosqlite
+
+from typing import NamedTuple, Optional
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Database Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+os.makedirs('./data/databases', exist_ok=True)
+db_path = './data/databases/tcg.db'
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Rarity Keys
+# ---------------------------------------------------------------------------------------------------------------------
+# Rarity names are typed by admins, preset files and the dashboard, so the same rarity turns up as "Rare", "rare" and
+# "rare ". Both cards and rarity_weights carry a rarity_key column holding the trimmed, lower-cased name. Triggers keep
+# it in step with rarity on every insert and update, and it is indexed per guild, so joins and lookups compare keys
+# instead of wrapping the column in LOWER(), which no index can serve.
+
+RARITY_KEY_TABLES = ('rarity_weights', 'cards')
+
+# rarity_weights holds one row per (guild_id, rarity_key). Writes set the key themselves so a different spelling of an
+# existing rarity conflicts on the insert, and the row keeps the spelling it was created with.
+# Parameters (guild_id, rarity, weight, burn_value) for both.
+UPSERT_RARITY_SQL = '''
+    INSERT INTO rarity_weights (guild_id, rarity, rarity_key, weight, burn_value)
+    VALUES (?1, TRIM(?2), LOWER(TRIM(?2)), ?3, ?4)
+    ON CONFLICT(guild_id, rarity_key) DO UPDATE SET weight = excluded.weight, burn_value = excluded.burn_value
+'''
+ADD_RARITY_SQL = '''
+    INSERT INTO rarity_weights (guild_id, rarity, rarity_key, weight, burn_value)
+    VALUES (?1, TRIM(?2), LOWER(TRIM(?2)), ?3, ?4)
+    ON CONFLICT DO NOTHING
+'''
+
+
+def rarity_key(name):
+    return (name or '').strip().lower()
+
+
+async def add_rarity_key(conn, table, unique=False):
+    """Add, backfill and index rarity_key on `table`, and install the triggers that maintain it. Idempotent.
+
+    With `unique`, rows that spell the same rarity differently are merged into the first one created and the index
+    enforces one row per key from then on.
+    """
+    cursor = await conn.execute(f"PRAGMA table_info({table})")
+    if 'rarity_key' not in [column[1] for column in await cursor.fetchall()]:
+        await conn.execute(f"ALTER TABLE {table} ADD COLUMN rarity_key TEXT")
+        await conn.execute(f"UPDATE {table} SET rarity_key = LOWER(TRIM(rarity))")
+        logger.info(f"Added 'rarity_key' column to '{table}' table.")
+
+    await conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_rarity_key_insert AFTER INSERT ON {table}
+        BEGIN
+            UPDATE {table} SET rarity_key = LOWER(TRIM(NEW.rarity)) WHERE rowid = NEW.rowid;
+        END
+    ''')
+    await conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_rarity_key_update AFTER UPDATE OF rarity ON {table}
+        BEGIN
+            UPDATE {table} SET rarity_key = LOWER(TRIM(NEW.rarity)) WHERE rowid = NEW.rowid;
+        END
+    ''')
+    if not unique:
+        await conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_rarity_key ON {table} (guild_id, rarity_key)")
+        return
+
+    cursor = await conn.execute(
+        f"DELETE FROM {table} WHERE rowid NOT IN (SELECT MIN(rowid) FROM {table} GROUP BY guild_id, rarity_key)"
+    )
+    if cursor.rowcount:
+        logger.info(f"Merged {cursor.rowcount} duplicate rarity spelling(s) in '{table}'.")
+    await conn.execute(f"DROP INDEX IF EXISTS idx_{table}_rarity_key")
+    await conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table}_rarity_key ON {table} (guild_id, rarity_key)")
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Rarity Table Cache
+# ---------------------------------------------------------------------------------------------------------------------
+# Each guild's rarity table is small and read constantly (burning, events, card validation, autocomplete), so it is
+# loaded once and kept in memory, keyed by rarity_key. Anything that writes rarity_weights, including the dashboard
+# thread, calls invalidate_rarities() after committing and the next read reloads it.
+
+
+class Rarity(NamedTuple):
+    name: str
+    weight: Optional[float]
+    burn_value: Optional[int]
+
+
+_rarities = {}
+_generations = {}
+_lock = threading.Lock()
+
+
+def invalidate_rarities(guild_id=None):
+    """Drop the cached rarity table of a guild, or of every guild when no guild is given."""
+    with _lock:
+        if guild_id is None:
+            _rarities.clear()
+            for key in _generations:
+                _generations[key] += 1
+            return
+        guild_id = int(guild_id)
+        _rarities.pop(guild_id, None)
+        _generations[guild_id] = _generations.get(guild_id, 0) + 1
+
+
+async def get_rarities(guild_id):
+    """Return {rarity_key: Rarity} for a guild, loading it from the database on a miss."""
+    guild_id = int(guild_id)
+    with _lock:
+        cached = _rarities.get(guild_id)
+        generation = _generations.get(guild_id, 0)
+    if cached is not None:
+        return cached
+
+    async with aiosqlite.connect(db_path) as conn:
+        cursor = await conn.execute(
+            "SELECT rarity_key, rarity, weight, burn_value FROM rarity_weights WHERE guild_id = ? ORDER BY rowid",
+            (guild_id,)
+        )
+        rows = await cursor.fetchall()
+
+    rarities = {}
+    for key, name, weight, burn_value in rows:
+        rarities[key] = Rarity(name, weight, burn_value)
+
+    with _lock:
+        # A write that landed while this was loading makes the result stale, so it is returned but not kept
+        if _generations.get(guild_id, 0) == generation:
+            _rarities[guild_id] = rarities
+    return rarities
+
+
+async def get_rarity(guild_id, name):
+    """Return the Rarity matching `name` in any case, or None if the guild has no such rarity."""
+    return (await get_rarities(guild_id)).get(rarity_key(name))
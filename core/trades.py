@@ -0,0 +1,242 @@
+import json
+import time
+import logging
+
+from core.history import record_trade
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Trade Offers
+# ---------------------------------------------------------------------------------------------------------------------
+# A trade is two sides, each a set of cards with quantities plus optional points, swapped in one transaction. The
+# removals from both sides go out as one batch of guarded decrements and the additions as one batch of upserts, with
+# no per-card read-then-write round trips. The zero-quantity cleanup only touches the rows the trade changed.
+
+
+class TradeError(Exception):
+    pass
+
+
+class TradeSide:
+    def __init__(self, user_id, points=0):
+        self.user_id = user_id
+        self.points = max(points or 0, 0)
+        self.cards = {}
+        self.names = {}
+
+    def add_card(self, card_id, name, quantity=1):
+        self.cards[card_id] = self.cards.get(card_id, 0) + quantity
+        self.names[card_id] = name
+
+    def is_empty(self):
+        return not self.cards and not self.points
+
+    def describe(self):
+        parts = [f"{self.names[card_id]} x{quantity}" if quantity > 1 else self.names[card_id]
+                 for card_id, quantity in self.cards.items()]
+        if self.points:
+            parts.append(f"{self.points} points")
+        return ", ".join(parts) or "nothing"
+
+    def to_json(self):
+        cards = [[card_id, self.names[card_id], quantity] for card_id, quantity in self.cards.items()]
+        return json.dumps({"points": self.points, "cards": cards})
+
+    @classmethod
+    def from_json(cls, user_id, text):
+        data = json.loads(text)
+        side = cls(user_id, data.get("points", 0))
+        for card_id, name, quantity in data.get("cards", []):
+            side.add_card(card_id, name, quantity)
+        return side
+
+
+async def check_side(conn, guild_id, side):
+    """Return a reason the side cannot be given right now, or None if its owner holds everything in it."""
+    if side.cards:
+        placeholders = ', '.join('?' * len(side.cards))
+        cursor = await conn.execute(
+            f"SELECT card_id, quantity FROM user_inventory "
+            f"WHERE guild_id = ? AND user_id = ? AND card_id IN ({placeholders})",
+            (guild_id, side.user_id, *side.cards)
+        )
+        owned = dict(await cursor.fetchall())
+        for card_id, quantity in side.cards.items():
+            if owned.get(card_id, 0) < quantity:
+                return f"not enough copies of `{side.names[card_id]}` (needs {quantity})"
+
+    if side.points:
+        cursor = await conn.execute("SELECT balance FROM economy WHERE guild_id = ? AND user_id = ?",
+                                    (guild_id, side.user_id))
+        balance = await cursor.fetchone()
+        if not balance or balance[0] < side.points:
+            return f"not enough points (needs {side.points})"
+    return None
+
+
+async def execute_trade(conn, guild_id, side1, side2, trade_id=None):
+    """Swap both sides in one transaction and record it in the transaction history. Raises TradeError if either side is short.
+
+    With a trade_id the pending offer is marked accepted in the same transaction, so it can only be accepted once.
+    """
+    removals = [(quantity, guild_id, side.user_id, card_id, quantity)
+                for side in (side1, side2) for card_id, quantity in side.cards.items()]
+    additions = [(guild_id, receiver.user_id, card_id, quantity)
+                 for giver, receiver in ((side1, side2), (side2, side1)) for card_id, quantity in giver.cards.items()]
+
+    await conn.execute('BEGIN IMMEDIATE')
+    try:
+        if trade_id is not None and not await _resolve(conn, trade_id, ACCEPTED):
+            raise TradeError("This trade offer is no longer available.")
+        if removals:
+            cursor = await conn.executemany(
+                "UPDATE user_inventory SET quantity = quantity - ? "
+                "WHERE guild_id = ? AND user_id = ? AND card_id = ? AND quantity >= ?",
+                removals
+            )
+            if cursor.rowcount != len(removals):
+                raise TradeError("One of you no longer has the cards in this trade.")
+            await conn.executemany(
+                "DELETE FROM user_inventory WHERE guild_id = ? AND user_id = ? AND card_id = ? AND quantity <= 0",
+                [removal[1:4] for removal in removals]
+            )
+            await conn.executemany(
+                "INSERT INTO user_inventory (guild_id, user_id, card_id, quantity) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(guild_id, user_id, card_id) DO UPDATE SET quantity = quantity + excluded.quantity",
+                additions
+            )
+
+        for giver, receiver in ((side1, side2), (side2, side1)):
+            if not giver.points:
+                continue
+            cursor = await conn.execute(
+                "UPDATE economy SET balance = balance - ? WHERE guild_id = ? AND user_id = ? AND balance >= ?",
+                (giver.points, guild_id, giver.user_id, giver.points)
+            )
+            if cursor.rowcount == 0:
+                raise TradeError("One of you no longer has the points in this trade.")
+            await conn.execute(
+                "INSERT INTO economy (guild_id, user_id, balance) VALUES (?, ?, ?) "
+                "ON CONFLICT(guild_id, user_id) DO UPDATE SET balance = balance + excluded.balance",
+                (guild_id, receiver.user_id, giver.points)
+            )
+
+        await record_trade(conn, guild_id, side1, side2)
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Pending Offers
+# ---------------------------------------------------------------------------------------------------------------------
+# Offers waiting for an answer are stored in trade_offers, keyed by the DM message that carries their buttons, so the
+# buttons keep working after a restart. Expiry is a timestamp on the row: a sweeper expires everything past it with
+# one UPDATE instead of each offer keeping its own timer, and resolved offers are purged once they are old.
+
+PENDING = 'pending'
+ACCEPTED = 'accepted'
+DENIED = 'denied'
+EXPIRED = 'expired'
+
+TRADE_OFFER_TTL = 12 * 60 * 60
+RESOLVED_RETENTION = 7 * 24 * 60 * 60
+EXPIRY_BATCH_SIZE = 200
+
+
+class TradeOffer:
+    def __init__(self, trade_id, guild_id, user1_id, user2_id, offered, requested, channel_id, message_id,
+                 expires_at):
+        self.trade_id = trade_id
+        self.guild_id = guild_id
+        self.user1_id = user1_id
+        self.user2_id = user2_id
+        self.offered = TradeSide.from_json(user1_id, offered)      # Given by user1
+        self.requested = TradeSide.from_json(user2_id, requested)  # Given by user2
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.expires_at = expires_at
+
+    def is_expired(self):
+        return self.expires_at <= time.time()
+
+
+OFFER_COLUMNS = "trade_id, guild_id, user1_id, user2_id, offered, requested, channel_id, message_id, expires_at"
+
+
+async def create_offer(conn, guild_id, offered, requested, ttl=TRADE_OFFER_TTL):
+    """Store a pending offer before its message is sent. Returns the trade_id."""
+    cursor = await conn.execute(
+        "INSERT INTO trade_offers (guild_id, user1_id, user2_id, offered, requested, status, expires_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (guild_id, offered.user_id, requested.user_id, offered.to_json(), requested.to_json(), PENDING,
+         int(time.time() + ttl))
+    )
+    await conn.commit()
+    return cursor.lastrowid
+
+
+async def attach_offer_message(conn, trade_id, channel_id, message_id):
+    await conn.execute("UPDATE trade_offers SET channel_id = ?, message_id = ? WHERE trade_id = ?",
+                       (channel_id, message_id, trade_id))
+    await conn.commit()
+
+
+async def discard_offer(conn, trade_id):
+    await conn.execute("DELETE FROM trade_offers WHERE trade_id = ?", (trade_id,))
+    await conn.commit()
+
+
+async def get_pending_offer(conn, message_id):
+    cursor = await conn.execute(
+        f"SELECT {OFFER_COLUMNS} FROM trade_offers WHERE message_id = ? AND status = ?",
+        (message_id, PENDING)
+    )
+    row = await cursor.fetchone()
+    return TradeOffer(*row) if row else None
+
+
+async def _resolve(conn, trade_id, status):
+    cursor = await conn.execute(
+        "UPDATE trade_offers SET status = ?, resolved_at = ? WHERE trade_id = ? AND status = ?",
+        (status, int(time.time()), trade_id, PENDING)
+    )
+    return cursor.rowcount == 1
+
+
+async def deny_offer(conn, trade_id):
+    """Mark a pending offer denied. Returns False if it was already accepted, denied or expired."""
+    resolved = await _resolve(conn, trade_id, DENIED)
+    await conn.commit()
+    return resolved
+
+
+async def expire_offers(conn, now=None):
+    """Expire every pending offer past its deadline and purge old resolved ones.
+
+    Returns the offers that were just expired (at most EXPIRY_BATCH_SIZE per call, oldest first) so their messages
+    can be updated.
+    """
+    now = int(now or time.time())
+    # Held for the whole sweep so an offer cannot be accepted between being selected and being expired
+    await conn.execute('BEGIN IMMEDIATE')
+    cursor = await conn.execute(
+        f"SELECT {OFFER_COLUMNS} FROM trade_offers WHERE status = ? AND expires_at <= ? ORDER BY expires_at LIMIT ?",
+        (PENDING, now, EXPIRY_BATCH_SIZE)
+    )
+    offers = [TradeOffer(*row) for row in await cursor.fetchall()]
+    if offers:
+        await conn.execute(
+            f"UPDATE trade_offers SET status = ?, resolved_at = ? "
+            f"WHERE status = ? AND trade_id IN ({', '.join('?' * len(offers))})",
+            (EXPIRED, now, PENDING, *(offer.trade_id for offer in offers))
+        )
+    await conn.execute("DELETE FROM trade_offers WHERE status != ? AND resolved_at < ?",
+                       (PENDING, now - RESOLVED_RETENTION))
+    await conn.commit()
+    return offers
@@ -0,0 +1,90 @@
+import io
+import asyncio
+import logging
+import discord
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Upload Batching
+# ---------------------------------------------------------------------------------------------------------------------
+# Card images are parked in the image channel only to get CDN links, so there is no reason to spend one message (and
+# one rate-limit slot) per file. Uploads queue up per channel and go out together, up to Discord's 10 attachments per
+# message, once the batch is full, would exceed the size cap, or has waited MAX_DELAY seconds.
+
+MAX_FILES_PER_MESSAGE = 10
+MAX_BYTES_PER_MESSAGE = 10 * 1024 * 1024
+MAX_DELAY = 0.5
+
+
+class UploadBatcher:
+    def __init__(self, channel, max_files=MAX_FILES_PER_MESSAGE, max_bytes=MAX_BYTES_PER_MESSAGE,
+                 max_delay=MAX_DELAY):
+        self.channel = channel
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self._pending = []
+        self._pending_bytes = 0
+        self._timer = None
+        self._sends = set()
+
+    async def upload(self, filename, data):
+        """Queue one file and return its attachment URL once the batch carrying it has been sent."""
+        future = asyncio.get_running_loop().create_future()
+        if self._pending and self._pending_bytes + len(data) > self.max_bytes:
+            self._flush()
+
+        self._pending.append((filename, data, future))
+        self._pending_bytes += len(data)
+
+        if len(self._pending) >= self.max_files:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await future
+
+    async def close(self):
+        """Send whatever is queued and wait for in-flight batches."""
+        self._flush()
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch = self._pending
+        self._pending = []
+        self._pending_bytes = 0
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+
+    async def _send(self, batch):
+        try:
+            files = [discord.File(io.BytesIO(data), filename=filename) for filename, data, _ in batch]
+            message = await self.channel.send(files=files)
+            if len(message.attachments) != len(batch):
+                raise RuntimeError(f"Sent {len(batch)} files but Discord returned {len(message.attachments)}")
+            # Attachments come back in the order the files were sent
+            for (_, _, future), attachment in zip(batch, message.attachments):
+                if not future.done():
+                    future.set_result(attachment.url)
+        except Exception as e:
+            logger.error(f"Failed to upload a batch of {len(batch)} images: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Cancellation (the cog unloading mid-send) skips the handler above; nobody may be left waiting
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("The image upload was cancelled before it was sent"))
@@ -0,0 +1,52 @@
+import time
+import logging
+import threading
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Logging Configuration
+# ---------------------------------------------------------------------------------------------------------------------
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Data Version Counters
+# ---------------------------------------------------------------------------------------------------------------------
+# In-memory, per-guild counters that writers bump after committing. The dashboard derives ETags from them so
+# conditional requests can be answered without opening the database. The process start time is folded into every
+# tag, so a restart invalidates anything a browser has cached.
+
+CARDS = 'cards'
+SETS = 'sets'
+INVENTORY = 'inventory'
+
+_epoch = format(time.time_ns(), 'x')
+_versions = {}
+_lock = threading.Lock()
+
+
+def bump_version(guild_id, *scopes):
+    try:
+        guild_id = int(guild_id)
+    except (TypeError, ValueError):
+        logger.error(f"Cannot bump data version for guild {guild_id!r}")
+        return
+    with _lock:
+        for scope in scopes:
+            key = (guild_id, scope)
+            _versions[key] = _versions.get(key, 0) + 1
+
+
+def get_version(guild_id, scope):
+    try:
+        guild_id = int(guild_id)
+    except (TypeError, ValueError):
+        return 0
+    with _lock:
+        return _versions.get((guild_id, scope), 0)
+
+
+def make_etag(guild_id, scopes, *extra):
+    parts = [_epoch, str(guild_id)]
+    parts.extend(f"{scope}{get_version(guild_id, scope)}" for scope in scopes)
+    parts.extend(str(value) for value in extra)
+    return '-'.join(parts)